@@ -0,0 +1,228 @@
+# audio.py
+import time
+import hardware
+import traffic
+import scheduler
+
+# ======= Crossing Announcements =======
+# Spoken or tonal clips for blind and partially sighted pedestrians,
+# chosen by the traffic phase. A clip is raw 16-bit mono PCM on flash
+# and is never loaded whole: it streams through two preallocated halves
+# of AUDIO_CHUNK_BYTES. The I2S driver plays one half (non-blocking
+# write) while the main loop refills the other, and its callback hands
+# over the next half. Off by default; the buzzer beeps either way.
+AUDIO_ENABLED = False
+AUDIO_DIR = "/audio"
+AUDIO_RATE = 8000             # samples per second
+AUDIO_CHUNK_BYTES = 512       # one half: 32 ms at 8 kHz, at least 128 (8 ms)
+AUDIO_IBUF_BYTES = 2048       # I2S driver buffer
+HURRY_MS = 5000               # "hurry" cue with this much pedestrian green left
+
+# ======= Clips =======
+CLIP_NONE = 0
+CLIP_WAIT = 1     # request accepted, wait
+CLIP_CROSS = 2    # walk sign on, cross now
+CLIP_HURRY = 3    # countdown cue near the end of the crossing
+CLIP_STOP = 4     # do not start crossing
+CLIP_FILES = ("", "wait.pcm", "cross.pcm", "hurry.pcm", "stop.pcm")
+
+# Clip started when a phase is entered (phases not listed stay silent)
+CLIP_PLAN = (
+    (traffic.TRAFFIC_WAIT_BEFORE_PED, CLIP_WAIT),
+    (traffic.TRAFFIC_PED_GREEN, CLIP_CROSS),
+    (traffic.TRAFFIC_TRANSITION_TO_CAR, CLIP_STOP),
+)
+
+# Half states
+_FREE = 0
+_READY = 1
+_PLAYING = 2
+
+_buf = None           # both halves, allocated by init_audio()
+_halves = ()          # memoryview of each half
+_half_state = bytearray(2)
+_playing = -1         # half held by the driver, -1 while it is idle
+_next_fill = 0        # halves alternate in stream order
+_next_play = 0
+_due_ms = 0           # when the driver should be done with it
+_chunk_ms = 0
+
+_clip_of_state = bytearray(8)
+_paths = ()
+_file = None          # clip being streamed, None once read to the end
+_clip = CLIP_NONE
+_shown_state = -1
+_hurried = False
+
+# Statistics
+_clips = 0
+_chunks = 0
+_underruns = 0        # the driver finished a half before the next one was ready
+_missing = 0          # clips not found on flash
+
+
+def init_audio():
+    """Allocate the double buffer, build the clip table and open the I2S output."""
+    global _buf, _halves, _playing, _next_fill, _next_play, _chunk_ms
+    global _paths, _file, _clip, _shown_state, _clips, _chunks, _underruns, _missing
+    _playing = -1
+    _next_fill = 0
+    _next_play = 0
+    _file = None
+    _clip = CLIP_NONE
+    _shown_state = traffic.get_state()
+    _clips = 0
+    _chunks = 0
+    _underruns = 0
+    _missing = 0
+    if not AUDIO_ENABLED:
+        return
+    _buf = bytearray(2 * AUDIO_CHUNK_BYTES)
+    view = memoryview(_buf)
+    _halves = (view[:AUDIO_CHUNK_BYTES], view[AUDIO_CHUNK_BYTES:])
+    _half_state[0] = _FREE
+    _half_state[1] = _FREE
+    _chunk_ms = AUDIO_CHUNK_BYTES * 1000 // (AUDIO_RATE * 2)
+    _paths = tuple("{}/{}".format(AUDIO_DIR, name) for name in CLIP_FILES)
+    for i in range(len(_clip_of_state)):
+        _clip_of_state[i] = CLIP_NONE
+    for state, clip in CLIP_PLAN:
+        _clip_of_state[state] = clip
+    hardware.init_audio_out(AUDIO_RATE, AUDIO_IBUF_BYTES)
+    hardware.audio_out.irq(_on_half_done)
+
+
+def _on_half_done(out):
+    """
+    I2S callback: the driver has taken the half it was given. Hand it
+    the other one if it is ready (no allocation).
+    """
+    global _playing, _underruns
+    if _playing < 0:
+        return
+    _half_state[_playing] = _FREE
+    if _half_state[_next_play] == _READY:
+        _submit(_next_play)
+    else:
+        _playing = -1
+        if _file is not None:
+            _underruns += 1
+    scheduler.wake()
+
+
+def _submit(half):
+    global _playing, _next_play, _due_ms, _chunks
+    _half_state[half] = _PLAYING
+    _playing = half
+    _next_play = 1 - half
+    _due_ms = time.ticks_add(time.ticks_ms(), _chunk_ms)
+    _chunks += 1
+    hardware.audio_out.write(_halves[half])
+
+
+def _fill(half):
+    """Read the next chunk of the clip into a free half (silence after its end)."""
+    global _file, _next_fill
+    buf = _halves[half]
+    n = _file.readinto(buf)
+    if n is None:
+        n = 0
+    if n < AUDIO_CHUNK_BYTES:
+        # Last chunk: pad with silence and close the clip
+        for i in range(n, AUDIO_CHUNK_BYTES):
+            buf[i] = 0
+        _file.close()
+        _file = None
+        if n == 0:
+            return
+    _half_state[half] = _READY
+    _next_fill = 1 - half
+
+
+def play(clip):
+    """
+    Start streaming a clip, cutting the one playing (a half already
+    handed to the driver still plays out).
+    """
+    global _file, _clip, _clips, _missing, _next_fill, _next_play
+    if _file is not None:
+        _file.close()
+        _file = None
+    if _half_state[0] == _READY:
+        _half_state[0] = _FREE
+    if _half_state[1] == _READY:
+        _half_state[1] = _FREE
+    # The new clip follows the half the driver still holds, if any
+    _next_fill = 0 if _playing < 0 else 1 - _playing
+    _next_play = _next_fill
+    _clip = clip
+    if clip == CLIP_NONE:
+        return
+    try:
+        _file = open(_paths[clip], "rb")
+    except OSError:
+        _missing += 1
+        return
+    _clips += 1
+
+
+def _select(now_ms):
+    """Start the clip of a newly entered phase, or the hurry cue."""
+    global _shown_state, _hurried
+    state = traffic.get_state()
+    if state != _shown_state:
+        _shown_state = state
+        _hurried = False
+        clip = _clip_of_state[state]
+        if clip != CLIP_NONE or _clip != CLIP_NONE:
+            play(clip)
+    elif state == traffic.TRAFFIC_PED_GREEN and not _hurried and \
+            traffic.get_ped_remaining_ms(now_ms) <= HURRY_MS:
+        _hurried = True
+        play(CLIP_HURRY)
+
+
+def is_idle():
+    """True when no clip streams and the driver holds no half."""
+    return _playing < 0 and _file is None
+
+
+def next_deadline_ms(now_ms):
+    """
+    Return the tick of the next refill, hurry cue or half handover, or
+    None when nothing plays.
+    """
+    if not AUDIO_ENABLED:
+        return None
+    if _file is not None and _half_state[_next_fill] == _FREE:
+        return now_ms
+    deadline = None
+    if _playing >= 0:
+        deadline = _due_ms
+    if not _hurried and traffic.get_state() == traffic.TRAFFIC_PED_GREEN:
+        cue = time.ticks_add(now_ms, traffic.get_ped_remaining_ms(now_ms) - HURRY_MS)
+        deadline = scheduler.earliest(now_ms, deadline, cue)
+    return deadline
+
+
+def update_audio(now_ms):
+    """
+    Pick the clip for the phase, refill free halves and restart the
+    driver if it ran dry. Called periodically in the main loop.
+    """
+    if not AUDIO_ENABLED:
+        return
+    _select(now_ms)
+    if _file is not None and _half_state[_next_fill] == _FREE:
+        _fill(_next_fill)
+    if _file is not None and _half_state[_next_fill] == _FREE:
+        _fill(_next_fill)
+    # Idle driver (clip start, or after an underrun): restart it
+    if _playing < 0 and _half_state[_next_play] == _READY:
+        _submit(_next_play)
+
+
+def report():
+    """Print the streaming statistics (call from the REPL)."""
+    print("clips: {}  chunks: {}  underruns: {}  missing clips: {}".format(
+        _clips, _chunks, _underruns, _missing))
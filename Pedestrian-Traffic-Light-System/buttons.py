@@ -1,49 +1,97 @@
-# buttons.py
-import time
-import hardware
-import traffic
-import buzzer
-
-DEBOUNCE_MS = 50
-
-_last_button_level = 1       
-_last_button_change_ms = 0
-_button_event_fired = False   # guarantees 1 event per click
-
-
-def init_buttons():
-    global _last_button_level, _last_button_change_ms, _button_event_fired
-    _last_button_level = hardware.Bot1.value()
-    _last_button_change_ms = time.ticks_ms()
-    _button_event_fired = False
-
-
-def update_button(now_ms):
-    """
-    Debounced button handling for the pedestrian button (Bot1).
-    When a valid press is detected:
-      - requests pedestrian crossing
-      - triggers confirmation beep
-    """
-    global _last_button_level, _last_button_change_ms
-    global _button_event_fired
-
-    level = hardware.Bot1.value()  # 1 = released, 0 = pressed
-
-    # Edge detection
-    if level != _last_button_level:
-        _last_button_level = level
-        _last_button_change_ms = now_ms
-
-    # After debounce time
-    if time.ticks_diff(now_ms, _last_button_change_ms) > DEBOUNCE_MS:
-
-        # Pressed and not yet handled
-        if level == 0 and not _button_event_fired:
-            traffic.request_pedestrian()
-            buzzer.request_confirmation_beep()
-            _button_event_fired = True
-
-        # Released → allow next click
-        elif level == 1:
-            _button_event_fired = False
+# buttons.py
+import time
+import hardware
+import traffic
+import buzzer
+import input_events
+import demand
+
+DEBOUNCE_MS = 50
+
+_last_button_level = 1       
+_last_button_change_ms = 0
+_button_event_fired = False   # guarantees 1 event per click
+_requests = 0                 # crossing requests since boot
+
+
+def init_buttons():
+    global _last_button_level, _last_button_change_ms, _button_event_fired
+    _last_button_level = hardware.Bot1.value()
+    _last_button_change_ms = time.ticks_ms()
+    _button_event_fired = False
+
+
+def next_deadline_ms(now_ms):
+    """
+    Return the tick at which update_button() must run again,
+    or None if only a new edge (pin IRQ) can produce an event.
+    """
+    if input_events.pending(input_events.CH_BOT1):
+        return now_ms
+    if time.ticks_diff(now_ms, _last_button_change_ms) <= DEBOUNCE_MS:
+        return time.ticks_add(_last_button_change_ms, DEBOUNCE_MS + 1)
+    return None
+
+
+def request_crossing(t_ms):
+    """A debounced press: request the crossing and confirm it with a beep."""
+    global _requests
+    _requests += 1
+    traffic.request_pedestrian()
+    buzzer.request_confirmation_beep()
+    demand.note_press(t_ms)
+
+
+def get_requests():
+    """Crossing requests since boot (from Bot1 or any scanned button)."""
+    return _requests
+
+
+def _check_press(t_ms):
+    """Apply the debounce rule to the current level at time t_ms."""
+    global _button_event_fired
+
+    if time.ticks_diff(t_ms, _last_button_change_ms) > DEBOUNCE_MS:
+
+        # Pressed and not yet handled
+        if _last_button_level == 0 and not _button_event_fired:
+            request_crossing(t_ms)
+            _button_event_fired = True
+
+        # Released → allow next click
+        elif _last_button_level == 1:
+            _button_event_fired = False
+
+
+def update_button(now_ms):
+    """
+    Debounced button handling for the pedestrian button (Bot1).
+    Edges captured by the IRQ are replayed in order with their own
+    timestamps, so a press is never lost between two loop passes.
+    When a valid press is detected:
+      - requests pedestrian crossing
+      - triggers confirmation beep
+    """
+    global _last_button_level, _last_button_change_ms
+
+    ch = input_events.CH_BOT1
+    while input_events.pending(ch):
+        edge_ms = input_events.peek_ms(ch)
+        level = input_events.peek_level(ch)  # 1 = released, 0 = pressed
+        input_events.pop(ch)
+
+        # The previous level may have become valid before this edge
+        _check_press(edge_ms)
+
+        if level != _last_button_level:
+            _last_button_level = level
+            _last_button_change_ms = edge_ms
+
+    # Edges were lost: resynchronize with the pin
+    if input_events.take_overflows(ch):
+        level = hardware.Bot1.value()
+        if level != _last_button_level:
+            _last_button_level = level
+            _last_button_change_ms = now_ms
+
+    _check_press(now_ms)
@@ -1,127 +1,250 @@
-# buzzer.py
-import time
-import hardware
-import traffic
-
-# ======= Buzzer States =======
-BUZZER_IDLE = 0
-BUZZER_CONFIRMATION_BEEP = 1
-BUZZER_CROSSING_BEEPS = 2
-
-buzzer_state = BUZZER_IDLE
-buzzer_state_start_ms = time.ticks_ms()
-
-last_beep_ms = time.ticks_ms()
-beep_interval_ms = 400
-
-# Short PWM pulse 
-BEEP_PULSE_DURATION = 50  # ms
-_beep_pulse_active = False
-_beep_pulse_start_ms = 0
-
-# Confirmation beep flag
-_confirmation_beep_pending = False
-
-
-def init_buzzer():
-    """
-    Initialize buzzer state and ensure PWM is off.
-    """
-    global buzzer_state, buzzer_state_start_ms
-    global last_beep_ms, beep_interval_ms
-    global _beep_pulse_active, _beep_pulse_start_ms
-    global _confirmation_beep_pending
-
-    buzzer_state = BUZZER_IDLE
-    buzzer_state_start_ms = time.ticks_ms()
-    last_beep_ms = time.ticks_ms()
-    beep_interval_ms = 400
-    _beep_pulse_active = False
-    _beep_pulse_start_ms = 0
-    _confirmation_beep_pending = False
-    hardware.buzzer.duty(0)
-
-
-def request_confirmation_beep():
-    """Called when the pedestrian button is pressed (double beep)."""
-    global _confirmation_beep_pending
-    _confirmation_beep_pending = True
-
-
-def _handle_pulse(now_ms):
-    """
-    Manage short PWM pulses for crossing beeps.
-    """
-    global _beep_pulse_active, _beep_pulse_start_ms
-
-    if _beep_pulse_active:
-        if time.ticks_diff(now_ms, _beep_pulse_start_ms) >= BEEP_PULSE_DURATION:
-            hardware.buzzer.duty(0)
-            _beep_pulse_active = False
-
-
-def update_buzzer_state(now_ms):
-    """
-    Update buzzer state machine.
-    Called periodically in the main loop.
-    """
-    global buzzer_state, buzzer_state_start_ms
-    global last_beep_ms, beep_interval_ms
-    global _beep_pulse_active, _beep_pulse_start_ms
-    global _confirmation_beep_pending
-
-    # Manage short on/off PWM pulses
-    _handle_pulse(now_ms)
-
-    if buzzer_state == BUZZER_IDLE:
-        # Ensure it is OFF when no pulse is active
-        if not _beep_pulse_active:
-            hardware.buzzer.duty(0)
-
-        # Confirmation beep
-        if _confirmation_beep_pending:
-            buzzer_state = BUZZER_CONFIRMATION_BEEP
-            buzzer_state_start_ms = now_ms
-
-        # If pedestrians are crossing, start crossing beep mode
-        elif traffic.is_crossing_active() and traffic.is_pedestrian_green():
-            buzzer_state = BUZZER_CROSSING_BEEPS
-            buzzer_state_start_ms = now_ms
-            last_beep_ms = now_ms
-
-    elif buzzer_state == BUZZER_CONFIRMATION_BEEP:
-        elapsed = time.ticks_diff(now_ms, buzzer_state_start_ms)
-
-        if elapsed < 100:
-            hardware.buzzer.duty(512)  # first beep
-        elif elapsed < 150:
-            hardware.buzzer.duty(0)    # silence
-        elif elapsed < 250:
-            hardware.buzzer.duty(512)  # second beep
-        else:
-            hardware.buzzer.duty(0)
-            _confirmation_beep_pending = False
-            buzzer_state = BUZZER_IDLE
-
-    elif buzzer_state == BUZZER_CROSSING_BEEPS:
-        # If crossing is over, go back to idle
-        if not traffic.is_crossing_active() or not traffic.is_pedestrian_green():
-            if not _beep_pulse_active:
-                hardware.buzzer.duty(0)
-            buzzer_state = BUZZER_IDLE
-            return
-
-        # Adjust beep interval based on remaining pedestrian time
-        ratio = traffic.get_ped_ratio(now_ms)
-        max_interval = 400
-        min_interval = 100
-        beep_interval_ms = int(min_interval + ratio * (max_interval - min_interval))
-
-        # Start a new beep pulse if enough time has passed
-        if (not _beep_pulse_active and
-                time.ticks_diff(now_ms, last_beep_ms) >= beep_interval_ms):
-
-            hardware.buzzer.duty(512)          # turn on sound
-            _beep_pulse_active = True
-            _beep_pulse_start_ms = now_ms
-            last_beep_ms = now_ms
+# buzzer.py
+import time
+import hardware
+import traffic
+import tone
+
+# ======= Buzzer States =======
+BUZZER_IDLE = 0
+BUZZER_CONFIRMATION_BEEP = 1
+BUZZER_CROSSING_BEEPS = 2
+
+buzzer_state = BUZZER_IDLE
+buzzer_state_start_ms = time.ticks_ms()
+
+last_beep_ms = time.ticks_ms()
+beep_interval_ms = 400
+
+# Short PWM pulse 
+BEEP_PULSE_DURATION = 50  # ms
+
+# Crossing beep interval: slow at the start, fast at the end
+MIN_BEEP_INTERVAL_MS = 100
+MAX_BEEP_INTERVAL_MS = 400
+_beep_pulse_active = False
+_beep_pulse_start_ms = 0
+
+# Confirmation beep flag
+_confirmation_beep_pending = False
+
+# Length of the confirmation beep when played by the tone sequencer
+_CONFIRM_MS = tone.pattern_ms(tone.CONFIRM_PATTERN)
+
+
+def init_buzzer():
+    """
+    Initialize buzzer state and ensure PWM is off.
+    """
+    global buzzer_state, buzzer_state_start_ms
+    global last_beep_ms, beep_interval_ms
+    global _beep_pulse_active, _beep_pulse_start_ms
+    global _confirmation_beep_pending
+
+    buzzer_state = BUZZER_IDLE
+    buzzer_state_start_ms = time.ticks_ms()
+    last_beep_ms = time.ticks_ms()
+    beep_interval_ms = 400
+    _beep_pulse_active = False
+    _beep_pulse_start_ms = 0
+    _confirmation_beep_pending = False
+    hardware.init_buzzer_pwm()
+    hardware.set_buzzer_duty(0)
+    if tone.TONE_SEQUENCER_ENABLED:
+        tone.init_tone()
+
+
+def request_confirmation_beep():
+    """Called when the pedestrian button is pressed (double beep)."""
+    global _confirmation_beep_pending
+    _confirmation_beep_pending = True
+
+
+def crossing_interval_ms(remaining_ms, total_ms):
+    """
+    Beep interval with remaining_ms of a total_ms crossing left (faster
+    as time runs out). Integer form of min + ratio * (max - min): no
+    float is created. Also used by controllers.BuzzerController.
+    """
+    if total_ms <= 0:
+        return MIN_BEEP_INTERVAL_MS
+    return MIN_BEEP_INTERVAL_MS + \
+        remaining_ms * (MAX_BEEP_INTERVAL_MS - MIN_BEEP_INTERVAL_MS) // total_ms
+
+
+def _crossing_interval_ms(now_ms):
+    """Beep interval for the crossing phase of this crossing."""
+    return crossing_interval_ms(traffic.get_ped_remaining_ms(now_ms),
+                                traffic.get_ped_total_ms())
+
+
+def _crossing_beep_due_ms(now_ms):
+    """
+    Tick of the next crossing beep. The interval shrinks while the loop
+    sleeps, so the beep is due where the time since the last beep meets
+    the interval at that moment, not the interval computed now:
+    d = MIN + (left at the last beep - d) * (MAX - MIN) / total,
+    solved for d and rounded up so the update finds it due.
+    """
+    total = traffic.get_ped_total_ms()
+    if total <= 0:
+        return time.ticks_add(last_beep_ms, MIN_BEEP_INTERVAL_MS)
+    left = traffic.get_ped_remaining_ms(now_ms) + time.ticks_diff(now_ms, last_beep_ms)
+    span = MAX_BEEP_INTERVAL_MS - MIN_BEEP_INTERVAL_MS
+    due = (MIN_BEEP_INTERVAL_MS * total + left * span + total + span - 1) // (total + span)
+    if due < MIN_BEEP_INTERVAL_MS:
+        due = MIN_BEEP_INTERVAL_MS
+    return time.ticks_add(last_beep_ms, due)
+
+
+def _handle_pulse(now_ms):
+    """
+    Manage short PWM pulses for crossing beeps.
+    """
+    global _beep_pulse_active, _beep_pulse_start_ms
+
+    if _beep_pulse_active:
+        if time.ticks_diff(now_ms, _beep_pulse_start_ms) >= BEEP_PULSE_DURATION:
+            hardware.set_buzzer_duty(0)
+            _beep_pulse_active = False
+
+
+def next_deadline_ms(now_ms):
+    """
+    Return the tick of the next buzzer edge, or None when the buzzer
+    is idle and nothing is about to start.
+    """
+    if tone.TONE_SEQUENCER_ENABLED:
+        return _next_deadline_sequenced(now_ms)
+
+    if buzzer_state == BUZZER_IDLE:
+        if _confirmation_beep_pending:
+            return now_ms
+        if traffic.is_crossing_active() and traffic.is_pedestrian_green():
+            return now_ms
+        if _beep_pulse_active:
+            return time.ticks_add(_beep_pulse_start_ms, BEEP_PULSE_DURATION)
+        return None
+
+    if buzzer_state == BUZZER_CONFIRMATION_BEEP:
+        elapsed = time.ticks_diff(now_ms, buzzer_state_start_ms)
+        for edge in (100, 150, 250):
+            if elapsed < edge:
+                return time.ticks_add(buzzer_state_start_ms, edge)
+        return now_ms
+
+    # BUZZER_CROSSING_BEEPS
+    if _beep_pulse_active:
+        return time.ticks_add(_beep_pulse_start_ms, BEEP_PULSE_DURATION)
+    return _crossing_beep_due_ms(now_ms)
+
+
+def _next_deadline_sequenced(now_ms):
+    """next_deadline_ms() when the tone sequencer plays the beeps."""
+    if buzzer_state == BUZZER_IDLE:
+        if _confirmation_beep_pending or traffic.is_pedestrian_green():
+            return now_ms
+        return None
+    if buzzer_state == BUZZER_CONFIRMATION_BEEP:
+        return time.ticks_add(buzzer_state_start_ms, _CONFIRM_MS)
+    return None  # the end of the crossing is a traffic deadline
+
+
+def _update_sequenced(now_ms):
+    """
+    Buzzer FSM when the tone sequencer plays the beeps: the loop only
+    starts and stops patterns, the timer places every tone edge.
+    """
+    global buzzer_state, buzzer_state_start_ms
+    global _confirmation_beep_pending
+
+    if buzzer_state == BUZZER_CONFIRMATION_BEEP:
+        if tone.is_playing():
+            return
+        _confirmation_beep_pending = False
+        buzzer_state = BUZZER_IDLE
+
+    elif buzzer_state == BUZZER_CROSSING_BEEPS:
+        if traffic.is_crossing_active() and traffic.is_pedestrian_green():
+            return
+        tone.finish()  # let a beep in progress end normally
+        buzzer_state = BUZZER_IDLE
+
+    if _confirmation_beep_pending:
+        buzzer_state = BUZZER_CONFIRMATION_BEEP
+        buzzer_state_start_ms = now_ms
+        tone.play(tone.CONFIRM_PATTERN)
+
+    elif traffic.is_crossing_active() and traffic.is_pedestrian_green():
+        buzzer_state = BUZZER_CROSSING_BEEPS
+        buzzer_state_start_ms = now_ms
+        tone.play_crossing(traffic.get_ped_total_ms() - traffic.get_ped_remaining_ms(now_ms),
+                           traffic.get_ped_total_ms())
+
+
+def update_buzzer_state(now_ms):
+    """
+    Update buzzer state machine.
+    Called periodically in the main loop.
+    """
+    global buzzer_state, buzzer_state_start_ms
+    global last_beep_ms, beep_interval_ms
+    global _beep_pulse_active, _beep_pulse_start_ms
+    global _confirmation_beep_pending
+
+    if tone.TONE_SEQUENCER_ENABLED:
+        _update_sequenced(now_ms)
+        return
+
+    # Manage short on/off PWM pulses
+    _handle_pulse(now_ms)
+
+    if buzzer_state == BUZZER_IDLE:
+        # Ensure it is OFF when no pulse is active
+        if not _beep_pulse_active:
+            hardware.set_buzzer_duty(0)
+
+        # Confirmation beep
+        if _confirmation_beep_pending:
+            buzzer_state = BUZZER_CONFIRMATION_BEEP
+            buzzer_state_start_ms = now_ms
+
+        # If pedestrians are crossing, start crossing beep mode
+        elif traffic.is_crossing_active() and traffic.is_pedestrian_green():
+            buzzer_state = BUZZER_CROSSING_BEEPS
+            buzzer_state_start_ms = now_ms
+            last_beep_ms = now_ms
+
+    # Not elif: start the first beep on the pass that enters this state
+    if buzzer_state == BUZZER_CONFIRMATION_BEEP:
+        elapsed = time.ticks_diff(now_ms, buzzer_state_start_ms)
+
+        if elapsed < 100:
+            hardware.set_buzzer_duty(512)  # first beep
+        elif elapsed < 150:
+            hardware.set_buzzer_duty(0)    # silence
+        elif elapsed < 250:
+            hardware.set_buzzer_duty(512)  # second beep
+        else:
+            hardware.set_buzzer_duty(0)
+            _confirmation_beep_pending = False
+            buzzer_state = BUZZER_IDLE
+
+    elif buzzer_state == BUZZER_CROSSING_BEEPS:
+        # If crossing is over, go back to idle
+        if not traffic.is_crossing_active() or not traffic.is_pedestrian_green():
+            if not _beep_pulse_active:
+                hardware.set_buzzer_duty(0)
+            buzzer_state = BUZZER_IDLE
+            return
+
+        # Adjust beep interval based on remaining pedestrian time
+        beep_interval_ms = _crossing_interval_ms(now_ms)
+
+        # Start a new beep pulse if enough time has passed
+        if (not _beep_pulse_active and
+                time.ticks_diff(now_ms, last_beep_ms) >= beep_interval_ms):
+
+            hardware.set_buzzer_duty(512)          # turn on sound
+            _beep_pulse_active = True
+            _beep_pulse_start_ms = now_ms
+            last_beep_ms = now_ms
@@ -0,0 +1,305 @@
+# controllers.py
+import time
+import traffic
+import traffic_flow
+import buzzer as buzzer_fsm
+
+# ======= Intersection Controllers =======
+# Instantiable versions of the traffic, buzzer, violation and display
+# FSMs, so one process can run many intersections (see corridor.py).
+# They follow the same rules as the module-level FSMs used by main.py
+# and share the compiled traffic phase table, the beep interval and the
+# debounce rule, but keep their state in compact __slots__ objects and
+# write to an output object instead of the global hardware module.
+# Sensor edges are judged against the light at the edge time, as the
+# IRQ edge replay in violation.py does. Demand prediction (demand.py)
+# and the tone sequencer (tone.py) stay single-crossing features: one
+# learns the presses of this crossing, the other owns its PWM timer.
+
+# Shared, compiled once for every controller
+_PATTERN, _DURATION, _NEXT, _CAR_RED, _PED_GREEN = traffic.compile_plan(traffic.PHASE_PLAN)
+
+
+def _before_walk():
+    """1 for each phase that leads to the walk without waiting for a request."""
+    table = bytearray(len(_NEXT))
+    for state in range(len(_NEXT)):
+        step = state
+        while not _PED_GREEN[step] and _DURATION[step] != traffic.DUR_ON_REQUEST:
+            step = _NEXT[step]
+            if step == state:
+                break
+        table[state] = _PED_GREEN[step] and step != state
+    return table
+
+
+_BEFORE_WALK = _before_walk()
+
+
+class StubOutputs:
+    """Output sink for simulated intersections: keeps the last values."""
+    __slots__ = ("lights", "duty", "writes")
+
+    def __init__(self):
+        self.lights = 0
+        self.duty = 0
+        self.writes = 0
+
+    def commit_lights(self, pattern):
+        if pattern != self.lights:
+            self.lights = pattern
+            self.writes += 1
+
+    def set_buzzer_duty(self, duty):
+        if duty != self.duty:
+            self.duty = duty
+            self.writes += 1
+
+
+class TrafficController:
+    """One traffic light FSM (same phase plan as traffic.py)."""
+    __slots__ = ("out", "state", "start_ms", "phase_ms", "request",
+                 "car_red_start_ms", "car_red_end_ms", "flow", "hold_until_ms")
+
+    def __init__(self, out, now_ms, flow=0.5):
+        self.out = out
+        self.flow = flow               # 0.0–1.0, set by the owner
+        self.request = False
+        self.hold_until_ms = None      # set by a coordinator (corridor)
+        self.state = traffic.TRAFFIC_CAR_GREEN
+        self.car_red_start_ms = now_ms
+        self.car_red_end_ms = now_ms
+        self._enter(traffic.TRAFFIC_CAR_GREEN, now_ms)
+
+    def _enter(self, state, now_ms):
+        if _CAR_RED[state] and not _CAR_RED[self.state]:
+            self.car_red_start_ms = now_ms
+        elif _CAR_RED[self.state] and not _CAR_RED[state]:
+            self.car_red_end_ms = now_ms
+        self.state = state
+        self.start_ms = now_ms
+        self.out.commit_lights(_PATTERN[state])
+        duration = _DURATION[state]
+        if duration == traffic.DUR_FLOW_WAIT:
+            duration = traffic_flow.compute_wait_before_walk_ms(self.flow)
+        elif duration == traffic.DUR_FLOW_WALK:
+            duration = traffic_flow.compute_ped_green_ms(self.flow)
+        self.phase_ms = duration
+        if _PED_GREEN[state]:
+            self.request = False
+            self.hold_until_ms = None
+
+    def request_pedestrian(self):
+        self.request = True
+
+    def is_car_red(self):
+        return _CAR_RED[self.state] == 1
+
+    def was_car_red_at(self, t_ms):
+        """As traffic.was_car_red_at(): the light at a recent tick t_ms."""
+        if time.ticks_diff(t_ms, self.car_red_start_ms) < 0:
+            return False
+        return self.is_car_red() or time.ticks_diff(t_ms, self.car_red_end_ms) < 0
+
+    def is_pedestrian_green(self):
+        return _PED_GREEN[self.state] == 1
+
+    def is_walk_scheduled(self):
+        """True in the phases that run into the walk (wait, yellow)."""
+        return _BEFORE_WALK[self.state] == 1
+
+    def remaining_ms(self, now_ms):
+        """
+        Time left in the current phase, up to a coordinator's hold
+        (0 when waiting for a request).
+        """
+        deadline = self.next_deadline_ms(now_ms)
+        if deadline is None:
+            return 0
+        remaining = time.ticks_diff(deadline, now_ms)
+        return remaining if remaining > 0 else 0
+
+    def next_deadline_ms(self, now_ms):
+        if _DURATION[self.state] == traffic.DUR_ON_REQUEST:
+            return now_ms if self.request else None
+        deadline = time.ticks_add(self.start_ms, self.phase_ms)
+        if self.state == traffic.TRAFFIC_WAIT_BEFORE_PED and self.hold_until_ms is not None \
+                and time.ticks_diff(self.hold_until_ms, deadline) > 0:
+            deadline = self.hold_until_ms
+        return deadline
+
+    def update(self, now_ms):
+        state = self.state
+        if _DURATION[state] == traffic.DUR_ON_REQUEST:
+            if self.request:
+                self._enter(_NEXT[state], now_ms)
+            return
+        if _PED_GREEN[state]:
+            self.request = False   # presses during the crossing are ignored
+        if time.ticks_diff(now_ms, self.start_ms) >= self.phase_ms:
+            # A coordinator may hold the walk phase for a green-wave gap
+            hold = self.hold_until_ms
+            if state == traffic.TRAFFIC_WAIT_BEFORE_PED and hold is not None \
+                    and time.ticks_diff(now_ms, hold) < 0:
+                return
+            self._enter(_NEXT[state], now_ms)
+
+
+class BuzzerController:
+    """Confirmation double beep and accelerating crossing beeps."""
+    __slots__ = ("out", "traffic", "state", "start_ms", "last_beep_ms",
+                 "pulse_active", "pulse_start_ms", "confirm_pending")
+
+    def __init__(self, out, traffic_ctl, now_ms):
+        self.out = out
+        self.traffic = traffic_ctl
+        self.state = buzzer_fsm.BUZZER_IDLE
+        self.start_ms = now_ms
+        self.last_beep_ms = now_ms
+        self.pulse_active = False
+        self.pulse_start_ms = 0
+        self.confirm_pending = False
+        out.set_buzzer_duty(0)
+
+    def request_confirmation_beep(self):
+        self.confirm_pending = True
+
+    def _interval_ms(self, now_ms):
+        t = self.traffic
+        return buzzer_fsm.crossing_interval_ms(t.remaining_ms(now_ms), t.phase_ms)
+
+    def update(self, now_ms):
+        out = self.out
+        if self.pulse_active and \
+                time.ticks_diff(now_ms, self.pulse_start_ms) >= buzzer_fsm.BEEP_PULSE_DURATION:
+            out.set_buzzer_duty(0)
+            self.pulse_active = False
+
+        crossing = self.traffic.is_pedestrian_green()
+        if self.state == buzzer_fsm.BUZZER_IDLE:
+            if self.confirm_pending:
+                self.state = buzzer_fsm.BUZZER_CONFIRMATION_BEEP
+                self.start_ms = now_ms
+            elif crossing:
+                self.state = buzzer_fsm.BUZZER_CROSSING_BEEPS
+                self.start_ms = now_ms
+                self.last_beep_ms = now_ms
+
+        if self.state == buzzer_fsm.BUZZER_CONFIRMATION_BEEP:
+            elapsed = time.ticks_diff(now_ms, self.start_ms)
+            if elapsed < 100 or 150 <= elapsed < 250:
+                out.set_buzzer_duty(512)
+            elif elapsed < 150:
+                out.set_buzzer_duty(0)
+            else:
+                out.set_buzzer_duty(0)
+                self.confirm_pending = False
+                self.state = buzzer_fsm.BUZZER_IDLE
+
+        elif self.state == buzzer_fsm.BUZZER_CROSSING_BEEPS:
+            if not crossing:
+                if not self.pulse_active:
+                    out.set_buzzer_duty(0)
+                self.state = buzzer_fsm.BUZZER_IDLE
+            elif not self.pulse_active and \
+                    time.ticks_diff(now_ms, self.last_beep_ms) >= self._interval_ms(now_ms):
+                out.set_buzzer_duty(512)
+                self.pulse_active = True
+                self.pulse_start_ms = now_ms
+                self.last_beep_ms = now_ms
+
+
+class ViolationController:
+    """Debounced stop-line sensor; counts cars crossing on red."""
+    __slots__ = ("traffic", "level", "change_ms", "handled", "fines")
+
+    DEBOUNCE_MS = 50
+
+    def __init__(self, traffic_ctl, now_ms):
+        self.traffic = traffic_ctl
+        self.level = 1
+        self.change_ms = now_ms
+        self.handled = False
+        self.fines = 0
+
+    def sensor_edge(self, t_ms, level):
+        """
+        Feed one sensor edge (1 = released, 0 = vehicle on the line)
+        with its timestamp, which may lie shortly in the past.
+        """
+        self.update(t_ms)
+        if level != self.level:
+            self.level = level
+            self.change_ms = t_ms
+
+    def update(self, t_ms):
+        """Apply the debounce rule at t_ms, against the light at t_ms."""
+        if time.ticks_diff(t_ms, self.change_ms) <= self.DEBOUNCE_MS:
+            return
+        if self.level == 0:
+            if not self.handled and self.traffic.was_car_red_at(t_ms):
+                self.fines += 1
+                self.handled = True
+        else:
+            self.handled = False
+
+
+class DisplayController:
+    """
+    Decides what the OLED shows; a renderer (if any) is called only when
+    the screen or the countdown value changes. The countdown runs to
+    the phase's real end, including a corridor hold.
+    """
+    __slots__ = ("traffic", "screen", "value", "last_ms", "renders", "render")
+
+    UPDATE_INTERVAL_MS = 500
+
+    def __init__(self, traffic_ctl, now_ms, render=None):
+        self.traffic = traffic_ctl
+        self.screen = -1
+        self.value = -1
+        self.last_ms = now_ms
+        self.renders = 0
+        self.render = render    # callable(screen, value) or None
+
+    def update(self, now_ms):
+        if time.ticks_diff(now_ms, self.last_ms) < self.UPDATE_INTERVAL_MS:
+            return
+        self.last_ms = now_ms
+        state = self.traffic.state
+        if state == traffic.TRAFFIC_CAR_GREEN:
+            screen, value = state, -1
+        elif state == traffic.TRAFFIC_WAIT_BEFORE_PED or state == traffic.TRAFFIC_PED_GREEN:
+            screen, value = state, self.traffic.remaining_ms(now_ms) // 1000
+        else:
+            return
+        if screen != self.screen or value != self.value:
+            self.screen = screen
+            self.value = value
+            self.renders += 1
+            if self.render is not None:
+                self.render(screen, value)
+
+
+class Intersection:
+    """One crossing: traffic, buzzer, violation and display controllers."""
+    __slots__ = ("out", "traffic", "buzzer", "violation", "display", "offset_ms")
+
+    def __init__(self, now_ms, offset_ms=0, out=None, flow=0.5):
+        self.out = out if out is not None else StubOutputs()
+        self.offset_ms = offset_ms     # green-wave offset along the corridor
+        self.traffic = TrafficController(self.out, now_ms, flow)
+        self.buzzer = BuzzerController(self.out, self.traffic, now_ms)
+        self.violation = ViolationController(self.traffic, now_ms)
+        self.display = DisplayController(self.traffic, now_ms)
+
+    def press(self):
+        """Pedestrian button press (already debounced)."""
+        self.traffic.request_pedestrian()
+        self.buzzer.request_confirmation_beep()
+
+    def update(self, now_ms):
+        self.traffic.update(now_ms)
+        self.buzzer.update(now_ms)
+        self.display.update(now_ms)
+        self.violation.update(now_ms)
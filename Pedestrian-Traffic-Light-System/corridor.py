@@ -0,0 +1,76 @@
+# corridor.py
+import time
+import traffic
+import scheduler
+from controllers import Intersection
+
+# ======= Green-Wave Corridor =======
+# Coordinator for several crossings along one avenue. Vehicles travel
+# as platoons: a platoon leaves the first intersection every CYCLE_MS
+# and reaches intersection i offset_ms later, taking PLATOON_MS to
+# pass. To keep this green wave, a pedestrian phase is released only at
+# the start of the gap after a platoon; requests that arrive before
+# that gap are served together in one phase.
+CYCLE_MS = 90_000      # green-wave cycle
+PLATOON_MS = 30_000    # time for a platoon to pass one stop line
+TRAVEL_MS = 12_000     # default travel time between neighbours
+
+
+class Corridor:
+    __slots__ = ("intersections", "epoch_ms", "cycle_ms", "platoon_ms",
+                 "batched", "released")
+
+    def __init__(self, count, now_ms, travel_ms=TRAVEL_MS, flow=0.5):
+        self.epoch_ms = now_ms
+        self.cycle_ms = CYCLE_MS
+        self.platoon_ms = PLATOON_MS
+        self.batched = 0     # requests folded into an already scheduled phase
+        self.released = 0    # pedestrian phases released
+        self.intersections = [
+            Intersection(now_ms, (i * travel_ms) % CYCLE_MS, flow=flow)
+            for i in range(count)
+        ]
+
+    def next_gap_ms(self, index, not_before_ms):
+        """
+        First tick >= not_before_ms at which a platoon has just cleared
+        intersection index (the start of its green-wave gap).
+        """
+        offset = self.intersections[index].offset_ms + self.platoon_ms
+        since = time.ticks_diff(not_before_ms, self.epoch_ms) - offset
+        wait = (-since) % self.cycle_ms
+        return time.ticks_add(not_before_ms, wait)
+
+    def press(self, index, now_ms):
+        """
+        Pedestrian press at one intersection. It joins a scheduled phase
+        if one is about to start (wait or yellow before the walk) or a
+        request is already pending; a press during or after the walk
+        starts the next cycle.
+        """
+        ctl = self.intersections[index].traffic
+        if ctl.is_walk_scheduled() or (ctl.request and not ctl.is_pedestrian_green()):
+            self.batched += 1
+        self.intersections[index].press()
+
+    def update(self, now_ms):
+        """Update every intersection, scheduling walk phases into gaps."""
+        for index, node in enumerate(self.intersections):
+            ctl = node.traffic
+            if ctl.state == traffic.TRAFFIC_WAIT_BEFORE_PED and ctl.hold_until_ms is None:
+                # The flow-derived wait is the minimum; then align to the gap
+                earliest = time.ticks_add(ctl.start_ms, ctl.phase_ms)
+                ctl.hold_until_ms = self.next_gap_ms(index, earliest)
+                self.released += 1
+            node.update(now_ms)
+
+    def next_deadline_ms(self, now_ms):
+        """Earliest traffic deadline over all intersections (None if idle)."""
+        deadline = None
+        for node in self.intersections:
+            deadline = scheduler.earliest(now_ms, deadline,
+                                          node.traffic.next_deadline_ms(now_ms))
+        return deadline
+
+    def fines(self):
+        return sum(node.violation.fines for node in self.intersections)
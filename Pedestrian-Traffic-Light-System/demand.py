@@ -0,0 +1,164 @@
+# demand.py
+import time
+from array import array
+from machine import RTC
+import traffic_flow
+
+# ======= Pedestrian Demand Prediction =======
+# Learns how often the button is pressed in each slot of the day
+# (fixed histogram, constant memory). When a press is very likely soon
+# anyway and the flow is not heavy, the wait after a press counts the
+# car green already given: cars still get the full flow-based wait as
+# minimum green since their last red, but a pedestrian arriving late in
+# a long car green waits only DEMAND_MIN_WAIT_MS. Otherwise the wait is
+# unchanged. python -m sim.bench_demand compares both policies.
+DEMAND_ENABLED = False
+
+DEMAND_BUCKET_MS = 900_000      # 15 min slots, 96 per day
+DEMAND_EMA_SHIFT = 2            # a new day weighs 1 / 2**DEMAND_EMA_SHIFT
+DEMAND_HORIZON_MS = 120_000     # look-ahead of the prediction
+DEMAND_MIN_EXPECTED = 32        # presses expected within the horizon, x16 (2.0 ≈ 86 %)
+DEMAND_MAX_FLOW = 3072          # raw flow above which cars keep the full wait
+DEMAND_MIN_WAIT_MS = 3000       # shortest wait after a press
+
+DAY_MS = 86_400_000
+NUM_BUCKETS = DAY_MS // DEMAND_BUCKET_MS
+_RATE_FRAC = 4                  # fixed-point fraction bits of the rates
+_MAX_PRESSES = 0xFFFF >> _RATE_FRAC
+
+# Presses per bucket, EMA over days, fixed point
+_rate = array('H', [0] * NUM_BUCKETS)
+_seen = bytearray(NUM_BUCKETS)   # 1 once a bucket was observed whole
+_bucket = 0           # current bucket
+_bucket_whole = False # False for the bucket the clock was set in
+_bucket_presses = 0   # presses counted in it so far today
+_bucket_end_ms = 0    # time of day at which it ends
+_day_ms = 0           # time of day
+_last_ms = 0
+
+# Statistics
+_presses = 0
+_shortened = 0
+_saved_ms = 0
+
+
+def init_demand():
+    """Place the day clock from the RTC (midnight at boot if it is not set)."""
+    global _last_ms, _presses, _shortened, _saved_ms
+    _presses = 0
+    _shortened = 0
+    _saved_ms = 0
+    _last_ms = time.ticks_ms()
+    day_ms = 0
+    dt = RTC().datetime()   # (year, month, day, weekday, h, m, s, subseconds)
+    if dt[0] >= 2024:
+        day_ms = ((dt[4] * 60 + dt[5]) * 60 + dt[6]) * 1000
+    set_time_of_day_ms(day_ms)
+
+
+def set_time_of_day_ms(day_ms):
+    """Set the day clock, e.g. after an NTP sync."""
+    global _day_ms, _bucket, _bucket_presses, _bucket_end_ms, _bucket_whole
+    _day_ms = day_ms % DAY_MS
+    _bucket = _day_ms // DEMAND_BUCKET_MS
+    _bucket_presses = 0
+    _bucket_whole = False
+    _bucket_end_ms = (_bucket + 1) * DEMAND_BUCKET_MS
+
+
+def _advance(now_ms):
+    """Move the day clock to now, folding every bucket that ended into its rate."""
+    global _day_ms, _last_ms, _bucket, _bucket_presses, _bucket_end_ms, _bucket_whole
+    _day_ms += time.ticks_diff(now_ms, _last_ms)
+    _last_ms = now_ms
+    while _day_ms >= _bucket_end_ms:
+        count = _bucket_presses << _RATE_FRAC
+        if not _bucket_whole:
+            pass   # joined halfway: the count is too low to learn from
+        elif _seen[_bucket]:
+            rate = _rate[_bucket]
+            _rate[_bucket] = rate + ((count - rate) >> DEMAND_EMA_SHIFT)
+        else:
+            _rate[_bucket] = count   # first day: take it as is
+            _seen[_bucket] = 1
+        _bucket_presses = 0
+        _bucket_whole = True
+        _bucket += 1
+        if _bucket == NUM_BUCKETS:
+            _bucket = 0
+            _day_ms -= DAY_MS
+        _bucket_end_ms = (_bucket + 1) * DEMAND_BUCKET_MS
+
+
+def note_press(now_ms):
+    """Called for every debounced press of the pedestrian button."""
+    global _bucket_presses, _presses
+    if not DEMAND_ENABLED:
+        return
+    _advance(now_ms)
+    if _bucket_presses < _MAX_PRESSES:
+        _bucket_presses += 1
+    _presses += 1
+
+
+def is_press_likely():
+    """True if DEMAND_MIN_EXPECTED presses are expected within DEMAND_HORIZON_MS."""
+    # Integer seconds keep the products small ints on the board
+    expected = _rate[_bucket] * (DEMAND_HORIZON_MS // 1000)
+    return expected >= DEMAND_MIN_EXPECTED * (DEMAND_BUCKET_MS // 1000)
+
+
+def adjust_wait_ms(wait_ms, car_green_ms, now_ms):
+    """
+    Wait before pedestrian green for a press arriving car_green_ms into
+    the car green phase, given the flow-based wait_ms. Never less than
+    wait_ms of car green in total.
+    """
+    global _shortened, _saved_ms
+    if not DEMAND_ENABLED:
+        return wait_ms
+    _advance(now_ms)
+    if traffic_flow.get_flow_raw() >= DEMAND_MAX_FLOW or not is_press_likely():
+        return wait_ms
+    shortened = wait_ms - car_green_ms
+    if shortened < DEMAND_MIN_WAIT_MS:
+        shortened = DEMAND_MIN_WAIT_MS
+    if shortened < wait_ms:
+        _shortened += 1
+        _saved_ms += wait_ms - shortened
+        return shortened
+    return wait_ms
+
+
+def next_deadline_ms(now_ms):
+    """Return the tick at which the current bucket ends, or None when disabled."""
+    if not DEMAND_ENABLED:
+        return None
+    return time.ticks_add(_last_ms, _bucket_end_ms - _day_ms)
+
+
+def update_demand(now_ms):
+    """
+    Close the current bucket once its slot of the day is over.
+    Called periodically in the main loop.
+    """
+    if DEMAND_ENABLED:
+        _advance(now_ms)
+
+
+def get_rate(bucket):
+    """Learned presses per bucket (float, for the REPL and the simulator)."""
+    return _rate[bucket] / (1 << _RATE_FRAC)
+
+
+def report():
+    """Print the learned day profile and what it changed (call from the REPL)."""
+    print("presses: {}  shortened waits: {}  saved: {} s".format(
+        _presses, _shortened, _saved_ms // 1000))
+    per_hour = 3_600_000 // DEMAND_BUCKET_MS
+    for hour in range(NUM_BUCKETS // per_hour):
+        total = 0
+        for b in range(hour * per_hour, (hour + 1) * per_hour):
+            total += _rate[b]
+        print("{:02d}:00 {:6.1f} presses/h{}".format(
+            hour, total / (1 << _RATE_FRAC), "  <" if hour == _bucket // per_hour else ""))
@@ -0,0 +1,185 @@
+# detector.py
+import time
+from array import array
+from machine import disable_irq, enable_irq
+import hardware
+
+try:
+    from machine import Counter   # ESP32 pulse counter (PCNT), recent firmware
+except ImportError:
+    Counter = None
+
+# ======= Vehicle Detector =======
+# Flow source for traffic_flow.FLOW_SOURCE_DETECTOR: an inductive loop
+# or IR counter drives hardware.DETECTOR_PIN high while a vehicle is
+# over it. The pin IRQ counts vehicles and occupied time; the flow
+# sampler closes one-second bins of a fixed circular window, so
+# vehicles/minute and occupancy cost the same at any pulse rate.
+# With the pulse counter the hardware counts and no IRQ runs per
+# vehicle, but occupancy is not measured.
+DETECTOR_WINDOW_S = 60          # seconds in the window
+DETECTOR_SATURATION_VPM = 30    # vehicles/minute read as flow 1.0 (one lane)
+DETECTOR_JAM_PERMILLE = 500     # occupancy read as flow 1.0 (queue over the loop)
+DETECTOR_USE_PCNT = False       # count with machine.Counter if the firmware has it
+
+FLOW_MAX = 4095                 # same scale as the potentiometer ADC
+_MASK = 0x3FFFFFFF              # IRQ counters wrap here (small ints)
+
+# ======= Window (main loop only) =======
+_bin_count = array('H', [0] * DETECTOR_WINDOW_S)
+_bin_occ_ms = array('H', [0] * DETECTOR_WINDOW_S)
+_bin = 0              # next bin to write
+_filled = 0           # bins holding data
+_win_count = 0        # running sums over the window
+_win_occ_ms = 0
+_bin_start_ms = 0     # start of the open bin
+_seen_pulses = 0      # counters at the last bin close
+_seen_occ_us = 0
+_counter = None
+_counter_base = 0     # pulse counter value at init
+
+# ======= Written by the IRQ =======
+_pulses = 0           # vehicles so far (wraps at _MASK)
+_occ_us = 0           # occupied time of vehicles that left (wraps at _MASK)
+_on_us = 0            # arrival of the vehicle over the loop
+_present = 0
+
+
+def init_detector():
+    """Clear the window and start counting pulses."""
+    global _bin, _filled, _win_count, _win_occ_ms, _bin_start_ms
+    global _seen_pulses, _seen_occ_us, _counter, _counter_base, _pulses, _occ_us, _present
+    hardware.init_detector_pin()
+    for i in range(DETECTOR_WINDOW_S):
+        _bin_count[i] = 0
+        _bin_occ_ms[i] = 0
+    _bin = 0
+    _filled = 0
+    _win_count = 0
+    _win_occ_ms = 0
+    _bin_start_ms = time.ticks_ms()
+    _pulses = 0
+    _occ_us = 0
+    _present = 0
+    _seen_pulses = 0
+    _seen_occ_us = 0
+
+    pin = hardware.detector_pin
+    if DETECTOR_USE_PCNT and Counter is not None:
+        _counter = Counter(0, pin, direction=Counter.UP, edge=Counter.RISING)
+        _counter_base = _counter.value() & _MASK
+        _seen_pulses = _counter_base
+    else:
+        pin.irq(handler=_on_edge, trigger=hardware.Pin.IRQ_RISING | hardware.Pin.IRQ_FALLING)
+
+
+def _on_edge(pin):
+    """Vehicle arrives (high) or leaves (low). IRQ context, no allocation."""
+    global _pulses, _occ_us, _on_us, _present
+    now = time.ticks_us()
+    if pin.value():
+        if not _present:
+            _present = 1
+            _on_us = now
+            _pulses = (_pulses + 1) & _MASK
+    elif _present:
+        _present = 0
+        _occ_us = (_occ_us + time.ticks_diff(now, _on_us)) & _MASK
+
+
+def _push_bin(count, occ_ms):
+    """Replace the oldest bin, keeping the window sums up to date."""
+    global _bin, _filled, _win_count, _win_occ_ms
+    i = _bin
+    if count > 0xFFFF:
+        count = 0xFFFF
+    if occ_ms > 1000:
+        occ_ms = 1000
+    _win_count += count - _bin_count[i]
+    _win_occ_ms += occ_ms - _bin_occ_ms[i]
+    _bin_count[i] = count
+    _bin_occ_ms[i] = occ_ms
+    _bin = (i + 1) % DETECTOR_WINDOW_S
+    if _filled < DETECTOR_WINDOW_S:
+        _filled += 1
+
+
+def _close_bins(now_ms):
+    """Close every whole second since the last call (once per second, not per pulse)."""
+    global _bin_start_ms, _seen_pulses, _seen_occ_us, _occ_us, _on_us
+    seconds = time.ticks_diff(now_ms, _bin_start_ms) // 1000
+    if seconds <= 0:
+        return
+    _bin_start_ms = time.ticks_add(_bin_start_ms, seconds * 1000)
+
+    state = disable_irq()
+    if _counter is not None:
+        pulses = _counter.value() & _MASK
+    else:
+        pulses = _pulses
+    if _present:
+        # A vehicle still over the loop: count its time so far now
+        now_us = time.ticks_us()
+        _occ_us = (_occ_us + time.ticks_diff(now_us, _on_us)) & _MASK
+        _on_us = now_us
+    occ_us = _occ_us
+    enable_irq(state)
+
+    count = (pulses - _seen_pulses) & _MASK
+    occ_ms = ((occ_us - _seen_occ_us) & _MASK) // 1000
+    _seen_pulses = pulses
+    _seen_occ_us = occ_us
+
+    # Spread what arrived over the seconds it covers (one bin normally)
+    if seconds > DETECTOR_WINDOW_S:
+        seconds = DETECTOR_WINDOW_S
+    for k in range(seconds - 1, -1, -1):
+        _push_bin(count // (k + 1), occ_ms // (k + 1))
+        count -= count // (k + 1)
+        occ_ms -= occ_ms // (k + 1)
+
+
+def get_vehicles_per_min():
+    """Vehicles per minute over the window."""
+    if _filled == 0:
+        return 0
+    return _win_count * 60 // _filled
+
+
+def get_occupancy_permille():
+    """Share of the window with a vehicle over the loop (0–1000)."""
+    if _filled == 0:
+        return 0
+    return _win_occ_ms // _filled
+
+
+def get_pulses():
+    """Vehicles counted since init (wraps at 2**30)."""
+    if _counter is not None:
+        return (_counter.value() - _counter_base) & _MASK
+    return _pulses
+
+
+def read_level_raw(now_ms):
+    """
+    Flow on the potentiometer scale (0–4095): vehicles/minute against
+    DETECTOR_SATURATION_VPM, or occupancy against DETECTOR_JAM_PERMILLE
+    if higher (a standing queue passes few vehicles but is heavy traffic).
+    """
+    _close_bins(now_ms)
+    vpm = get_vehicles_per_min()
+    if vpm > DETECTOR_SATURATION_VPM:
+        vpm = DETECTOR_SATURATION_VPM
+    occ = get_occupancy_permille()
+    if occ > DETECTOR_JAM_PERMILLE:
+        occ = DETECTOR_JAM_PERMILLE
+    level = vpm * FLOW_MAX // DETECTOR_SATURATION_VPM
+    occ_level = occ * FLOW_MAX // DETECTOR_JAM_PERMILLE
+    return occ_level if occ_level > level else level
+
+
+def report():
+    """Print the detector window (call from the REPL)."""
+    print("vehicles: {}  per minute: {}  occupancy: {}.{} %  ({})".format(
+        get_pulses(), get_vehicles_per_min(), get_occupancy_permille() // 10,
+        get_occupancy_permille() % 10, "pulse counter" if _counter is not None else "pin IRQ"))
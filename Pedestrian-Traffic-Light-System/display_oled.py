@@ -1,77 +1,444 @@
-# display_oled.py
-import time
-import hardware
-import traffic
-
-LCD_UPDATE_INTERVAL_MS = 500
-_last_lcd_update_ms = 0
-
-
-def init_display():
-    """Initialize OLED display and show idle message."""
-    global _last_lcd_update_ms
-    _last_lcd_update_ms = time.ticks_ms()
-    # Try to init OLED
-    hardware.init_oled()
-    # If OLED is not available, just don't crash
-    if hardware.oled is not None:
-        show_idle()
-    else:
-        print("Display not available, skipping OLED drawing")
-
-
-def show_idle():
-    if hardware.oled is None:
-        return
-    hardware.oled.fill(0)
-    hardware.oled.text(" Press button ", 0, 0)
-    hardware.oled.text("   to cross",   0, 20)
-    hardware.oled.show()
-
-
-def show_wait(remaining_s):
-    if hardware.oled is None:
-        return
-    hardware.oled.fill(0)
-    hardware.oled.text("Wait to cross", 0, 0)
-    msg = " Opens in {}s".format(remaining_s)
-    hardware.oled.text(msg, 0, 20)
-    hardware.oled.show()
-
-
-def show_cross(remaining_s):
-    if hardware.oled is None:
-        return
-    hardware.oled.fill(0)
-    hardware.oled.text("Safe to cross ", 0, 0)
-    msg = " Time left {}s".format(remaining_s)
-    hardware.oled.text(msg, 0, 20)
-    hardware.oled.show()
-
-
-def update_lcd(now_ms):
-    """
-    Periodically update the OLED display according to the current
-    traffic state and remaining times.
-    """
-    global _last_lcd_update_ms
-
-    if hardware.oled is None:
-        return  # OLED not available, do nothing
-
-    if time.ticks_diff(now_ms, _last_lcd_update_ms) < LCD_UPDATE_INTERVAL_MS:
-        return
-
-    _last_lcd_update_ms = now_ms
-    state = traffic.get_state()
-
-    if state == traffic.TRAFFIC_CAR_GREEN:
-        show_idle()
-
-    elif state == traffic.TRAFFIC_WAIT_BEFORE_PED:
-        remaining_ms = traffic.get_wait_remaining_ms(now_ms)
-        show_wait(remaining_ms // 1000)
-
-    elif state == traffic.TRAFFIC_PED_GREEN:
-        remaining_ms, _ = traffic.get_ped_remaining_and_total_ms(now_ms)
-        show_cross(remaining_ms // 1000)
+# display_oled.py
+import time
+import hardware
+import traffic
+import trace_log
+
+LCD_UPDATE_INTERVAL_MS = 500
+_last_lcd_update_ms = 0
+_shown_state = -1  # traffic state currently on screen
+
+# ======= Screen Layout =======
+OLED_WIDTH = 128
+OLED_HEIGHT = 64
+VALUE_Y = 20  # countdown line (pages 2 and 3)
+
+# SSD1306 addressing commands (same values as the ssd1306 driver)
+SET_COL_ADDR = 0x21
+SET_PAGE_ADDR = 0x22
+CTRL_CMD_STREAM = 0x00   # control byte: every following byte is a command
+CTRL_DATA = 0x40         # control byte: display data follows
+
+# Power-up sequence of the ssd1306 driver's init_display(), sent as one
+# command stream without the full frame it shows afterwards: off,
+# horizontal addressing, start line, segment remap, multiplex, COM scan,
+# offset, COM pins, clock, pre-charge, VCOM, contrast, RAM, normal,
+# charge pump, on
+_INIT_CMDS = bytes((CTRL_CMD_STREAM,
+                    0xAE, 0x20, 0x00, 0x40, 0xA1, 0xA8, OLED_HEIGHT - 1, 0xC8,
+                    0xD3, 0x00, 0xDA, 0x12, 0xD5, 0x80, 0xD9, 0xF1, 0xDB, 0x30,
+                    0x81, 0xFF, 0xA4, 0xA6, 0x8D, 0x14, 0xAF))
+
+# ======= Chunked Transport =======
+# A frame is sent in chunks of OLED_CHUNK_BYTES (a part of one page),
+# a few per loop pass, so a pass never blocks for a whole frame
+# (~25 ms at 400 kHz). More chunks are sent in the same pass only while
+# the measured cost fits in OLED_FLUSH_BUDGET_US (0 = no limit).
+OLED_CHUNK_BYTES = 64          # 16, 32, 64 or 128
+OLED_FLUSH_BUDGET_US = 4000
+
+# A NACK leaves the chunk queued and retries after a growing back-off;
+# after OLED_REINIT_AFTER failures in a row the panel is initialized
+# again. A panel missing at boot is probed every OLED_PROBE_MS.
+OLED_RETRY_MS = 100
+OLED_RETRY_MAX_MS = 5000
+OLED_REINIT_AFTER = 3
+OLED_PROBE_MS = 10_000
+
+SCREEN_NONE = 0
+SCREEN_IDLE = 1
+SCREEN_WAIT = 2
+SCREEN_CROSS = 3
+
+# Prerendered static screens (filled by init_display)
+_screen_fb = [None, None, None, None]
+
+# What the panel currently shows
+_shown_screen = SCREEN_NONE
+_shown_value = -1
+
+# Double buffer: drawing goes to oled.buffer, chunks are sent from
+# _tx_fb, a snapshot that does not change until the frame is complete.
+# Once every chunk is sent _tx_fb is also what the panel shows.
+_tx_fb = None
+_chunk_cmd = ()          # prebuilt addressing command per chunk
+_chunk_data = ()         # prebuilt (control byte, view of _tx_fb) per chunk
+_dirty = None            # 1 per chunk still to be sent
+_dirty_count = 0
+_next_chunk = 0
+
+# Frame drawn while another was being sent (page range, full screen)
+_pending = False
+_pending_first = 0
+_pending_last = 0
+_pending_full = False
+
+# NACK recovery
+_fails = 0               # consecutive failed transfers
+_retry_ms = 0            # no transfer / probe before this tick
+
+# Statistics
+_chunks_sent = 0
+_nacks = 0
+_reinits = 0
+_pass_max_us = 0
+
+# Where the phase and countdowns are read: traffic.py, or the
+# snapshot.py copy when the display runs in its own thread (main_dual.py)
+_source = traffic
+
+# Countdown lines, built once so the refresh creates no strings
+MAX_COUNTDOWN_S = 99
+_wait_text = ()
+_cross_text = ()
+
+
+def set_source(source):
+    """Read the traffic phase from source (traffic or snapshot)."""
+    global _source
+    _source = source
+
+
+def init_display():
+    """Initialize OLED display and show idle message."""
+    global _last_lcd_update_ms, _shown_state, _fails, _retry_ms
+    global _chunks_sent, _nacks, _reinits, _pass_max_us
+    _last_lcd_update_ms = time.ticks_ms()
+    _shown_state = traffic.TRAFFIC_CAR_GREEN
+    _fails = 0
+    _retry_ms = time.ticks_add(_last_lcd_update_ms, OLED_PROBE_MS)
+    _chunks_sent = 0
+    _nacks = 0
+    _reinits = 0
+    _pass_max_us = 0
+    # Try to init OLED
+    hardware.init_oled()
+    # If OLED is not available, just don't crash
+    if hardware.oled is not None:
+        _prerender_screens()
+        show_idle()
+    else:
+        print("Display not available, probing every", OLED_PROBE_MS, "ms")
+
+
+def _prerender_screens():
+    """
+    Draw the static part of every screen once and keep a copy,
+    so switching screens is a buffer copy instead of text drawing.
+    """
+    global _shown_screen, _shown_value, _wait_text, _cross_text
+    oled = hardware.oled
+
+    oled.fill(0)
+    oled.text(" Press button ", 0, 0)
+    oled.text("   to cross",   0, VALUE_Y)
+    _screen_fb[SCREEN_IDLE] = bytearray(oled.buffer)
+
+    oled.fill(0)
+    oled.text("Wait to cross", 0, 0)
+    _screen_fb[SCREEN_WAIT] = bytearray(oled.buffer)
+
+    oled.fill(0)
+    oled.text("Safe to cross ", 0, 0)
+    _screen_fb[SCREEN_CROSS] = bytearray(oled.buffer)
+
+    _wait_text = tuple(" Opens in {}s".format(s) for s in range(MAX_COUNTDOWN_S + 1))
+    _cross_text = tuple(" Time left {}s".format(s) for s in range(MAX_COUNTDOWN_S + 1))
+
+    _init_transport(len(oled.buffer))
+    _shown_screen = SCREEN_NONE
+    _shown_value = -1
+
+
+def _init_transport(size):
+    """
+    Allocate the send buffer and the per-chunk commands and views once,
+    so queueing and sending a chunk allocates nothing.
+    """
+    global _tx_fb, _chunk_cmd, _chunk_data, _dirty, _dirty_count, _next_chunk
+    global _pending
+    _tx_fb = bytearray(size)
+    view = memoryview(_tx_fb)
+    cmds = []
+    data = []
+    for base in range(0, size, OLED_CHUNK_BYTES):
+        page = base // OLED_WIDTH
+        col = base % OLED_WIDTH
+        cmds.append(bytes((CTRL_CMD_STREAM,
+                           SET_COL_ADDR, col, col + OLED_CHUNK_BYTES - 1,
+                           SET_PAGE_ADDR, page, page)))
+        data.append((bytes((CTRL_DATA,)), view[base:base + OLED_CHUNK_BYTES]))
+    _chunk_cmd = tuple(cmds)
+    _chunk_data = tuple(data)
+    _dirty = bytearray(len(cmds))
+    _dirty_count = 0
+    _next_chunk = 0
+    _pending = False
+
+
+def _load_background(screen):
+    """Copy a prerendered screen into the framebuffer (phase changes only)."""
+    hardware.oled.buffer[:] = _screen_fb[screen]
+
+
+def _take_full_frame():
+    """Snapshot the whole framebuffer and queue every chunk (phase changes only)."""
+    global _dirty_count, _next_chunk
+    _tx_fb[:] = hardware.oled.buffer
+    for i in range(len(_dirty)):
+        _dirty[i] = 1
+    _dirty_count = len(_dirty)
+    _next_chunk = 0
+
+
+def _take_frame(first_page, last_page):
+    """
+    Snapshot the given pages of the framebuffer into the send buffer,
+    queueing only the chunks whose bytes differ from the panel.
+    Called only when no chunk is waiting, so _tx_fb mirrors the panel.
+    """
+    global _dirty_count, _next_chunk
+    buf = hardware.oled.buffer
+    for i in range(first_page * OLED_WIDTH, (last_page + 1) * OLED_WIDTH):
+        if buf[i] != _tx_fb[i]:
+            _tx_fb[i] = buf[i]
+            chunk = i // OLED_CHUNK_BYTES
+            if not _dirty[chunk]:
+                _dirty[chunk] = 1
+                _dirty_count += 1
+    _next_chunk = 0
+
+
+def _submit(first_page, last_page, full):
+    """
+    Queue a finished frame. While another frame is still being sent the
+    new one waits (the latest drawing wins) so a frame is never changed
+    halfway through its transfer.
+    """
+    global _pending, _pending_first, _pending_last, _pending_full
+    if _dirty_count:
+        if not _pending:
+            _pending = True
+            _pending_first = first_page
+            _pending_last = last_page
+            _pending_full = full
+        else:
+            if first_page < _pending_first:
+                _pending_first = first_page
+            if last_page > _pending_last:
+                _pending_last = last_page
+            _pending_full = _pending_full or full
+        return
+    if full:
+        _take_full_frame()
+    else:
+        _take_frame(first_page, last_page)
+
+
+def _on_nack(now_ms):
+    """A transfer failed: retry after a growing back-off."""
+    global _fails, _retry_ms, _nacks
+    _nacks += 1
+    _fails += 1
+    shift = _fails - 1
+    if shift > 6:
+        shift = 6
+    delay = OLED_RETRY_MS << shift
+    if delay > OLED_RETRY_MAX_MS:
+        delay = OLED_RETRY_MAX_MS
+    _retry_ms = time.ticks_add(now_ms, delay)
+
+
+def _reinit_panel():
+    """
+    Send the init sequence again after repeated NACKs (the panel may have
+    been power cycled). Only the commands go out here: the panel RAM is
+    lost, so every chunk of the frame in _tx_fb is queued again and
+    reaches the panel within the flush budget like any other frame.
+    """
+    global _reinits, _dirty_count, _next_chunk
+    hardware.i2c.writeto(hardware.oled.addr, _INIT_CMDS)
+    _reinits += 1
+    for i in range(len(_dirty)):
+        _dirty[i] = 1
+    _dirty_count = len(_dirty)
+    _next_chunk = 0
+
+
+def _probe_panel():
+    """Try to bring up a panel that was missing at boot (rare, may allocate)."""
+    hardware.init_oled()
+    if hardware.oled is not None:
+        _prerender_screens()
+
+
+def _pump(now_ms):
+    """
+    Send queued chunks, at least one per pass, more while the
+    average chunk cost so far fits in OLED_FLUSH_BUDGET_US.
+    """
+    global _fails, _next_chunk, _dirty_count, _chunks_sent, _pass_max_us
+    global _pending
+    if _fails and time.ticks_diff(now_ms, _retry_ms) < 0:
+        return
+    start = time.ticks_us()   # the init sequence counts against the budget
+    if _fails >= OLED_REINIT_AFTER:
+        try:
+            _reinit_panel()
+        except OSError:
+            _on_nack(now_ms)
+            return
+
+    i2c = hardware.i2c
+    addr = hardware.oled.addr
+    sent = 0
+    while _dirty_count:
+        chunk = _next_chunk
+        while not _dirty[chunk]:
+            chunk += 1
+        try:
+            i2c.writeto(addr, _chunk_cmd[chunk])
+            i2c.writevto(addr, _chunk_data[chunk])
+        except OSError:
+            _next_chunk = chunk
+            _on_nack(now_ms)
+            return
+        _fails = 0
+        _dirty[chunk] = 0
+        _dirty_count -= 1
+        _next_chunk = chunk + 1
+        _chunks_sent += 1
+        sent += 1
+
+        if not _dirty_count and _pending:
+            # Frame complete: start the one drawn meanwhile
+            _pending = False
+            if _pending_full:
+                _take_full_frame()
+            else:
+                _take_frame(_pending_first, _pending_last)
+
+        elapsed = time.ticks_diff(time.ticks_us(), start)
+        if elapsed > _pass_max_us:
+            _pass_max_us = elapsed
+        if OLED_FLUSH_BUDGET_US and elapsed + elapsed // sent > OLED_FLUSH_BUDGET_US:
+            break
+
+
+def is_flushing():
+    """True while a frame is only partly on the panel."""
+    return _dirty_count > 0
+
+
+def _render(screen, value, texts):
+    """
+    Show a screen with an optional countdown value.
+    Nothing is drawn or sent if the screen and value did not change.
+    """
+    global _shown_screen, _shown_value
+    oled = hardware.oled
+    if oled is None:
+        return
+    if screen == _shown_screen and value == _shown_value:
+        return
+
+    if screen != _shown_screen:
+        # New screen: restore the prerendered background, full refresh
+        _load_background(screen)
+        if texts is not None:
+            oled.text(texts[value], 0, VALUE_Y)
+        _submit(0, OLED_HEIGHT // 8 - 1, True)
+    else:
+        # Same screen: redraw only the countdown line
+        oled.fill_rect(0, VALUE_Y, OLED_WIDTH, 8, 0)
+        oled.text(texts[value], 0, VALUE_Y)
+        _submit(VALUE_Y // 8, (VALUE_Y + 7) // 8, False)
+
+    _shown_screen = screen
+    _shown_value = value
+    if trace_log.TRACE_ENABLED:
+        trace_log.record(time.ticks_ms(), trace_log.K_DISPLAY, screen, value & 0xFFFF)
+
+
+def show_idle():
+    _render(SCREEN_IDLE, -1, None)
+
+
+def _clamp_s(seconds):
+    if seconds > MAX_COUNTDOWN_S:
+        return MAX_COUNTDOWN_S
+    return seconds if seconds > 0 else 0
+
+
+def show_wait(remaining_s):
+    _render(SCREEN_WAIT, _clamp_s(remaining_s), _wait_text)
+
+
+def show_cross(remaining_s):
+    _render(SCREEN_CROSS, _clamp_s(remaining_s), _cross_text)
+
+
+def next_deadline_ms(now_ms):
+    """
+    Return the tick of the next screen refresh or chunk transfer, or
+    None while the idle screen is already shown (nothing on it changes).
+    """
+    if hardware.oled is None:
+        return _retry_ms   # next probe
+    if _dirty_count or _fails:
+        return _retry_ms if _fails else now_ms
+    state = _source.get_state()
+    counting_down = state == traffic.TRAFFIC_WAIT_BEFORE_PED or \
+        state == traffic.TRAFFIC_PED_GREEN
+    if state == _shown_state and not counting_down:
+        return None
+    return time.ticks_add(_last_lcd_update_ms, LCD_UPDATE_INTERVAL_MS)
+
+
+def update_lcd(now_ms):
+    """
+    Periodically update the OLED display according to the current
+    traffic state and remaining times.
+    """
+    global _last_lcd_update_ms, _shown_state, _retry_ms
+
+    if hardware.oled is None:
+        # OLED not available: probe now and then
+        if time.ticks_diff(now_ms, _retry_ms) < 0:
+            return
+        _retry_ms = time.ticks_add(now_ms, OLED_PROBE_MS)
+        _probe_panel()
+        if hardware.oled is None:
+            return
+        _refresh(now_ms)
+
+    elif time.ticks_diff(now_ms, _last_lcd_update_ms) >= LCD_UPDATE_INTERVAL_MS:
+        _refresh(now_ms)
+    _pump(now_ms)
+
+
+def _refresh(now_ms):
+    """Draw the screen for the current traffic state."""
+    global _last_lcd_update_ms, _shown_state
+
+    _last_lcd_update_ms = now_ms
+    state = _source.get_state()
+    _shown_state = state
+
+    if state == traffic.TRAFFIC_CAR_GREEN:
+        show_idle()
+
+    elif state == traffic.TRAFFIC_WAIT_BEFORE_PED:
+        remaining_ms = _source.get_wait_remaining_ms(now_ms)
+        show_wait(remaining_ms // 1000)
+
+    elif state == traffic.TRAFFIC_PED_GREEN:
+        remaining_ms = _source.get_ped_remaining_ms(now_ms)
+        show_cross(remaining_ms // 1000)
+
+
+def report():
+    """Print transport statistics (call from the REPL)."""
+    print("chunks sent: {}  waiting: {}".format(_chunks_sent, _dirty_count))
+    print("nacks: {}  reinits: {}".format(_nacks, _reinits))
+    print("longest flush in one pass: {} us".format(_pass_max_us))
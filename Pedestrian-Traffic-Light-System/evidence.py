@@ -0,0 +1,161 @@
+# evidence.py
+import time
+from array import array
+from machine import disable_irq, enable_irq
+import flash_rgb
+import violation_log
+
+# ======= Evidence Queue =======
+# Every violation becomes one preallocated record (ticks, lane, traffic
+# state, time into red) in a ring read by two consumers: capture, which
+# fires one flash per record spaced CAPTURE_PERIOD_MS apart, and
+# persistence, which appends the records to violation_log. Violations
+# closer together than a flash are queued, not merged. _head and
+# _log_tail each have one writer (push and persistence), so main_dual.py
+# persists from its second thread unlocked. _capture_tail has two: capture
+# advances it, and push moves it past the oldest record when the queue is
+# full. Both run on the safety loop, and each moves it with IRQs off.
+EVIDENCE_QUEUE_SIZE = 32      # power of two, one slot always stays free
+_QUEUE_MASK = EVIDENCE_QUEUE_SIZE - 1
+CAPTURE_PERIOD_MS = 120       # 80 ms flash + a dark gap between captures
+
+_ev_ms = array('I', [0] * EVIDENCE_QUEUE_SIZE)
+_ev_since_red_ms = array('H', [0] * EVIDENCE_QUEUE_SIZE)
+_ev_state = bytearray(EVIDENCE_QUEUE_SIZE)   # traffic state | lane << 4
+
+_head = 0             # next slot to write
+_capture_tail = 0     # next record to capture
+_log_tail = 0         # next record to persist
+_capture_ms = 0       # start of the last capture
+
+# Statistics: queued = captured + capture_skipped + still waiting for capture,
+# and every violation is either queued or dropped
+_queued = 0
+_captured = 0
+_capture_skipped = 0  # queue full: the oldest capture was given up, the record kept
+_dropped = 0          # queue full of unpersisted records: the violation has no record
+_max_depth = 0
+
+
+def init_evidence():
+    """Empty the queue and clear the statistics."""
+    global _head, _capture_tail, _log_tail, _capture_ms
+    global _queued, _captured, _capture_skipped, _dropped, _max_depth
+    _head = 0
+    _capture_tail = 0
+    _log_tail = 0
+    _capture_ms = time.ticks_add(time.ticks_ms(), -CAPTURE_PERIOD_MS)
+    _queued = 0
+    _captured = 0
+    _capture_skipped = 0
+    _dropped = 0
+    _max_depth = 0
+
+
+def push(t_ms, lane, traffic_state, since_red_ms):
+    """
+    Queue the evidence of one violation; return False if it was dropped.
+    When the queue is full, the oldest record still waiting for its
+    capture loses the capture if it is already persisted; otherwise the
+    new violation is dropped and counted.
+    """
+    global _head, _capture_tail, _queued, _capture_skipped, _dropped, _max_depth
+    nxt = (_head + 1) & _QUEUE_MASK
+    if nxt == _log_tail:
+        _dropped += 1
+        return False
+    state = disable_irq()
+    if nxt == _capture_tail:
+        _capture_tail = (_capture_tail + 1) & _QUEUE_MASK
+        _capture_skipped += 1
+    enable_irq(state)
+
+    if since_red_ms > 0xFFFF:
+        since_red_ms = 0xFFFF
+    _ev_ms[_head] = t_ms
+    _ev_since_red_ms[_head] = since_red_ms
+    _ev_state[_head] = traffic_state | (lane << 4)
+    _head = nxt
+    _queued += 1
+
+    depth = pending()
+    if depth > _max_depth:
+        _max_depth = depth
+    return True
+
+
+def pending():
+    """Records still waiting for their capture or for the log."""
+    capture = (_head - _capture_tail) & _QUEUE_MASK
+    log = (_head - _log_tail) & _QUEUE_MASK
+    return capture if capture > log else log
+
+
+def next_capture_deadline_ms(now_ms):
+    """
+    Return the tick of the next capture, or None when none is waiting
+    (or a flash is running: its end wakes the loop).
+    """
+    if _capture_tail == _head or flash_rgb.is_active():
+        return None
+    return time.ticks_add(_capture_ms, CAPTURE_PERIOD_MS)
+
+
+def next_persist_deadline_ms(now_ms):
+    """Return now if records wait for the log, else None."""
+    return now_ms if _log_tail != _head else None
+
+
+def next_deadline_ms(now_ms):
+    """Return the tick of the next log append or capture, or None when the queue is empty."""
+    if _log_tail != _head:
+        return now_ms
+    return next_capture_deadline_ms(now_ms)
+
+
+def update_capture(now_ms):
+    """Start the next capture once the last one is over."""
+    global _capture_tail, _capture_ms, _captured
+    if _capture_tail != _head and not flash_rgb.is_active() and \
+            time.ticks_diff(now_ms, _capture_ms) >= CAPTURE_PERIOD_MS:
+        flash_rgb.start_flash_white()
+        state = disable_irq()
+        _capture_tail = (_capture_tail + 1) & _QUEUE_MASK
+        enable_irq(state)
+        _capture_ms = now_ms
+        _captured += 1
+
+
+def update_persist(now_ms):
+    """Append queued records to the log, at most one batch (one flash write) per call."""
+    global _log_tail
+    n = 0
+    while _log_tail != _head and n < violation_log.BATCH_RECORDS:
+        i = _log_tail
+        state = _ev_state[i]
+        violation_log.append_violation(_ev_ms[i], state & 0x0F,
+                                       _ev_since_red_ms[i], state >> 4)
+        _log_tail = (i + 1) & _QUEUE_MASK
+        n += 1
+
+
+def update_evidence(now_ms):
+    """
+    Persist queued records and start the next capture.
+    Called periodically in the main loop.
+    """
+    update_persist(now_ms)
+    update_capture(now_ms)
+
+
+def get_dropped():
+    """Violations that got no record because the queue was full."""
+    return _dropped
+
+
+def report():
+    """Print the queue statistics (call from the REPL)."""
+    print("evidence: {} queued  {} captured  {} capture skipped  {} dropped  "
+          "{} waiting  max depth {}/{}".format(
+              _queued, _captured, _capture_skipped, _dropped, pending(),
+              _max_depth, EVIDENCE_QUEUE_SIZE - 1))
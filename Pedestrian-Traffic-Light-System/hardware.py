@@ -1,98 +1,265 @@
-# hardware.py
-from machine import Pin, I2C, ADC, PWM
-import ssd1306
-
-# ========= Pin Config =========
-
-# Buttons
-BOT1_PIN = 13  # Pedestrian button
-BOT2_PIN = 12  # Violation sensor / button
-
-# Traffic lights (cars)
-T_RED_PIN = 25
-T_YELLOW_PIN = 26
-T_GREEN_PIN = 33
-
-# RGB flash (for violation)
-F_RED_PIN = 14
-F_GREEN_PIN = 2
-F_BLUE_PIN = 15
-
-# Pedestrian lights
-P_RED_PIN = 5
-P_GREEN_PIN = 18
-
-# Buzzer
-BUZZER_PIN = 27
-
-# Potentiometer (traffic flow simulation)
-ADC_PIN = 32
-
-# ========= Peripheral Objects =========
-
-# I2C and OLED will be initialized later 
-i2c = None
-oled = None
-
-# Buttons
-Bot1 = Pin(BOT1_PIN, Pin.IN, Pin.PULL_UP)
-Bot2 = Pin(BOT2_PIN, Pin.IN, Pin.PULL_UP)
-
-# Traffic LEDs
-T_ledR = Pin(T_RED_PIN, Pin.OUT)
-T_ledY = Pin(T_YELLOW_PIN, Pin.OUT)
-T_ledG = Pin(T_GREEN_PIN, Pin.OUT)
-
-# Flash RGB LEDs
-F_ledR = Pin(F_RED_PIN, Pin.OUT)
-F_ledG = Pin(F_GREEN_PIN, Pin.OUT)
-F_ledB = Pin(F_BLUE_PIN, Pin.OUT)
-
-# Pedestrian LEDs
-P_ledR = Pin(P_RED_PIN, Pin.OUT)
-P_ledG = Pin(P_GREEN_PIN, Pin.OUT)
-
-# Buzzer (PWM)
-buzzer = PWM(Pin(BUZZER_PIN))
-
-# ADC (potentiometer / traffic flow)
-adc = ADC(Pin(ADC_PIN))
-
-
-
-def init_oled():
-    """
-    Initialize I2C and OLED.
-    """
-    global i2c, oled
-    try:
-        i2c = I2C(0, scl=Pin(22), sda=Pin(21), freq=400000)
-        # If your display uses address 0x3D instead of 0x3C, change addr=0x3D
-        oled = ssd1306.SSD1306_I2C(128, 64, i2c)
-        print("OLED initialized successfully")
-    except OSError as e:
-        print("Failed to initialize OLED:", e)
-        oled = None
-
-
-def set_car_lights(red, yellow, green):
-    """Control the 3 LEDs of the car traffic light."""
-    T_ledR.value(1 if red else 0)
-    T_ledY.value(1 if yellow else 0)
-    T_ledG.value(1 if green else 0)
-
-
-def set_ped_lights(red, green):
-    """Control the 2 LEDs of the pedestrian traffic light."""
-    P_ledR.value(1 if red else 0)
-    P_ledG.value(1 if green else 0)
-
-
-def init_outputs():
-    """Initialize outputs in a safe default state."""
-    set_car_lights(False, False, False)
-    set_ped_lights(True, False)
-    F_ledR.value(0)
-    F_ledG.value(0)
-    F_ledB.value(0)
-    buzzer.duty(0)
+# hardware.py
+import time
+from machine import Pin, I2C, ADC, PWM, disable_irq, enable_irq
+import trace_log
+
+# ========= Pin Config =========
+
+# Buttons
+BOT1_PIN = 13  # Pedestrian button
+BOT2_PIN = 12  # Violation sensor / button
+
+# Traffic lights (cars)
+T_RED_PIN = 25
+T_YELLOW_PIN = 26
+T_GREEN_PIN = 33
+
+# RGB flash (for violation)
+F_RED_PIN = 14
+F_GREEN_PIN = 2
+F_BLUE_PIN = 15
+
+# Pedestrian lights
+P_RED_PIN = 5
+P_GREEN_PIN = 18
+
+# Buzzer
+BUZZER_PIN = 27
+
+# Potentiometer (traffic flow simulation)
+ADC_PIN = 32
+
+# Vehicle detector output (inductive loop / IR counter, high while a
+# vehicle is detected), used with traffic_flow.FLOW_SOURCE_DETECTOR
+DETECTOR_PIN = 35
+
+# I2S amplifier (e.g. MAX98357A) for the crossing announcements, see
+# audio.py (the DAC pins 25/26 drive the car lights)
+I2S_SCK_PIN = 19
+I2S_WS_PIN = 23
+I2S_SD_PIN = 4
+
+# ========= Peripheral Objects =========
+
+# I2C and OLED will be initialized later 
+i2c = None
+oled = None
+
+# Buttons
+Bot1 = Pin(BOT1_PIN, Pin.IN, Pin.PULL_UP)
+Bot2 = Pin(BOT2_PIN, Pin.IN, Pin.PULL_UP)
+
+# Traffic LEDs
+T_ledR = Pin(T_RED_PIN, Pin.OUT)
+T_ledY = Pin(T_YELLOW_PIN, Pin.OUT)
+T_ledG = Pin(T_GREEN_PIN, Pin.OUT)
+
+# Flash RGB LEDs
+F_ledR = Pin(F_RED_PIN, Pin.OUT)
+F_ledG = Pin(F_GREEN_PIN, Pin.OUT)
+F_ledB = Pin(F_BLUE_PIN, Pin.OUT)
+
+# Pedestrian LEDs
+P_ledR = Pin(P_RED_PIN, Pin.OUT)
+P_ledG = Pin(P_GREEN_PIN, Pin.OUT)
+
+# Buzzer (PWM) and ADC are created by their boot stage, so importing
+# this module only sets up plain pins. The buzzer pin floats (silent)
+# until then.
+buzzer = None
+adc = None
+detector_pin = None
+audio_out = None
+
+
+def init_buzzer_pwm():
+    """Create the buzzer PWM (once)."""
+    global buzzer
+    if buzzer is None:
+        buzzer = PWM(Pin(BUZZER_PIN))
+
+
+def init_adc():
+    """Create the ADC of the potentiometer (once)."""
+    global adc
+    if adc is None:
+        adc = ADC(Pin(ADC_PIN))
+
+
+def init_detector_pin():
+    """Create the vehicle detector input (once)."""
+    global detector_pin
+    if detector_pin is None:
+        detector_pin = Pin(DETECTOR_PIN, Pin.IN)
+
+
+def init_audio_out(rate, ibuf):
+    """Create the I2S output of the announcements (once): 16-bit mono."""
+    global audio_out
+    if audio_out is None:
+        from machine import I2S   # only loaded when audio is enabled
+        audio_out = I2S(0, sck=Pin(I2S_SCK_PIN), ws=Pin(I2S_WS_PIN), sd=Pin(I2S_SD_PIN),
+                        mode=I2S.TX, bits=16, format=I2S.MONO, rate=rate, ibuf=ibuf)
+
+
+def init_oled():
+    """
+    Initialize I2C and OLED.
+    """
+    global i2c, oled
+    try:
+        import ssd1306   # only loaded by the display stage
+        i2c = I2C(0, scl=Pin(22), sda=Pin(21), freq=400000)
+        # If your display uses address 0x3D instead of 0x3C, change addr=0x3D
+        oled = ssd1306.SSD1306_I2C(128, 64, i2c)
+        print("OLED initialized successfully")
+    except OSError as e:
+        print("Failed to initialize OLED:", e)
+        oled = None
+
+
+# ========= Output Shadow Registers =========
+# Last value written to every output pin and to the buzzer duty.
+# Writes that would not change anything are skipped.
+
+OUT_T_RED = 0
+OUT_T_YELLOW = 1
+OUT_T_GREEN = 2
+OUT_P_RED = 3
+OUT_P_GREEN = 4
+OUT_F_RED = 5
+OUT_F_GREEN = 6
+OUT_F_BLUE = 7
+NUM_OUTPUTS = 8
+
+_out_pins = (T_ledR, T_ledY, T_ledG, P_ledR, P_ledG, F_ledR, F_ledG, F_ledB)
+
+_UNKNOWN = 0xFF
+_out_shadow = bytearray([_UNKNOWN] * NUM_OUTPUTS)
+_buzzer_duty = -1
+_buzzer_freq = -1
+
+# Write statistics
+writes_real = 0
+writes_suppressed = 0
+
+# Light pattern bits for commit_lights()
+LIGHT_T_RED = 1 << OUT_T_RED
+LIGHT_T_YELLOW = 1 << OUT_T_YELLOW
+LIGHT_T_GREEN = 1 << OUT_T_GREEN
+LIGHT_P_RED = 1 << OUT_P_RED
+LIGHT_P_GREEN = 1 << OUT_P_GREEN
+_LIGHT_OUTPUTS = 5  # the first five outputs are the traffic lights
+
+
+def write_output(index, value):
+    """Write one output pin, skipping the write if it is already set."""
+    global writes_real, writes_suppressed
+    v = 1 if value else 0
+    if _out_shadow[index] == v:
+        writes_suppressed += 1
+        return
+    _out_pins[index].value(v)
+    _out_shadow[index] = v
+    writes_real += 1
+    if trace_log.TRACE_ENABLED:
+        trace_log.record(time.ticks_ms(), trace_log.K_OUTPUT, index, v)
+
+
+def set_buzzer_freq(freq):
+    """Set the buzzer PWM frequency, skipping the write if unchanged."""
+    global _buzzer_freq, writes_real, writes_suppressed
+    if freq == _buzzer_freq:
+        writes_suppressed += 1
+        return
+    buzzer.freq(freq)
+    _buzzer_freq = freq
+    writes_real += 1
+    if trace_log.TRACE_ENABLED:
+        trace_log.record(time.ticks_ms(), trace_log.K_BUZZER, 1, freq)
+
+
+def set_buzzer_duty(duty):
+    """Set the buzzer PWM duty, skipping the write if unchanged."""
+    global _buzzer_duty, writes_real, writes_suppressed
+    if duty == _buzzer_duty:
+        writes_suppressed += 1
+        return
+    buzzer.duty(duty)
+    _buzzer_duty = duty
+    writes_real += 1
+    if trace_log.TRACE_ENABLED:
+        trace_log.record(time.ticks_ms(), trace_log.K_BUZZER, 0, duty)
+
+
+def is_buzzer_silent():
+    return _buzzer_duty <= 0
+
+
+def invalidate_outputs():
+    """Forget the shadow state so the next writes reach the pins."""
+    global _buzzer_duty, _buzzer_freq
+    for i in range(NUM_OUTPUTS):
+        _out_shadow[i] = _UNKNOWN
+    _buzzer_duty = -1
+    _buzzer_freq = -1
+
+
+def get_write_counters():
+    """Return (real writes, suppressed writes) since the last reset."""
+    return writes_real, writes_suppressed
+
+
+def reset_write_counters():
+    global writes_real, writes_suppressed
+    writes_real = 0
+    writes_suppressed = 0
+
+
+def commit_lights(pattern):
+    """
+    Apply a whole traffic light pattern (LIGHT_* bits) at once.
+    Interrupts are held off during the update and lights are switched
+    off before others are switched on, so no conflicting combination
+    (e.g. car green with pedestrian green) is ever visible.
+    """
+    state = disable_irq()
+    try:
+        for i in range(_LIGHT_OUTPUTS):
+            if not pattern & (1 << i):
+                write_output(i, 0)
+        for i in range(_LIGHT_OUTPUTS):
+            if pattern & (1 << i):
+                write_output(i, 1)
+    finally:
+        enable_irq(state)
+
+
+def set_car_lights(red, yellow, green):
+    """Control the 3 LEDs of the car traffic light."""
+    write_output(OUT_T_RED, red)
+    write_output(OUT_T_YELLOW, yellow)
+    write_output(OUT_T_GREEN, green)
+
+
+def set_ped_lights(red, green):
+    """Control the 2 LEDs of the pedestrian traffic light."""
+    write_output(OUT_P_RED, red)
+    write_output(OUT_P_GREEN, green)
+
+
+def set_flash_lights(red, green, blue):
+    """Control the 3 channels of the RGB flash LED."""
+    write_output(OUT_F_RED, red)
+    write_output(OUT_F_GREEN, green)
+    write_output(OUT_F_BLUE, blue)
+
+
+def init_outputs():
+    """Initialize outputs in a safe default state."""
+    invalidate_outputs()
+    set_car_lights(False, False, False)
+    set_ped_lights(True, False)
+    set_flash_lights(False, False, False)
+    if buzzer is not None:
+        set_buzzer_duty(0)
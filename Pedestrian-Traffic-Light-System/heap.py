@@ -0,0 +1,101 @@
+# heap.py
+import gc
+import time
+
+# ======= GC Control =======
+# When True the automatic collector is disabled at boot and the main
+# loop collects only at safe points (traffic phase changes), so a
+# collection never lands in the middle of a beep or a display update.
+GC_AT_SAFE_POINTS = False
+
+# Collect anyway if free heap falls below this (bytes), safe point or not
+GC_EMERGENCY_FREE = 8 * 1024
+
+_has_mem_info = hasattr(gc, "mem_free")   # MicroPython only
+
+_low_water = -1        # lowest free heap seen (bytes), -1 if unknown
+_collections = 0
+_emergency = 0         # collections forced by GC_EMERGENCY_FREE
+_pause_max_us = 0
+_pause_total_us = 0
+_pause_last_us = 0
+
+
+def init_heap():
+    """Collect once after boot and switch to safe-point collection if enabled."""
+    global _low_water, _collections, _emergency
+    global _pause_max_us, _pause_total_us, _pause_last_us
+    _low_water = -1
+    _collections = 0
+    _emergency = 0
+    _pause_max_us = 0
+    _pause_total_us = 0
+    _pause_last_us = 0
+    collect()
+    if GC_AT_SAFE_POINTS:
+        gc.disable()
+
+
+def collect():
+    """Run the collector now and record the pause."""
+    global _collections, _pause_max_us, _pause_total_us, _pause_last_us
+    sample()
+    start = time.ticks_us()
+    gc.collect()
+    pause = time.ticks_diff(time.ticks_us(), start)
+    _collections += 1
+    _pause_last_us = pause
+    _pause_total_us += pause
+    if pause > _pause_max_us:
+        _pause_max_us = pause
+
+
+def sample():
+    """Update the free-heap low watermark (no allocation)."""
+    global _low_water
+    if not _has_mem_info:
+        return
+    free = gc.mem_free()
+    if _low_water < 0 or free < _low_water:
+        _low_water = free
+
+
+def check(now_ms):
+    """
+    Called after every loop pass in safe-point mode: keeps the watermark
+    and collects early if the heap is about to run out.
+    """
+    global _low_water, _emergency
+    if not _has_mem_info:
+        return
+    free = gc.mem_free()
+    if _low_water < 0 or free < _low_water:
+        _low_water = free
+    if free < GC_EMERGENCY_FREE:
+        _emergency += 1
+        collect()
+
+
+def safe_point(now_ms):
+    """A moment where a GC pause does no harm (e.g. a phase change)."""
+    if GC_AT_SAFE_POINTS:
+        collect()
+
+
+def get_low_water():
+    """Lowest free heap seen in bytes (-1 where gc.mem_free is missing)."""
+    return _low_water
+
+
+def get_pause_max_us():
+    return _pause_max_us
+
+
+def report():
+    """Print heap and GC statistics (call from the REPL)."""
+    sample()
+    print("heap low water: {} bytes".format(_low_water))
+    print("collections: {} ({} emergency)".format(_collections, _emergency))
+    if _collections:
+        print("gc pause: last {} us, max {} us, mean {} us".format(
+            _pause_last_us, _pause_max_us, _pause_total_us // _collections))
@@ -0,0 +1,112 @@
+# input_events.py
+import time
+from array import array
+import hardware
+import scheduler
+import trace_log
+
+try:
+    import micropython
+    micropython.alloc_emergency_exception_buf(100)
+except ImportError:
+    pass
+
+# ======= Input Channels =======
+CH_BOT1 = 0  # pedestrian button
+CH_BOT2 = 1  # violation sensor
+NUM_CHANNELS = 2
+
+# Edges kept per channel (power of two, one slot always stays free)
+RING_SIZE = 64
+_RING_MASK = RING_SIZE - 1
+
+# ======= Preallocated Ring Buffers =======
+# Written by the IRQ handlers, read by the main loop.
+# Nothing is allocated after import.
+_edge_ms = array('I', [0] * (NUM_CHANNELS * RING_SIZE))
+_edge_level = bytearray(NUM_CHANNELS * RING_SIZE)
+_head = array('I', [0] * NUM_CHANNELS)       # next slot to write (IRQ only)
+_tail = array('I', [0] * NUM_CHANNELS)       # next slot to read (main only)
+_overflows = array('I', [0] * NUM_CHANNELS)  # edges dropped because ring was full
+_last_level = bytearray(NUM_CHANNELS)         # level of the newest edge seen
+
+
+def init_input_events():
+    """
+    Clear the rings and attach edge IRQs to Bot1 and Bot2.
+    """
+    for ch in range(NUM_CHANNELS):
+        _head[ch] = 0
+        _tail[ch] = 0
+        _overflows[ch] = 0
+    _last_level[CH_BOT1] = hardware.Bot1.value()
+    _last_level[CH_BOT2] = hardware.Bot2.value()
+
+    both = hardware.Pin.IRQ_FALLING | hardware.Pin.IRQ_RISING
+    hardware.Bot1.irq(handler=_on_bot1, trigger=both)
+    hardware.Bot2.irq(handler=_on_bot2, trigger=both)
+    scheduler.add_wake_pin(hardware.Bot1, _resync)
+    scheduler.add_wake_pin(hardware.Bot2, _resync)
+
+
+def _push(ch, level):
+    """Store one timestamped edge (IRQ context, no allocation)."""
+    _last_level[ch] = level
+    head = _head[ch]
+    nxt = (head + 1) & _RING_MASK
+    if nxt == _tail[ch]:
+        _overflows[ch] += 1
+    else:
+        slot = ch * RING_SIZE + head
+        now = time.ticks_ms()
+        _edge_ms[slot] = now
+        _edge_level[slot] = level
+        _head[ch] = nxt
+        if trace_log.TRACE_ENABLED:
+            trace_log.record(now, trace_log.K_INPUT, ch, level)
+    scheduler.wake()
+
+
+def _on_bot1(pin):
+    _push(CH_BOT1, pin.value())
+
+
+def _on_bot2(pin):
+    _push(CH_BOT2, pin.value())
+
+
+def _resync():
+    """After a light sleep: store the edges whose IRQ was not taken."""
+    level = hardware.Bot1.value()
+    if level != _last_level[CH_BOT1]:
+        _push(CH_BOT1, level)
+    level = hardware.Bot2.value()
+    if level != _last_level[CH_BOT2]:
+        _push(CH_BOT2, level)
+
+
+def pending(ch):
+    """Return the number of edges waiting on a channel."""
+    return (_head[ch] - _tail[ch]) & _RING_MASK
+
+
+def peek_ms(ch):
+    """Timestamp of the oldest pending edge."""
+    return _edge_ms[ch * RING_SIZE + _tail[ch]]
+
+
+def peek_level(ch):
+    """Pin level after the oldest pending edge (1 = released, 0 = pressed)."""
+    return _edge_level[ch * RING_SIZE + _tail[ch]]
+
+
+def pop(ch):
+    """Discard the oldest pending edge."""
+    _tail[ch] = (_tail[ch] + 1) & _RING_MASK
+
+
+def take_overflows(ch):
+    """Return and clear the number of edges lost on a channel."""
+    lost = _overflows[ch]
+    _overflows[ch] = 0
+    return lost
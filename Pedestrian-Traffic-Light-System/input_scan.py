@@ -0,0 +1,174 @@
+# input_scan.py
+import time
+from machine import mem32
+import hardware
+import scheduler
+import traffic
+import buttons
+import violation
+
+# ======= Port Scanning =======
+# For intersections with several approaches and lanes: every input is
+# sampled by one read of a 32-bit input port and all of them are
+# debounced at once by 2-bit vertical counters, so a pass costs the
+# same for 2 or 32 inputs. Pin IRQs only wake the loop; scanning runs
+# while an input is changing or a lane sensor is held. When disabled,
+# buttons.py and violation.py handle Bot1 and Bot2 from their edge rings.
+INPUT_SCAN_ENABLED = False
+
+GPIO_IN_REG = 0x3FF4403C      # ESP32 input levels of GPIO 0–31
+GPIO_IN1_REG = 0x3FF44040     # GPIO 32–39 (input only, no pull-ups)
+INPUT_PORT_REG = GPIO_IN_REG
+INPUT_PORT_FIRST_PIN = 0      # pin of bit 0 of the port
+
+# Active low, one per approach / one per lane (at most violation.MAX_LANES)
+PED_BUTTON_PINS = (hardware.BOT1_PIN,)
+LANE_SENSOR_PINS = (hardware.BOT2_PIN,)
+
+SCAN_INTERVAL_MS = 12         # 4 equal samples in a row: ~50 ms debounce
+
+_mask = 0             # every configured input
+_ped_mask = 0
+_lane_mask = 0
+_lane_of_bit = bytearray(32)
+_pins = []            # kept so the IRQs stay attached
+
+# Vertical counters: bit i of (_ct1, _ct0) counts samples of input i
+# that disagree with _state; at the fourth one the input toggles
+_state = 0            # debounced, 1 = active (pressed / vehicle on the sensor)
+_ct0 = 0
+_ct1 = 0
+_fined = 0            # lanes already fined for the vehicle on the sensor
+
+_scanning = False
+_edges = 0            # bumped by the IRQ
+_last_scan_ms = 0
+
+# Statistics
+_scans = 0
+_presses = 0
+
+
+def init_input_scan():
+    """Configure the pins, build the masks and start with every input released."""
+    global _mask, _ped_mask, _lane_mask, _state, _ct0, _ct1, _fined
+    global _scanning, _last_scan_ms, _scans, _presses
+    if len(LANE_SENSOR_PINS) > violation.MAX_LANES:
+        raise ValueError("too many lane sensors")
+    _ped_mask = 0
+    _lane_mask = 0
+    del _pins[:]
+    scheduler.clear_wake_pins()   # these pins replace the edge rings' ones
+    both = hardware.Pin.IRQ_FALLING | hardware.Pin.IRQ_RISING
+    for lane, pin_id in enumerate(PED_BUTTON_PINS + LANE_SENSOR_PINS):
+        bit = pin_id - INPUT_PORT_FIRST_PIN
+        if not 0 <= bit < 32:
+            raise ValueError("pin {} is not on the input port".format(pin_id))
+        if lane < len(PED_BUTTON_PINS):
+            _ped_mask |= 1 << bit
+        else:
+            _lane_mask |= 1 << bit
+            _lane_of_bit[bit] = lane - len(PED_BUTTON_PINS)
+        pin = hardware.Pin(pin_id, hardware.Pin.IN, hardware.Pin.PULL_UP)
+        pin.irq(handler=_on_edge, trigger=both)
+        scheduler.add_wake_pin(pin, _resync)
+        _pins.append(pin)
+    _mask = _ped_mask | _lane_mask
+    _state = 0
+    _ct0 = _mask
+    _ct1 = _mask
+    _fined = 0
+    _scans = 0
+    _presses = 0
+    # Inputs already active at boot count once debounced
+    _scanning = True
+    _last_scan_ms = time.ticks_ms()
+
+
+def _on_edge(pin):
+    """Any input changed: scan until it settles (IRQ context, no allocation)."""
+    global _scanning, _edges
+    _edges += 1
+    _scanning = True
+    scheduler.wake()
+
+
+def _resync():
+    """After a light sleep: scan in case an edge IRQ was not taken."""
+    global _scanning
+    _scanning = True
+
+
+def next_deadline_ms(now_ms):
+    """Return the tick of the next scan, or None while every input is settled."""
+    if not _scanning:
+        return None
+    return time.ticks_add(_last_scan_ms, SCAN_INTERVAL_MS)
+
+
+def update_inputs(now_ms):
+    """
+    One scan: read the port, debounce every input in parallel and route
+    new presses and violations. Called periodically in the main loop.
+    """
+    global _state, _ct0, _ct1, _fined, _scanning, _last_scan_ms, _scans
+    if not _scanning or time.ticks_diff(now_ms, _last_scan_ms) < SCAN_INTERVAL_MS:
+        return
+    _last_scan_ms = now_ms
+    _scans += 1
+    edges = _edges
+
+    mask = _mask
+    sample = ~mem32[INPUT_PORT_REG] & mask
+    changed = _state ^ sample
+    _ct0 = ~(_ct0 & changed) & mask
+    _ct1 = (_ct0 ^ (_ct1 & changed)) & mask
+    toggled = changed & _ct0 & _ct1
+    _state ^= toggled
+
+    pressed = toggled & _state & _ped_mask
+    if pressed:
+        _route_presses(pressed, now_ms)
+
+    # A vehicle on a lane sensor while cars see red, once per vehicle
+    on_lane = _state & _lane_mask
+    if on_lane & ~_fined and traffic.is_car_red():
+        _route_violations(on_lane & ~_fined, now_ms)
+        _fined |= on_lane
+    _fined &= on_lane
+
+    # Settled, no vehicle waiting for a red, and no edge since the read
+    if sample == _state and not (on_lane & ~_fined) and edges == _edges:
+        _scanning = False
+
+
+def _route_presses(pressed, now_ms):
+    """Any approach button requests the (shared) crossing."""
+    global _presses
+    while pressed:
+        _presses += pressed & 1
+        pressed >>= 1
+    buttons.request_crossing(now_ms)
+
+
+def _route_violations(lanes, now_ms):
+    """Record one violation per lane bit set."""
+    bit = 0
+    while lanes:
+        if lanes & 1:
+            violation.record_violation(now_ms, _lane_of_bit[bit])
+        lanes >>= 1
+        bit += 1
+
+
+def is_active(pin_id):
+    """Debounced level of one input (True = pressed / vehicle present)."""
+    return bool(_state >> (pin_id - INPUT_PORT_FIRST_PIN) & 1)
+
+
+def report():
+    """Print the scanner state (call from the REPL)."""
+    print("inputs: {}  scans: {}  presses: {}  active: {:08x}".format(
+        len(PED_BUTTON_PINS) + len(LANE_SENSOR_PINS), _scans, _presses, _state))
+    for lane in range(len(LANE_SENSOR_PINS)):
+        print("lane {}: {} violations".format(lane, violation.get_lane_fines(lane)))
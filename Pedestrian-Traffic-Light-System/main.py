@@ -1,43 +1,197 @@
-# main.py
-import time
-import hardware
-import traffic
-import buzzer
-import buttons
-import display_oled
-import flash_rgb
-import violation
-
-
-def init_system():
-    """
-    Initialize all modules and set initial state
-    for the pedestrian traffic light system.
-    """
-    hardware.init_outputs()
-    traffic.init_traffic()
-    buzzer.init_buzzer()
-    buttons.init_buttons()
-    display_oled.init_display()
-    flash_rgb.init_flash()
-    violation.init_violation()
-    print("Pedestrian traffic light system initialized!")
-
-
-def main():
-    init_system()
-    while True:
-        now = time.ticks_ms()
-
-        buttons.update_button(now)
-        traffic.update_traffic_state(now)
-        buzzer.update_buzzer_state(now)
-        display_oled.update_lcd(now)
-        violation.update_violation(now)
-        flash_rgb.update_flash(now)
-
-        time.sleep_ms(5)
-
-
-if __name__ == "__main__":
-    main()
+# main.py
+import time
+import startup
+import hardware
+import traffic
+import buzzer
+import buttons
+import display_oled
+import flash_rgb
+import violation
+import scheduler
+import input_events
+import traffic_flow
+import profiler
+import violation_log
+import heap
+import trace_log
+import telemetry
+import demand
+import input_scan
+import evidence
+import audio
+import tone
+
+
+# ======= Boot Stages =======
+# The lights come first; every later stage only needs the ones before
+# it (a button press beeps, so the buzzer is ready before the inputs).
+STAGE_LIGHTS = 0
+STAGE_FLOW = 1
+STAGE_BUZZER = 2
+STAGE_FLASH = 3
+STAGE_INPUTS = 4
+STAGE_VIOLATION = 5
+STAGE_DISPLAY = 6
+STAGE_HEAP = 7
+STAGE_TELEMETRY = 8
+STAGE_AUDIO = 9
+
+
+def _init_lights():
+    """Safe outputs first, then the traffic FSM (cars green, pedestrians red)."""
+    trace_log.init_trace_log(time.ticks_ms())
+    hardware.init_outputs()
+    traffic.init_traffic()
+
+
+def _init_flow():
+    """Flow sampler, and the demand day clock that reads the flow."""
+    traffic_flow.init_traffic_flow()
+    demand.init_demand()
+
+
+def _init_inputs():
+    if input_scan.INPUT_SCAN_ENABLED:
+        input_scan.init_input_scan()
+    else:
+        input_events.init_input_events()
+        buttons.init_buttons()
+
+
+_BOOT_STAGES = (
+    ("lights", _init_lights),
+    ("flow", _init_flow),
+    ("buzzer", buzzer.init_buzzer),
+    ("flash", flash_rgb.init_flash),
+    ("inputs", _init_inputs),
+    ("violation", violation.init_violation),
+    ("display", display_oled.init_display),
+    ("heap", heap.init_heap),
+    ("telemetry", telemetry.init_telemetry),
+    ("audio", audio.init_audio),
+)
+
+
+def init_system():
+    """
+    Drive the lights to a safe state and start the pedestrian traffic
+    light system. The other subsystems come up in the first loop passes
+    (startup.STAGED_BOOT); startup.report() shows when.
+    """
+    startup.init_startup(_BOOT_STAGES)
+    print("Pedestrian traffic light system initialized!")
+
+
+# ======= Subsystems =======
+# One row per FSM, in pass order: (boot stage it needs, profiler slot,
+# update, next deadline). The plain, profiled and staged passes and
+# next_wakeup() all walk this table, so a new subsystem is one row here.
+SUBSYSTEMS = (
+    (STAGE_FLOW, profiler.PROF_FLOW,
+     traffic_flow.update_traffic_flow, traffic_flow.next_deadline_ms),
+    (STAGE_INPUTS, profiler.PROF_BUTTONS, buttons.update_button, buttons.next_deadline_ms),
+    (STAGE_LIGHTS, profiler.PROF_TRAFFIC,
+     traffic.update_traffic_state, traffic.next_deadline_ms),
+    (STAGE_BUZZER, profiler.PROF_BUZZER, buzzer.update_buzzer_state, buzzer.next_deadline_ms),
+    (STAGE_AUDIO, profiler.PROF_AUDIO, audio.update_audio, audio.next_deadline_ms),
+    (STAGE_DISPLAY, profiler.PROF_DISPLAY, display_oled.update_lcd, display_oled.next_deadline_ms),
+    (STAGE_VIOLATION, profiler.PROF_VIOLATION,
+     violation.update_violation, violation.next_deadline_ms),
+    (STAGE_VIOLATION, profiler.PROF_SCAN, input_scan.update_inputs, input_scan.next_deadline_ms),
+    (STAGE_VIOLATION, profiler.PROF_EVIDENCE, evidence.update_evidence, evidence.next_deadline_ms),
+    (STAGE_FLASH, profiler.PROF_FLASH, flash_rgb.update_flash, flash_rgb.next_deadline_ms),
+    (STAGE_VIOLATION, profiler.PROF_LOG,
+     violation_log.update_violation_log, violation_log.next_deadline_ms),
+    (STAGE_LIGHTS, profiler.PROF_TRACE, trace_log.update_trace_log, trace_log.next_deadline_ms),
+    (STAGE_TELEMETRY, profiler.PROF_TELEMETRY,
+     telemetry.update_telemetry, telemetry.next_deadline_ms),
+    (STAGE_FLOW, profiler.PROF_DEMAND, demand.update_demand, demand.next_deadline_ms),
+)
+
+
+def update_all(now):
+    """Run one pass of every FSM."""
+    if startup.pending():
+        _update_booting(now)
+        return
+    pass_start = time.ticks_us()
+    state = traffic.get_state()
+    if profiler.PROFILE_ENABLED:
+        _update_all_profiled(now)
+    else:
+        for _, _, update, _ in SUBSYSTEMS:
+            update(now)
+
+    new_state = traffic.get_state()
+    if new_state != state:
+        telemetry.note_phase(new_state, now)
+        # Collect right after a phase change, never in the middle of one
+        heap.safe_point(now)
+    if heap.GC_AT_SAFE_POINTS:
+        heap.check(now)
+    if telemetry.TELEMETRY_ENABLED:
+        telemetry.note_pass(time.ticks_diff(time.ticks_us(), pass_start))
+
+
+def _update_booting(now):
+    """A pass during boot: run the next stage, then the FSMs already up."""
+    startup.update_startup(now)
+    for stage, _, update, _ in SUBSYSTEMS:
+        if startup.is_ready(stage):
+            update(now)
+
+
+def _update_all_profiled(now):
+    """Same pass as update_all(), timing every FSM update."""
+    loop_start = time.ticks_us()
+    for _, slot, update, _ in SUBSYSTEMS:
+        start = time.ticks_us()
+        update(now)
+        profiler.record(slot, time.ticks_diff(time.ticks_us(), start))
+    profiler.record(profiler.PROF_LOOP, time.ticks_diff(time.ticks_us(), loop_start))
+
+
+def next_wakeup(now):
+    """
+    Return the earliest deadline reported by the FSMs
+    (None if all of them are idle).
+    """
+    if startup.pending():
+        return startup.next_deadline_ms(now)
+    deadline = None
+    for _, _, _, next_deadline in SUBSYSTEMS:
+        deadline = scheduler.earliest(now, deadline, next_deadline(now))
+    return deadline
+
+
+def can_light_sleep():
+    """
+    True when nothing needs a peripheral clock until the next deadline:
+    the buzzer, tone timer, audio, flash and telemetry UART are idle and
+    the detector is not counting pulses.
+    """
+    if startup.pending():
+        return False
+    return hardware.is_buzzer_silent() and not tone.is_playing() and \
+        audio.is_idle() and not flash_rgb.is_active() and \
+        not telemetry.is_sending() and \
+        traffic_flow.FLOW_SOURCE != traffic_flow.FLOW_SOURCE_DETECTOR
+
+
+def main():
+    init_system()
+    deadline = None
+    while True:
+        now = time.ticks_ms()
+        if profiler.PROFILE_ENABLED:
+            profiler.record_wakeup(deadline, now)
+        update_all(now)
+
+        # Sleep until the next FSM deadline (or a pin, in light sleep)
+        deadline = next_wakeup(now)
+        scheduler.sleep_until(now, deadline, can_light_sleep())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# main_async.py
+import time
+import traffic
+import buttons
+import violation
+import scheduler
+import profiler
+import heap
+import telemetry
+import startup
+import main as superloop
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+# ======= Asyncio Runtime =======
+# Alternative entry point: every subsystem runs as its own asyncio task
+# that sleeps until its own next deadline or until something it depends
+# on changes. Works with uasyncio on the ESP32 and asyncio on CPython.
+# Start it with `import main_async; main_async.main()`.
+
+# One trigger per task that waits for changes (buzzer, display, flash,
+# traffic itself), all set whenever an input or a traffic phase changes
+_changed = []
+
+# Set from the pin IRQs through scheduler.wake()
+_input_flag = None
+
+# Resumes of each task, for comparison with the super-loop
+wakeups = {}
+
+
+# ======= uasyncio / asyncio compatibility =======
+
+def _new_input_flag():
+    """An object with set()/wait() that an IRQ handler may set."""
+    if hasattr(asyncio, "ThreadSafeFlag"):
+        return asyncio.ThreadSafeFlag()
+    loop = asyncio.get_running_loop()
+    event = asyncio.Event()
+
+    class _Flag:
+        def set(self):
+            loop.call_soon_threadsafe(event.set)
+
+        async def wait(self):
+            await event.wait()
+            event.clear()
+
+    return _Flag()
+
+
+class _Change:
+    """
+    Set by _notify(), cleared by the one task that waits on it, so a
+    change made while that task runs is not missed.
+    """
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def set(self):
+        self._event.set()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
+
+
+def _new_change():
+    change = _Change()
+    _changed.append(change)
+    return change
+
+
+async def _wait_for_ms(awaitable, timeout_ms):
+    """Await with a timeout; returns quietly when it expires."""
+    try:
+        if hasattr(asyncio, "wait_for_ms"):
+            await asyncio.wait_for_ms(awaitable, timeout_ms)
+        else:
+            await asyncio.wait_for(awaitable, timeout_ms / 1000)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def _sleep_ms(ms):
+    if hasattr(asyncio, "sleep_ms"):
+        await asyncio.sleep_ms(ms)
+    else:
+        await asyncio.sleep(ms / 1000)
+
+
+def _timeout_ms(deadline_ms):
+    if deadline_ms is None:
+        return scheduler.MAX_SLEEP_MS
+    delay = time.ticks_diff(deadline_ms, time.ticks_ms())
+    if delay > scheduler.MAX_SLEEP_MS:
+        delay = scheduler.MAX_SLEEP_MS
+    return delay
+
+
+def _notify():
+    """Wake every task waiting for a change."""
+    for change in _changed:
+        change.set()
+
+
+# ======= Tasks =======
+
+async def _fsm_task(name, update, next_deadline, trigger):
+    """
+    Generic FSM task: update, then sleep until the FSM's own deadline
+    or until trigger (an event/flag with wait(), or None) fires. An FSM
+    without a deadline only waits for its trigger, so it costs nothing
+    while idle. Each resume counts as a loop pass for the heap check
+    and the pass-time telemetry, as in main.update_all().
+    """
+    wakeups[name] = 0
+    deadline = None
+    while True:
+        now = time.ticks_ms()
+        if profiler.PROFILE_ENABLED:
+            profiler.record_wakeup(deadline, now)
+        pass_start = time.ticks_us()
+        update(now)
+        wakeups[name] += 1
+        if heap.GC_AT_SAFE_POINTS:
+            heap.check(now)
+        if telemetry.TELEMETRY_ENABLED:
+            telemetry.note_pass(time.ticks_diff(time.ticks_us(), pass_start))
+
+        deadline = next_deadline(now)
+        if deadline is None and trigger is not None:
+            await trigger.wait()
+            continue
+        delay = _timeout_ms(deadline)
+        if delay <= 0:
+            await asyncio.sleep(0)
+        elif trigger is None:
+            await _sleep_ms(delay)
+        else:
+            await _wait_for_ms(trigger.wait(), delay)
+
+
+# ======= Task Groups =======
+# The rows of main.SUBSYSTEMS each task runs, by profiler slot. Every
+# row must be in exactly one group.
+_TASK_SLOTS = (
+    ("inputs", (profiler.PROF_BUTTONS, profiler.PROF_VIOLATION, profiler.PROF_SCAN)),
+    ("traffic", (profiler.PROF_TRAFFIC,)),
+    ("buzzer", (profiler.PROF_BUZZER,)),
+    ("audio", (profiler.PROF_AUDIO,)),
+    # Queued violations: log records and the next capture flash
+    ("flash", (profiler.PROF_EVIDENCE, profiler.PROF_FLASH)),
+    ("display", (profiler.PROF_DISPLAY,)),
+    ("background", (profiler.PROF_FLOW, profiler.PROF_LOG, profiler.PROF_TRACE,
+                    profiler.PROF_TELEMETRY, profiler.PROF_DEMAND)),
+)
+
+
+def _rows(slots):
+    """(update, next deadline) of the main.SUBSYSTEMS rows in slots, in pass order."""
+    return tuple((update, next_deadline)
+                 for _, slot, update, next_deadline in superloop.SUBSYSTEMS
+                 if slot in slots)
+
+
+def _check_groups():
+    """Fail at start if a subsystem is in no task group or in two."""
+    for _, slot, _, _ in superloop.SUBSYSTEMS:
+        groups = [name for name, slots in _TASK_SLOTS if slot in slots]
+        if len(groups) != 1:
+            raise ValueError("subsystem {} in task groups {}".format(
+                profiler.SLOT_NAMES[slot], groups))
+
+
+def _group_update(rows):
+    """One update for a task: its rows in pass order."""
+    def update(now):
+        for row_update, _ in rows:
+            row_update(now)
+    return update
+
+
+def _group_deadline(rows):
+    """The earliest deadline of a task's rows."""
+    def next_deadline(now):
+        deadline = None
+        for _, row_deadline in rows:
+            deadline = scheduler.earliest(now, deadline, row_deadline(now))
+        return deadline
+    return next_deadline
+
+
+def _inputs_update(rows):
+    update = _group_update(rows)
+
+    def update_inputs(now):
+        requests = buttons.get_requests()
+        fines = violation.get_fines()
+        update(now)
+        # Only a press or a violation wakes traffic, buzzer and flash
+        if buttons.get_requests() != requests or violation.get_fines() != fines:
+            _notify()
+    return update_inputs
+
+
+def _traffic_update(rows):
+    update = _group_update(rows)
+
+    def update_traffic(now):
+        # A phase change may wake buzzer and display
+        state = traffic.get_state()
+        update(now)
+        new_state = traffic.get_state()
+        if new_state != state:
+            telemetry.note_phase(new_state, now)
+            heap.safe_point(now)
+            _notify()
+    return update_traffic
+
+
+async def _main():
+    global _input_flag
+
+    superloop.init_system()
+    # Lights are up; the tasks start once every subsystem is
+    startup.run_all()
+    del _changed[:]
+    _input_flag = _new_input_flag()
+    scheduler.set_wake_hook(_input_flag.set)
+
+    _check_groups()
+    for name, slots in _TASK_SLOTS:
+        rows = _rows(slots)
+        if name == "inputs":
+            update, trigger = _inputs_update(rows), _input_flag
+        elif name == "traffic":
+            update, trigger = _traffic_update(rows), _new_change()
+        elif name == "background":
+            update, trigger = _group_update(rows), None
+        else:
+            update, trigger = _group_update(rows), _new_change()
+        asyncio.create_task(_fsm_task(name, update, _group_deadline(rows), trigger))
+    while True:
+        await asyncio.sleep(3600)
+
+
+def main():
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
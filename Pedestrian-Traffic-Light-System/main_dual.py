@@ -0,0 +1,177 @@
+# main_dual.py
+import time
+import _thread
+import traffic
+import display_oled
+import violation_log
+import scheduler
+import profiler
+import heap
+import trace_log
+import telemetry
+import evidence
+import snapshot
+import startup
+import main as superloop
+
+# ======= Dual-Thread Runtime =======
+# Alternative entry point splitting the work over two threads: the
+# safety loop (inputs, lights, buzzer, audio, flash, flow) and a
+# background thread for the slow work (OLED refresh, violation log
+# writes). On the ESP32 each is a FreeRTOS task; _thread works the same
+# on CPython. Start it with `import main_dual; main_dual.main()`.
+#
+# Nothing on the safety path takes a lock. The display reads the phase
+# from snapshot.py (one writer, sequence-checked copy), and log records
+# cross over in the evidence queue (evidence.py). The trace recorder
+# guards its ring against IRQs only, and the display would write to it
+# from the second thread, so it is switched off here.
+BACKGROUND_POLL_MS = 20   # longest the background thread sleeps (phase changes show within it)
+
+_running = False
+_background_running = False
+
+# Statistics
+_safety_passes = 0
+_background_passes = 0
+_background_max_us = 0
+
+
+# ======= Thread Split =======
+# The safety loop runs every row of main.SUBSYSTEMS except the display
+# and log writes, and only the capture half of the evidence queue; the
+# background thread runs the slow halves. The trace recorder is off.
+_BACKGROUND_SLOTS = (profiler.PROF_DISPLAY, profiler.PROF_LOG)
+_OFF_SLOTS = (profiler.PROF_TRACE,)
+
+
+def _safety_rows():
+    """(update, next deadline) of the safety loop, in main.py's pass order."""
+    rows = []
+    for _, slot, update, next_deadline in superloop.SUBSYSTEMS:
+        if slot == profiler.PROF_EVIDENCE:
+            rows.append((evidence.update_capture, evidence.next_capture_deadline_ms))
+        elif slot not in _BACKGROUND_SLOTS and slot not in _OFF_SLOTS:
+            rows.append((update, next_deadline))
+    return tuple(rows)
+
+
+_SAFETY = ()     # filled by start()
+
+
+def _update_safety(now):
+    """One pass of the time-critical FSMs."""
+    pass_start = time.ticks_us()
+    state = traffic.get_state()
+    for update, _ in _SAFETY:
+        update(now)
+    snapshot.publish()
+
+    new_state = traffic.get_state()
+    if new_state != state:
+        telemetry.note_phase(new_state, now)
+        heap.safe_point(now)
+    if heap.GC_AT_SAFE_POINTS:
+        heap.check(now)
+    if telemetry.TELEMETRY_ENABLED:
+        telemetry.note_pass(time.ticks_diff(time.ticks_us(), pass_start))
+
+
+def _safety_deadline(now):
+    deadline = None
+    for _, next_deadline in _SAFETY:
+        deadline = scheduler.earliest(now, deadline, next_deadline(now))
+    return deadline
+
+
+def _update_background(now):
+    """One pass of the slow work, reading the phase from the snapshot."""
+    snapshot.take()
+    display_oled.update_lcd(now)
+    evidence.update_persist(now)
+    violation_log.update_violation_log(now)
+
+
+def _background_deadline(now):
+    deadline = display_oled.next_deadline_ms(now)
+    deadline = scheduler.earliest(now, deadline, evidence.next_persist_deadline_ms(now))
+    return scheduler.earliest(now, deadline, violation_log.next_deadline_ms(now))
+
+
+def _background_loop():
+    global _background_running, _background_passes, _background_max_us
+    try:
+        while _running:
+            now = time.ticks_ms()
+            start = time.ticks_us()
+            _update_background(now)
+            elapsed = time.ticks_diff(time.ticks_us(), start)
+            _background_passes += 1
+            if elapsed > _background_max_us:
+                _background_max_us = elapsed
+
+            # Poll the snapshot at least every BACKGROUND_POLL_MS
+            deadline = _background_deadline(now)
+            delay = BACKGROUND_POLL_MS
+            if deadline is not None:
+                delay = time.ticks_diff(deadline, time.ticks_ms())
+                if delay > BACKGROUND_POLL_MS:
+                    delay = BACKGROUND_POLL_MS
+            if delay > 0:
+                time.sleep_ms(delay)
+    finally:
+        _background_running = False
+
+
+def _safety_loop():
+    global _safety_passes
+    deadline = None
+    while _running:
+        now = time.ticks_ms()
+        if profiler.PROFILE_ENABLED:
+            profiler.record_wakeup(deadline, now)
+        _update_safety(now)
+        _safety_passes += 1
+
+        deadline = _safety_deadline(now)
+        scheduler.sleep_until(now, deadline)
+
+
+def start():
+    """
+    Bring every subsystem up (lights first, as main.py does), then
+    start the background thread. Returns once it runs.
+    """
+    global _running, _background_running, _SAFETY
+    trace_log.TRACE_ENABLED = False
+    _SAFETY = _safety_rows()
+    superloop.init_system()
+    startup.run_all()
+    snapshot.init_snapshot()
+    display_oled.set_source(snapshot)
+    _running = True
+    _background_running = True
+    _thread.start_new_thread(_background_loop, ())
+
+
+def stop():
+    """Ask both loops to end (the background one after its current pass)."""
+    global _running
+    _running = False
+
+
+def is_background_running():
+    return _background_running
+
+
+def report():
+    """Print pass counts of both threads (call from the REPL)."""
+    print("safety passes: {}  background passes: {}  longest background pass: {} us".format(
+        _safety_passes, _background_passes, _background_max_us))
+    snapshot.report()
+    evidence.report()
+
+
+def main():
+    start()
+    _safety_loop()
@@ -0,0 +1,122 @@
+# profiler.py
+import time
+from array import array
+
+# Single switch: when False the main loop never calls into this module
+PROFILE_ENABLED = False
+
+# A wakeup later than this after its deadline counts as a deadline miss
+# (the period of the original polling loop)
+LOOP_TARGET_MS = 5
+
+# ======= Profiled Slots =======
+PROF_FLOW = 0
+PROF_BUTTONS = 1
+PROF_TRAFFIC = 2
+PROF_BUZZER = 3
+PROF_DISPLAY = 4
+PROF_VIOLATION = 5
+PROF_FLASH = 6
+PROF_LOG = 7
+PROF_TRACE = 8
+PROF_TELEMETRY = 9
+PROF_DEMAND = 10
+PROF_SCAN = 11
+PROF_EVIDENCE = 12
+PROF_AUDIO = 13
+PROF_LOOP = 14     # whole update pass
+PROF_JITTER = 15   # wakeup lateness against the scheduled deadline
+NUM_SLOTS = 16
+
+SLOT_NAMES = ("flow", "buttons", "traffic", "buzzer", "display",
+              "violation", "flash", "log", "trace", "telemetry", "demand",
+              "scan", "evidence", "audio", "loop", "jitter")
+
+# Bucket i counts durations below 2**i us; the last bucket is open-ended
+NUM_BUCKETS = 20
+
+# ======= Fixed-size Statistics =======
+_hist = array('I', [0] * (NUM_SLOTS * NUM_BUCKETS))
+_count = array('I', [0] * NUM_SLOTS)
+_min_us = array('I', [0xFFFFFFFF] * NUM_SLOTS)
+_max_us = array('I', [0] * NUM_SLOTS)
+_deadline_misses = 0
+
+
+def reset():
+    """Clear all statistics."""
+    global _deadline_misses
+    for i in range(NUM_SLOTS * NUM_BUCKETS):
+        _hist[i] = 0
+    for slot in range(NUM_SLOTS):
+        _count[slot] = 0
+        _min_us[slot] = 0xFFFFFFFF
+        _max_us[slot] = 0
+    _deadline_misses = 0
+
+
+def record(slot, duration_us):
+    """Add one duration (microseconds) to a slot."""
+    if duration_us < 0:
+        duration_us = 0
+    bucket = 0
+    while bucket < NUM_BUCKETS - 1 and duration_us >= (1 << bucket):
+        bucket += 1
+    _hist[slot * NUM_BUCKETS + bucket] += 1
+    _count[slot] += 1
+    if duration_us < _min_us[slot]:
+        _min_us[slot] = duration_us
+    if duration_us > _max_us[slot]:
+        _max_us[slot] = duration_us
+
+
+def record_wakeup(deadline_ms, now_ms):
+    """
+    Record how late the loop woke up compared to the deadline it was
+    sleeping for. Early wakeups (pin interrupts) are not counted.
+    """
+    global _deadline_misses
+    if deadline_ms is None:
+        return
+    late_ms = time.ticks_diff(now_ms, deadline_ms)
+    if late_ms < 0:
+        return
+    record(PROF_JITTER, late_ms * 1000)
+    if late_ms > LOOP_TARGET_MS:
+        _deadline_misses += 1
+
+
+def get_deadline_misses():
+    """Return the number of wakeups later than LOOP_TARGET_MS."""
+    return _deadline_misses
+
+
+def percentile_us(slot, percent):
+    """
+    Upper bound (us) of the histogram bucket holding the given
+    percentile, e.g. percentile_us(PROF_DISPLAY, 99), but never more
+    than the slowest sample recorded.
+    """
+    total = _count[slot]
+    if total == 0:
+        return 0
+    target = (total * percent + 99) // 100
+    seen = 0
+    for bucket in range(NUM_BUCKETS):
+        seen += _hist[slot * NUM_BUCKETS + bucket]
+        if seen >= target:
+            return min(1 << bucket, _max_us[slot])
+    return _max_us[slot]
+
+
+def report():
+    """Print per-slot statistics (call from the REPL)."""
+    print("slot        count     min_us   max_us   p99_us")
+    for slot in range(NUM_SLOTS):
+        n = _count[slot]
+        if n == 0:
+            continue
+        print("{:<10}{:>7}{:>11}{:>9}{:>9}".format(
+            SLOT_NAMES[slot], n, _min_us[slot], _max_us[slot],
+            percentile_us(slot, 99)))
+    print("deadline misses (> {} ms late): {}".format(LOOP_TARGET_MS, _deadline_misses))
@@ -0,0 +1,131 @@
+# scheduler.py
+import time
+import machine
+
+try:
+    import esp32
+except ImportError:
+    esp32 = None
+
+# Upper bound for a single sleep, so the loop still wakes up now and then
+# even if every FSM reports that it has nothing to do.
+MAX_SLEEP_MS = 1000
+
+# Light sleep (machine.lightsleep) between passes when the caller says
+# no peripheral clock is needed (main.can_light_sleep()). Only the pins
+# registered with add_wake_pin() end it early: the ESP32 has one ext0
+# pin and one ext1 group ("all low"), so with more than MAX_WAKE_PINS
+# inputs light sleep is not used. Otherwise the loop blocks in one
+# time.sleep_ms(): pin IRQs still timestamp their edges, and the FSMs
+# handle them at the deadline.
+LIGHT_SLEEP_ENABLED = True
+MAX_WAKE_PINS = 2
+
+_wake_pending = False
+_wake_pins = []       # active-low inputs that end a light sleep
+_resyncs = []         # called after a light sleep ended by one of them
+
+# Statistics
+sleeps = 0
+light_sleeps = 0
+
+# Optional extra wakeup target (e.g. a ThreadSafeFlag for the async runtime)
+_wake_hook = None
+
+
+def set_wake_hook(hook):
+    """Call hook() from wake(), in addition to setting the wake flag."""
+    global _wake_hook
+    _wake_hook = hook
+
+
+def wake(pin=None):
+    """
+    An input arrived: the next sleep_until() returns at once.
+    Safe to call from a pin IRQ handler (no allocation).
+    """
+    global _wake_pending
+    _wake_pending = True
+    if _wake_hook is not None:
+        _wake_hook()
+
+
+def add_wake_pin(pin, resync):
+    """
+    Let a low level on an active-low input end a light sleep. resync()
+    runs after every light sleep that ends early, in case the edge IRQ
+    was not taken while the CPU was stopped.
+    """
+    if pin in _wake_pins:
+        return
+    _wake_pins.append(pin)
+    _resyncs.append(resync)
+    if esp32 is None:
+        return
+    if len(_wake_pins) == 1:
+        esp32.wake_on_ext0(pin=pin, level=esp32.WAKEUP_ALL_LOW)
+    elif len(_wake_pins) == 2:
+        esp32.wake_on_ext1(pins=(pin,), level=esp32.WAKEUP_ALL_LOW)
+
+
+def clear_wake_pins():
+    del _wake_pins[:]
+    del _resyncs[:]
+
+
+def _light_sleep_allowed():
+    if not LIGHT_SLEEP_ENABLED or esp32 is None or len(_wake_pins) > MAX_WAKE_PINS:
+        return False
+    # A held input would end every light sleep at once
+    for pin in _wake_pins:
+        if not pin.value():
+            return False
+    return True
+
+
+def earliest(now_ms, deadline_ms, candidate_ms):
+    """
+    Return the earlier of two absolute tick deadlines.
+    None means "no deadline".
+    """
+    if candidate_ms is None:
+        return deadline_ms
+    if deadline_ms is None:
+        return candidate_ms
+    if time.ticks_diff(candidate_ms, now_ms) < time.ticks_diff(deadline_ms, now_ms):
+        return candidate_ms
+    return deadline_ms
+
+
+def sleep_until(now_ms, deadline_ms, light=False):
+    """
+    Sleep once until the given deadline (absolute ticks). With light=True
+    the CPU is stopped (machine.lightsleep) and a wake pin ends the sleep
+    early. Returns at once if the deadline has passed or wake() was
+    called during the pass. One sleep per call, measured from the clock:
+    a sleep that overruns makes the wakeup late once, not once per step.
+    """
+    global _wake_pending, sleeps, light_sleeps
+
+    if deadline_ms is None:
+        delay = MAX_SLEEP_MS
+    else:
+        delay = time.ticks_diff(deadline_ms, now_ms)
+        if delay > MAX_SLEEP_MS:
+            delay = MAX_SLEEP_MS
+    # Part of the delay went into the pass itself
+    delay -= time.ticks_diff(time.ticks_ms(), now_ms)
+
+    if delay > 0 and not _wake_pending:
+        sleeps += 1
+        if light and _light_sleep_allowed():
+            light_sleeps += 1
+            start_ms = time.ticks_ms()
+            machine.lightsleep(delay)
+            if time.ticks_diff(time.ticks_ms(), start_ms) < delay:
+                for resync in _resyncs:
+                    resync()
+        else:
+            time.sleep_ms(delay)
+
+    _wake_pending = False
@@ -0,0 +1,9 @@
+# sim/__init__.py
+"""
+Host-side simulator for the pedestrian traffic light.
+
+Runs the unmodified project modules under CPython with stand-ins for
+machine, ssd1306 and MicroPython's time.ticks_* API, driven by a
+virtual clock. See runner.Simulation.
+"""
+from .runner import Simulation
@@ -0,0 +1,73 @@
+# sim/__main__.py
+"""
+Simulate a day (or more) of operation with random pedestrians,
+red-light runners and a slowly varying traffic flow.
+
+    python -m sim [--hours 24] [--seed 1] [--timeline] [--trace FILE]
+"""
+import argparse
+import math
+import random
+import time
+
+from .runner import Simulation
+
+
+def build_scenario(sim, hours, seed):
+    rng = random.Random(seed)
+    end_ms = int(hours * 3_600_000)
+
+    # Flow: daily rush-hour shape plus ADC noise
+    def flow(t_ms):
+        day = (t_ms % 86_400_000) / 86_400_000
+        base = 0.5 - 0.4 * math.cos(2 * math.pi * day)
+        return min(4095, max(0, int(base * 4095 + rng.gauss(0, 60))))
+    sim.set_flow(flow)
+
+    # Pedestrians: one press every ~3 minutes on average
+    t = 0
+    while True:
+        t += int(rng.expovariate(1 / 180_000))
+        if t >= end_ms:
+            break
+        sim.press(t, hold_ms=rng.randint(60, 400))
+
+    # Vehicles crossing the stop line: one every ~10 minutes
+    t = 0
+    while True:
+        t += int(rng.expovariate(1 / 600_000))
+        if t >= end_ms:
+            break
+        sim.violation(t, hold_ms=rng.randint(60, 300))
+
+    return end_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeline", action="store_true",
+                        help="print every output change")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="record a binary trace (see python -m sim.replay)")
+    args = parser.parse_args()
+
+    sim = Simulation(trace_path=args.trace)
+    end_ms = build_scenario(sim, args.hours, args.seed)
+
+    started = time.perf_counter()
+    sim.run(end_ms)
+    elapsed = time.perf_counter() - started
+
+    if args.timeline:
+        for t_ms, name, value in sim.timeline:
+            print("{:>10} {:<10} {}".format(t_ms, name, value))
+
+    print("Simulated {:.1f} h in {:.2f} s".format(args.hours, elapsed))
+    for key, value in sim.stats().items():
+        print("  {:<18} {}".format(key, value))
+
+
+if __name__ == "__main__":
+    main()
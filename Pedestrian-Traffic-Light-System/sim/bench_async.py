@@ -0,0 +1,246 @@
+# sim/bench_async.py
+"""
+Wakeups and wakeup lateness of the asyncio runtime (main_async.py)
+against the tickless super-loop (main.main()), in real time on CPython.
+
+Two scenarios per runtime: "idle" (car green, nothing happens) and
+"crossing" (pedestrian green with loop-timed beeps, tone sequencer
+off, and a vehicle on red every VIOLATION_EVERY_MS from a driver
+thread through the pin IRQ). Wakeups are loop passes for the
+super-loop and task resumes for the runtime (per task in the last
+column). Lateness is profiler.record_wakeup() against the deadline
+each loop or task slept for. Beep timing comes from the buzzer duty
+edges of the crossing: each beep must last BEEP_PULSE_DURATION and
+start buzzer.crossing_interval_ms() after the previous one; an edge
+off by more than profiler.LOOP_TARGET_MS counts as a missed beep.
+Everything is counted after WARMUP_S. Host scheduling only ever adds
+lateness, so each crossing run is repeated --trials times and the one
+with the best beeps is kept. Exits with status 1 if an idle task other
+than "background" (the flow sampler, which has a deadline every 200
+ms) resumes at all, if the asyncio beeps miss more often than the
+super-loop's, or if their mean edge error is more than 1 ms above it.
+
+    python -m sim.bench_async [--seconds 5] [--trials 3]
+"""
+import argparse
+import asyncio
+import importlib
+import sys
+import threading
+import time
+
+from .clock import RealClock
+from .runner import Simulation
+
+VIOLATION_EVERY_MS = 700
+WARMUP_S = 0.5      # boot and the first passes, not measured
+SCENARIOS = ("idle", "crossing")
+
+
+def setup():
+    sim = Simulation(clock=RealClock())
+    sim.set_flow(2048)
+    sim.modules["tone"].TONE_SEQUENCER_ENABLED = False
+    sim.modules["profiler"].PROFILE_ENABLED = True
+    return sim
+
+
+def _start_scenario(sim, scenario, marks):
+    """Called once every subsystem is up; notes when the crossing starts."""
+    traffic = sim.modules["traffic"]
+    if scenario == "crossing":
+        now = time.ticks_ms()
+        traffic._enter(traffic.TRAFFIC_PED_GREEN, now)
+        marks["crossing"] = (now, traffic.get_ped_total_ms())
+    sim.modules["profiler"].reset()
+
+
+def beep_timing(sim, marks):
+    """
+    Return (beep edges, mean and worst edge error ms, missed beeps) of
+    the crossing beeps after the warm-up: each pulse against
+    BEEP_PULSE_DURATION, each start against the crossing interval.
+    """
+    if "crossing" not in marks:
+        return 0, 0, 0, 0
+    buzzer = sim.modules["buzzer"]
+    target = sim.modules["profiler"].LOOP_TARGET_MS
+    start_ms, total_ms = marks["crossing"]
+    end_ms = start_ms + total_ms
+    edges = 0
+    total = 0
+    worst = 0
+    missed = 0
+    on_ms = None
+    last_on_ms = None
+    for t, duty in sim.changes("BUZZER"):
+        if t < marks["measure"] or t >= end_ms:
+            continue
+        if duty and on_ms is None:
+            on_ms = t
+            error = None
+            if last_on_ms is not None:
+                error = t - last_on_ms - buzzer.crossing_interval_ms(end_ms - t, total_ms)
+            last_on_ms = t
+        elif not duty and on_ms is not None:
+            error = t - on_ms - buzzer.BEEP_PULSE_DURATION
+            on_ms = None
+        else:
+            continue
+        edges += 1
+        if error is not None:
+            total += abs(error)
+            worst = max(worst, abs(error))
+            if abs(error) > target:
+                missed += 1
+    return edges, total / max(edges - 1, 1), worst, missed
+
+
+def drive_violations(sim, stop):
+    """Driver thread: a vehicle over the stop line every VIOLATION_EVERY_MS."""
+    pin = sim.hardware.BOT2_PIN
+    while not stop.wait(VIOLATION_EVERY_MS / 1000):
+        sim.board.drive_input(pin, 0)
+        time.sleep(0.1)
+        sim.board.drive_input(pin, 1)
+
+
+def run_superloop(sim, scenario, seconds, marks):
+    """main.main() for a fixed time; returns the passes."""
+    main = sim.main
+    scheduler = sim.modules["scheduler"]
+    profiler = sim.modules["profiler"]
+    main.init_system()
+    sim.modules["startup"].run_all()
+    _start_scenario(sim, scenario, marks)
+    passes = 0
+    deadline = None
+    measure = time.perf_counter() + WARMUP_S
+    end = measure + seconds
+    while time.perf_counter() < end:
+        if measure and time.perf_counter() >= measure:
+            measure = 0
+            passes = 0
+            profiler.reset()
+            marks["measure"] = sim.clock.now_ms()
+        now = time.ticks_ms()
+        profiler.record_wakeup(deadline, now)
+        main.update_all(now)
+        passes += 1
+        deadline = main.next_wakeup(now)
+        scheduler.sleep_until(now, deadline)
+    return {"loop": passes}
+
+
+def run_async(sim, scenario, seconds, marks):
+    """main_async.main() for a fixed time; returns the resumes per task."""
+    main_async = importlib.import_module("main_async")
+    startup = sim.modules["startup"]
+    run_all = startup.run_all
+
+    def run_all_then_start():
+        run_all()
+        _start_scenario(sim, scenario, marks)
+    startup.run_all = run_all_then_start
+
+    async def timed():
+        runtime = asyncio.create_task(main_async._main())
+        await asyncio.sleep(WARMUP_S)
+        for name in main_async.wakeups:
+            main_async.wakeups[name] = 0
+        sim.modules["profiler"].reset()
+        marks["measure"] = sim.clock.now_ms()
+        await asyncio.sleep(seconds)
+        runtime.cancel()
+        # The driver thread may still press after the loop is closed
+        sim.modules["scheduler"].set_wake_hook(None)
+    asyncio.run(timed())
+    return dict(main_async.wakeups)
+
+
+def run(runtime, scenario, seconds):
+    sim = setup()
+    stop = threading.Event()
+    driver = threading.Thread(target=drive_violations, args=(sim, stop))
+    marks = {}
+
+    def body():
+        if scenario == "crossing":
+            driver.start()
+        try:
+            if runtime == "super-loop":
+                return run_superloop(sim, scenario, seconds, marks)
+            return run_async(sim, scenario, seconds, marks)
+        finally:
+            stop.set()
+            if driver.is_alive():
+                driver.join()
+    wakeups = sim._call(body)
+
+    profiler = sim.modules["profiler"]
+    slot = profiler.PROF_JITTER
+    edges, beep_mean, beep_worst, beep_missed = beep_timing(sim, marks)
+    return {
+        "wakeups": wakeups,
+        "per_s": sum(wakeups.values()) / seconds,
+        "worst_ms": profiler._max_us[slot] / 1000,
+        "p99_ms": profiler.percentile_us(slot, 99) / 1000,
+        "misses": profiler.get_deadline_misses(),
+        "fines": sim.modules["violation"].get_fines(),
+        "edges": edges,
+        "beep_mean_ms": beep_mean,
+        "beep_worst_ms": beep_worst,
+        "beep_missed": beep_missed,
+        "target_ms": profiler.LOOP_TARGET_MS,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--trials", type=int, default=3,
+                        help="crossing runs per runtime; the one with the best beeps is kept")
+    args = parser.parse_args()
+
+    print("{:<22}{:>11}{:>10}{:>9}{:>8}{:>7}{:>7}{:>11}{:>8}  {}".format(
+        "run", "wakeups/s", "worst ms", "p99 ms", "misses", "fines", "edges", "beep err",
+        "missed", "per task"))
+    results = {}
+    for scenario in SCENARIOS:
+        for runtime in ("super-loop", "asyncio"):
+            trials = args.trials if scenario == "crossing" else 1
+            r = min((run(runtime, scenario, args.seconds) for _ in range(trials)),
+                    key=lambda r: (r["beep_missed"], r["beep_mean_ms"]))
+            results[(runtime, scenario)] = r
+            tasks = " ".join("{}={}".format(name, n) for name, n in sorted(r["wakeups"].items()))
+            print("{:<22}{:>11.1f}{:>10.1f}{:>9.1f}{:>8}{:>7}{:>7}{:>6.1f}/{:<4}{:>8}  {}".format(
+                "{} {}".format(runtime, scenario), r["per_s"], r["worst_ms"],
+                r["p99_ms"], r["misses"], r["fines"], r["edges"], r["beep_mean_ms"],
+                r["beep_worst_ms"], r["beep_missed"], tasks if runtime == "asyncio" else ""))
+    target = r["target_ms"]
+    print("wakeups: loop passes or task resumes; worst/p99 ms: wakeup after its deadline; "
+          "beep err: mean/worst buzzer edge error (ms); missed: edges off by more than "
+          "{} ms; crossing: best of {} runs".format(target, args.trials))
+
+    idle = results[("asyncio", "idle")]["wakeups"]
+    busy = sorted(name for name, n in idle.items() if n and name != "background")
+    loop = results[("super-loop", "crossing")]
+    tasks = results[("asyncio", "crossing")]
+    # One tick of slack: asyncio timers on the host round up to the next ms
+    beeps_ok = tasks["beep_missed"] <= loop["beep_missed"] and \
+        tasks["beep_mean_ms"] <= loop["beep_mean_ms"] + 1
+    if busy:
+        print("FAIL: idle tasks resumed: {}".format(", ".join(busy)))
+    if not beeps_ok:
+        print("FAIL: asyncio beeps {:.1f} ms off on average, {} missed "
+              "(super-loop {:.1f} ms, {})".format(
+                  tasks["beep_mean_ms"], tasks["beep_missed"], loop["beep_mean_ms"],
+                  loop["beep_missed"]))
+    ok = not busy and beeps_ok
+    if ok:
+        print("OK: idle tasks do not resume, and the asyncio beeps keep the super-loop's timing")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# sim/bench_audio.py
+"""
+Crossing announcements (audio.py) streamed during a pedestrian cycle.
+
+Clips of synthetic tones are written as raw 16-bit PCM to a temporary
+"flash" directory; a press starts a full cycle (wait, crossing with the
+hurry cue, back to car green) while the stub I2S sink plays whatever
+the double buffer hands it. The OLED bus is charged I2C_US_PER_BYTE per
+byte, so display passes take time as on the board. For each chunk
+size and clip length: chunks streamed, underruns counted by audio.py
+(the driver ran dry) and by the sink (silences that are not a clip
+start), memory held by audio.py and the peak of host Python memory
+above the booted system while the cycle runs, against the size of
+the longest clip. Exits with status 1 if an underrun occurs from
+MIN_CHUNK bytes up: a 64-byte half lasts 4 ms, no longer than one
+display pass may take (display_oled.OLED_FLUSH_BUDGET_US), so it can
+run dry while the panel is written.
+
+    python -m sim.bench_audio
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import tracemalloc
+from array import array
+
+from .runner import Simulation
+
+I2C_US_PER_BYTE = 25          # 400 kHz bus: 9 bits per byte, plus overhead
+CHUNKS = (32, 64, 128, 256, 512, 1024)
+MIN_CHUNK = 128               # smallest half that must not underrun (8 ms)
+CLIP_SECONDS = (2, 30)        # "wait" and "cross" clip length
+RATE = 8000
+
+
+def write_clips(directory, seconds, names):
+    """One clip per name: a tone sequence of `seconds` (hurry/stop: 1.5 s)."""
+    sizes = {}
+    for k, name in enumerate(names):
+        if not name:
+            continue
+        length = seconds if name in ("wait.pcm", "cross.pcm") else 1.5
+        samples = array('h', (
+            int(8000 * math.sin(2 * math.pi * (400 + 100 * k + 50 * (i // 1600 % 4)) * i / RATE))
+            for i in range(int(length * RATE))))
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(samples.tobytes())
+        sizes[name] = len(samples) * 2
+    return sizes
+
+
+def run(chunk, seconds, directory):
+    sim = Simulation()
+    audio = sim.modules["audio"]
+    audio.AUDIO_ENABLED = True
+    audio.AUDIO_DIR = directory
+    audio.AUDIO_CHUNK_BYTES = chunk
+    sim.board.i2c_us_per_byte = I2C_US_PER_BYTE
+    sim.set_flow(2048)
+
+    # Clip starts, to tell a new clip from an underrun in the sink
+    starts = []
+    play = audio.play
+
+    def recorded_play(clip):
+        starts.append(sim.clock.now_us)
+        play(clip)
+    audio.play = recorded_play
+
+    tracemalloc.start()
+    sim.boot()
+    sim._call(sim.modules["startup"].run_all)
+    start_ms = sim.clock.now_ms()
+    sim.press(start_ms + 1000)
+
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    sim.run(start_ms + 90_000)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    held = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(True, audio.__file__)])
+    tracemalloc.stop()
+
+    # A silence ends at the first write of a clip, or the sink ran dry;
+    # the first write follows the clip start within the same pass
+    sink_underruns = 0
+    for end_us, resume_us in sim.board.i2s_gaps:
+        if not any(0 <= resume_us - t < 5000 for t in starts):
+            sink_underruns += 1
+    crossings = sum(1 for _, v in sim.changes("P_GREEN") if v)
+    return {
+        "chunk": chunk,
+        "chunk_ms": chunk * 1000 // (RATE * 2),
+        "clips": audio._clips,
+        "missing": audio._missing,
+        "chunks": audio._chunks,
+        "underruns": audio._underruns,
+        "sink_underruns": sink_underruns,
+        "played_s": sim.board.i2s_bytes / (RATE * 2),
+        "peak": peak,
+        "audio_ram": sum(stat.size for stat in held.statistics("filename")),
+        "crossings": crossings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args()
+
+    print("{:>6}{:>9}{:>8}{:>7}{:>8}{:>11}{:>6}{:>10}{:>11}{:>11}{:>10}".format(
+        "chunk", "chunk ms", "clip s", "clips", "chunks", "underruns", "sink", "played s",
+        "clip bytes", "audio.py", "peak RAM"))
+    failed = False
+    for seconds in CLIP_SECONDS:
+        directory = tempfile.mkdtemp(prefix="sim_audio_")
+        sizes = write_clips(directory, seconds, Simulation().modules["audio"].CLIP_FILES)
+        for chunk in CHUNKS:
+            r = run(chunk, seconds, directory)
+            if chunk >= MIN_CHUNK and (r["underruns"] or r["sink_underruns"]):
+                failed = True
+            if r["missing"] or not r["crossings"]:
+                failed = True
+            print("{:>6}{:>9}{:>8}{:>7}{:>8}{:>11}{:>6}{:>10.1f}{:>11}{:>11}{:>10}".format(
+                chunk, r["chunk_ms"], seconds, r["clips"], r["chunks"], r["underruns"],
+                r["sink_underruns"], r["played_s"], max(sizes.values()), r["audio_ram"],
+                r["peak"]))
+    print("underruns: driver ran dry (audio.py) / audible silence (sink); audio.py: bytes "
+          "it holds; peak RAM: host Python memory above the booted system during the cycle")
+    print("FAIL: underruns from {}-byte chunks up".format(MIN_CHUNK) if failed else
+          "OK: no underrun from {}-byte chunks up".format(MIN_CHUNK))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# sim/bench_boot.py
+"""
+Boot timing with the stub machine/ssd1306 modules: import time of the
+project, and time until the lights are in a safe state, until the main
+loop runs and until every subsystem is up, with all stages in
+init_system() against the staged boot (startup.STAGED_BOOT).
+
+Host times are CPython wall clock, so only their ratio means something
+for the board; virtual times include I2C bus time at 400 kHz.
+
+    python -m sim.bench_boot [--repeat 20]
+"""
+import argparse
+import statistics
+import time
+
+from .runner import Simulation
+
+I2C_US_PER_BYTE = 23          # 9 bits per byte at 400 kHz
+LIGHTS = ("T_RED", "T_YELLOW", "T_GREEN", "P_RED", "P_GREEN")
+
+
+def import_ms():
+    """Host time to import a fresh copy of the project."""
+    start = time.perf_counter()
+    sim = Simulation()
+    return (time.perf_counter() - start) * 1000, sim
+
+
+def boot(staged):
+    """
+    Returns (host ms, virtual ms) at the first light output, at the
+    first loop pass and once every boot stage has run.
+    """
+    _, sim = import_ms()
+    sim.board.i2c_us_per_byte = I2C_US_PER_BYTE
+    startup = sim.modules["startup"]
+    startup.STAGED_BOOT = staged
+    clock = sim.clock
+    marks = {}
+    start = time.perf_counter()
+
+    def stamp(name):
+        marks[name] = ((time.perf_counter() - start) * 1000, clock.now_us / 1000)
+
+    record = sim.board.record
+
+    def watched_record(name, value):
+        if name in LIGHTS and "lights" not in marks:
+            stamp("lights")
+        record(name, value)
+    sim.board.record = watched_record
+
+    update_all = sim.main.update_all
+
+    def watched_update_all(now):
+        if "loop" not in marks:
+            stamp("loop")
+        update_all(now)
+        if "all" not in marks and not startup.pending():
+            stamp("all")
+    sim.main.update_all = watched_update_all
+
+    sim.boot()
+    if not startup.pending():
+        stamp("all")
+    t_ms = 0
+    while "loop" not in marks or "all" not in marks:
+        t_ms += 1
+        sim.run(t_ms)
+    return marks["lights"], marks["loop"], marks["all"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    imports = [import_ms()[0] for _ in range(args.repeat)]
+    print("import (fresh project): median {:.2f} ms".format(statistics.median(imports)))
+
+    print("host ms / virtual ms   {:>18}{:>18}{:>18}".format(
+        "safe lights", "loop running", "all up"))
+    for label, staged in (("all in init_system:", False), ("staged:", True)):
+        runs = [boot(staged) for _ in range(args.repeat)]
+        cells = []
+        for mark in range(3):
+            host = statistics.median(r[mark][0] for r in runs)
+            cells.append("{:8.2f} /{:6.1f}".format(host, runs[0][mark][1]))
+        print("{:<22}{:>18}{:>18}{:>18}".format(label, *cells))
+
+
+if __name__ == "__main__":
+    main()
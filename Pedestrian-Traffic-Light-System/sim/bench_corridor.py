@@ -0,0 +1,107 @@
+# sim/bench_corridor.py
+"""
+Throughput of the corridor coordinator on the host: simulated minutes
+of a corridor with N intersections and random pedestrians, reporting
+intersection updates per second of real time.
+
+Then checks the wait countdown of every display on a corridor of
+CHECK_SIZE: each value shown must be the seconds left until the
+pedestrian phase really started, green-wave hold included. Exits with
+status 1 on a wrong countdown.
+
+    python -m sim.bench_corridor [--minutes 10] [--seed 1]
+"""
+import argparse
+import random
+import sys
+import time
+
+from .runner import Simulation
+
+STEP_MS = 20          # update period of every intersection
+SIZES = (1, 10, 100, 500)
+CHECK_SIZE = 10
+
+
+def run(count, minutes, seed):
+    Simulation()      # installs the virtual clock and the machine stubs
+    import corridor
+
+    rng = random.Random(seed)
+    corr = corridor.Corridor(count, 0)
+    end_ms = minutes * 60_000
+    presses = 0
+    updates = 0
+
+    started = time.perf_counter()
+    now = 0
+    while now < end_ms:
+        # Roughly one press per intersection every two minutes
+        if rng.random() < count * STEP_MS / 120_000:
+            corr.press(rng.randrange(count), now)
+            presses += 1
+        corr.update(now)
+        updates += count
+        now += STEP_MS
+    elapsed = time.perf_counter() - started
+    return updates, elapsed, presses, corr
+
+
+def check_countdown(minutes, seed):
+    """Return (countdowns checked, wrong ones) on a CHECK_SIZE corridor."""
+    Simulation()
+    import corridor
+    import traffic
+
+    rng = random.Random(seed)
+    corr = corridor.Corridor(CHECK_SIZE, 0)
+    shown = [[] for _ in range(CHECK_SIZE)]   # (t_ms, seconds) of the current wait
+    clock = [0]
+    for index, node in enumerate(corr.intersections):
+        def render(screen, value, shown=shown[index]):
+            if screen == traffic.TRAFFIC_WAIT_BEFORE_PED:
+                shown.append((clock[0], value))
+        node.display.render = render
+
+    checked = wrong = 0
+    now = 0
+    while now < minutes * 60_000:
+        clock[0] = now
+        if rng.random() < CHECK_SIZE * STEP_MS / 120_000:
+            corr.press(rng.randrange(CHECK_SIZE), now)
+        waiting = [node.traffic.state == traffic.TRAFFIC_WAIT_BEFORE_PED
+                   for node in corr.intersections]
+        corr.update(now)
+        for index, node in enumerate(corr.intersections):
+            if waiting[index] and node.traffic.state != traffic.TRAFFIC_WAIT_BEFORE_PED:
+                # The wait ended between the last pass and this one
+                for t, value in shown[index]:
+                    checked += 1
+                    if not (now - STEP_MS - t) // 1000 <= value <= (now - t) // 1000:
+                        wrong += 1
+                del shown[index][:]
+        now += STEP_MS
+    return checked, wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("intersections  updates/s  presses  released  batched")
+    for count in SIZES:
+        updates, elapsed, presses, corr = run(count, args.minutes, args.seed)
+        print("{:>13}{:>11.0f}{:>9}{:>10}{:>9}".format(
+            count, updates / elapsed, presses, corr.released, corr.batched))
+
+    checked, wrong = check_countdown(args.minutes, args.seed)
+    if wrong:
+        print("FAIL: {} of {} wait countdowns off the real end of the wait".format(wrong, checked))
+        sys.exit(1)
+    print("OK: {} wait countdowns match the end of the held wait".format(checked))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# sim/bench_demand.py
+"""
+Pedestrian wait with and without demand prediction (demand.py), over
+synthetic arrival traces with daily peaks. Every pedestrian presses on
+arrival; the wait is the time from the press to the next pedestrian
+green (0 if it is already green). Both policies see the same presses
+and flow; the predictor learns on the first days and the last day is
+measured, whole and in the hours with at least PEAK_PER_HOUR arrivals.
+Car green is checked against its minimum (10 s, the shortest
+flow-based wait).
+
+    python -m sim.bench_demand [--days 2] [--seed 1] [--trace commuter]
+"""
+import argparse
+import math
+import random
+
+from .runner import Simulation
+
+DAY_MS = 86_400_000
+MIN_CAR_GREEN_MS = 10_000
+PEAK_PER_HOUR = 40
+
+# Arrivals per hour: a night floor plus Gaussian peaks (hour, per hour, width in h)
+TRACES = {
+    "commuter": (2, ((8.0, 90, 0.75), (12.5, 40, 1.0), (17.5, 100, 1.0))),
+    "school": (1, ((7.75, 160, 0.3), (15.5, 140, 0.4))),
+    "flat": (20, ()),
+}
+
+
+def arrival_rate(trace, t_ms):
+    """Arrivals per hour at t_ms."""
+    floor, peaks = TRACES[trace]
+    hour = (t_ms % DAY_MS) / 3_600_000
+    rate = floor
+    for center, height, width in peaks:
+        rate += height * math.exp(-0.5 * ((hour - center) / width) ** 2)
+    return rate
+
+
+def arrivals(trace, days, seed):
+    """Press times of a non-homogeneous Poisson process (thinning)."""
+    rng = random.Random(seed)
+    floor, peaks = TRACES[trace]
+    peak = floor + sum(p[1] for p in peaks)
+    times = []
+    t = 0.0
+    while True:
+        t += rng.expovariate(peak / 3_600_000)
+        if t >= days * DAY_MS:
+            return times
+        if rng.random() * peak < arrival_rate(trace, t):
+            if not times or t - times[-1] > 500:   # one press while the button is held
+                times.append(int(t))
+
+
+def run(presses, days, seed, predict):
+    """Simulate the days; returns (sim, demand module)."""
+    sim = Simulation()
+    demand = sim.modules["demand"]
+    demand.DEMAND_ENABLED = predict
+    rng = random.Random(seed + 1)
+
+    # Same daily flow shape as python -m sim (heaviest at noon)
+    def flow(t_ms):
+        day = (t_ms % DAY_MS) / DAY_MS
+        base = 0.5 - 0.4 * math.cos(2 * math.pi * day)
+        return min(4095, max(0, int(base * 4095 + rng.gauss(0, 60))))
+    sim.set_flow(flow)
+    for t in presses:
+        sim.press(t, hold_ms=200)
+    sim.run(days * DAY_MS + 120_000)
+    return sim, demand
+
+
+def waits(sim, presses, start_ms):
+    """(press time, wait) of every press from start_ms on."""
+    greens = sim.changes("P_GREEN")
+    result = []
+    i = 0
+    green = 0
+    for t in presses:
+        while i < len(greens) and greens[i][0] <= t:
+            green = greens[i][1]
+            i += 1
+        if t < start_ms:
+            continue
+        if green:
+            result.append((t, 0))
+        elif i < len(greens):
+            result.append((t, greens[i][0] - t))
+    return result
+
+
+def car_greens(sim, start_ms):
+    """Durations of every car green phase starting from start_ms."""
+    greens = []
+    on = None
+    for t, value in sim.changes("T_GREEN"):
+        if value:
+            on = t
+        elif on is not None and on >= start_ms:
+            greens.append(t - on)
+    return greens
+
+
+def mean_p95(values):
+    """(mean, p95) in seconds."""
+    if not values:
+        return 0.0, 0.0
+    return sum(values) / len(values) / 1000, percentile(values, 0.95) / 1000
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--trace", choices=sorted(TRACES), action="append",
+                        help="arrival trace (default: all)")
+    args = parser.parse_args()
+
+    start_ms = (args.days - 1) * DAY_MS
+    print("last of {} days, wait from press to pedestrian green (peak: >= {} arrivals/h)".format(
+        args.days, PEAK_PER_HOUR))
+    print("{:<10}{:<11}{:>8}{:>8}{:>8}{:>11}{:>10}{:>11}{:>9}".format(
+        "trace", "policy", "presses", "mean s", "p95 s", "peak mean", "peak p95",
+        "crossings", "min car"))
+    for trace in args.trace or sorted(TRACES):
+        presses = arrivals(trace, args.days, args.seed)
+        for label, predict in (("current", False), ("predicted", True)):
+            sim, demand = run(presses, args.days, args.seed, predict)
+            w = waits(sim, presses, start_ms)
+            mean, p95 = mean_p95([ms for _, ms in w])
+            peak_mean, peak_p95 = mean_p95(
+                [ms for t, ms in w if arrival_rate(trace, t) >= PEAK_PER_HOUR])
+            cars = car_greens(sim, start_ms)
+            crossings = sum(1 for t, v in sim.changes("P_GREEN") if v and t >= start_ms)
+            short = sum(1 for g in cars if g < MIN_CAR_GREEN_MS)
+            print("{:<10}{:<11}{:>8}{:>8.1f}{:>8.1f}{:>11.1f}{:>10.1f}{:>11}{:>7.1f} s{}".format(
+                trace, label, len(w), mean, p95, peak_mean, peak_p95, crossings,
+                min(cars) / 1000, "  {} car greens too short!".format(short) if short else ""))
+        print("{:<10}predictor shortened {} waits, saved {} s".format(
+            "", demand._shortened, demand._saved_ms // 1000))
+
+
+if __name__ == "__main__":
+    main()
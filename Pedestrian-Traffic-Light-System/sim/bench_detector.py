@@ -0,0 +1,153 @@
+# sim/bench_detector.py
+"""
+Vehicle detector as the flow source (traffic_flow.FLOW_SOURCE_DETECTOR).
+
+Random vehicles (Poisson arrivals, each over the loop for a random
+part of the gap to the next) are driven through the stub detector
+pin at rates from a few per minute up to tens of thousands, with the
+flow sampler running every FLOW_SAMPLE_INTERVAL_MS as in the loop.
+For each rate: vehicles counted against vehicles driven (must match),
+the 60 s window against the true count and occupancy, the flow level
+and timing it gives, and the cost of one sampler update: Python lines
+executed (the same at any rate) and host time, which CPython's caches
+blur a little. Exits with status 1 if a count is off.
+
+    python -m sim.bench_detector [--minutes 2] [--seed 1]
+"""
+import argparse
+import random
+import sys
+import time
+
+from .runner import Simulation
+
+RATES = (6, 15, 30, 600, 6_000, 30_000, 60_000)   # vehicles per minute
+
+
+def setup():
+    """A booted simulation reading its flow from the detector."""
+    sim = Simulation()
+    traffic_flow = sim.modules["traffic_flow"]
+    traffic_flow.FLOW_SOURCE = traffic_flow.FLOW_SOURCE_DETECTOR
+    sim.boot()
+    sim._call(sim.modules["startup"].run_all)
+    return sim
+
+
+def drive(sim, per_min, minutes, rng):
+    """
+    Drive the pulses and run the sampler; returns ((on_us, off_us) of
+    every vehicle, host seconds of each sampler update, most lines one
+    update executed).
+    """
+    traffic_flow = sim.modules["traffic_flow"]
+    board = sim.board
+    clock = sim.clock
+    pin = sim.hardware.DETECTOR_PIN
+    interval_us = traffic_flow.FLOW_SAMPLE_INTERVAL_MS * 1000
+    end_us = clock.now_us + minutes * 60_000_000
+    next_sample = clock.now_us + interval_us
+    costs = []
+    lines = [0, 0]   # this update, most in one update
+
+    def count_lines(frame, event, arg):
+        if event == "line":
+            lines[0] += 1
+        return count_lines
+
+    def advance(t_us):
+        nonlocal next_sample
+        while next_sample <= t_us:
+            board.advance_to_us(next_sample)
+            now = clock.ticks_ms()
+            if len(costs) % 2:
+                # Every other update counts lines (tracing skews its time)
+                sys.settrace(count_lines)
+                traffic_flow.update_traffic_flow(now)
+                sys.settrace(None)
+                lines[1] = max(lines[1], lines[0])
+                lines[0] = 0
+                costs.append(None)
+            else:
+                start = time.perf_counter()
+                traffic_flow.update_traffic_flow(now)
+                costs.append(time.perf_counter() - start)
+            next_sample += interval_us
+        board.advance_to_us(t_us)
+
+    mean_gap_us = 60_000_000 / per_min
+    vehicles = []
+    t = clock.now_us + rng.expovariate(1 / mean_gap_us)
+    while t < end_us:
+        gap = rng.expovariate(1 / mean_gap_us)
+        on_us = int(t)
+        off_us = on_us + max(1, int(min(gap, mean_gap_us) * rng.uniform(0.1, 0.6)))
+        if off_us >= t + gap:
+            off_us = int(t + gap) - 1
+        if off_us <= on_us:
+            t += gap
+            continue   # closer than 1 us: one vehicle for the detector
+        advance(on_us)
+        board.drive_input(pin, 1)
+        advance(off_us)
+        board.drive_input(pin, 0)
+        vehicles.append((on_us, off_us))
+        t += gap
+    advance(end_us)
+    return vehicles, [c for c in costs if c is not None], lines[1]
+
+
+def window_truth(vehicles, start_us, end_us):
+    """Vehicles arriving and occupancy (permille) in [start_us, end_us)."""
+    count = 0
+    occupied = 0
+    for on_us, off_us in vehicles:
+        if start_us <= on_us < end_us:
+            count += 1
+        overlap = min(off_us, end_us) - max(on_us, start_us)
+        if overlap > 0:
+            occupied += overlap
+    return count, occupied * 1000 // (end_us - start_us)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("{:>8}{:>10}{:>9}{:>14}{:>13}{:>7}{:>8}{:>8}{:>7}{:>14}".format(
+        "veh/min", "driven", "counted", "window/true", "occ/true %", "level",
+        "wait s", "walk s", "lines", "update us"))
+    failed = False
+    for per_min in RATES:
+        rng = random.Random(args.seed)
+        sim = setup()
+        detector = sim.modules["detector"]
+        traffic_flow = sim.modules["traffic_flow"]
+        vehicles, costs, lines = drive(sim, per_min, args.minutes, rng)
+
+        counted = detector.get_pulses()
+        # The window ends at the last closed bin
+        end_us = sim.clock.now_us - sim.clock.now_us % 1000 - \
+            detector.time.ticks_diff(sim.clock.ticks_ms(), detector._bin_start_ms) * 1000
+        count, occ = window_truth(vehicles, end_us - detector._filled * 1_000_000, end_us)
+        ok = counted == len(vehicles)
+        failed = failed or not ok
+        costs.sort()
+        print("{:>8}{:>10}{:>9}{:>14}{:>13}{:>7}{:>8.1f}{:>8.1f}{:>7}{:>14}".format(
+            per_min, len(vehicles), counted if ok else "{} !".format(counted),
+            "{}/{}".format(detector._win_count, count),
+            "{:.1f}/{:.1f}".format(detector.get_occupancy_permille() / 10, occ / 10),
+            traffic_flow.get_flow_raw(),
+            traffic_flow.compute_wait_before_walk_ms() / 1000,
+            traffic_flow.compute_ped_green_ms() / 1000, lines,
+            "{:.1f} / {:.1f}".format(costs[len(costs) // 2] * 1e6, costs[-1] * 1e6)))
+    print("lines: most Python lines run by one sampler update; "
+          "update us: median / max host time")
+    print("FAIL: vehicles lost or double counted" if failed else "OK: every vehicle counted")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
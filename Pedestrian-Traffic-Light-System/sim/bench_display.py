@@ -0,0 +1,119 @@
+# sim/bench_display.py
+"""
+Worst-case loop stall caused by the OLED, with I2C transfers that take
+real bus time, and recovery from a panel that stops answering.
+
+Every loop pass after boot is timed on the virtual clock (the boot
+stage that brings the panel up is not). The blocking case sends
+a whole frame in one pass (128-byte chunks, no budget); the chunked
+case uses the settings in display_oled.py. A NACK burst (--nack-ms)
+that also clears the panel RAM, as a power cycle would, checks that
+the panel shows the right screen again afterwards; the pass that
+re-initializes the panel (the init commands, then chunks as the budget
+allows) is reported on its own. Exits with status 1 if a panel does
+not recover or the chunked re-init pass exceeds OLED_FLUSH_BUDGET_US.
+
+    python -m sim.bench_display [--minutes 30] [--seed 1] [--nack-ms 3000]
+"""
+import argparse
+import random
+import sys
+
+from .runner import Simulation
+
+I2C_US_PER_BYTE = 23          # 9 bits per byte at 400 kHz
+
+
+def run(chunk_bytes, budget_us, minutes, seed, nack_ms):
+    rng = random.Random(seed)
+    sim = Simulation()
+    sim.board.i2c_us_per_byte = I2C_US_PER_BYTE
+    display = sim.modules["display_oled"]
+    startup = sim.modules["startup"]
+    if chunk_bytes is not None:
+        display.OLED_CHUNK_BYTES = chunk_bytes
+        display.OLED_FLUSH_BUDGET_US = budget_us
+    sim.set_flow(lambda t_ms: 1500 + (t_ms // 60_000) % 5 * 400)
+
+    passes = []
+    reinit_passes = []
+    main = sim.main
+    update_all = main.update_all
+    clock = sim.clock
+
+    def timed_update_all(now):
+        if startup.pending():
+            update_all(now)
+            return
+        start = clock.now_us
+        reinits = display._reinits
+        update_all(now)
+        if display._reinits != reinits:
+            reinit_passes.append(clock.now_us - start)
+        else:
+            passes.append(clock.now_us - start)
+    main.update_all = timed_update_all
+
+    t = 1_000
+    end_ms = minutes * 60_000
+    while t < end_ms:
+        sim.press(t)
+        t += rng.randint(90_000, 150_000)
+
+    # Panel stops answering in the middle of the run
+    nack_at = end_ms // 2
+    sim.run(nack_at)
+    sim.board.i2c_fail = True
+    panel = sim.hardware.oled.panel
+    panel.ram[:] = bytes(len(panel.ram))   # power cycled meanwhile
+    sim.run(nack_at + nack_ms)
+    sim.board.i2c_fail = False
+    sim.run(end_ms)
+    main.update_all = update_all
+
+    # The panel must end up showing the same frame the driver drew
+    recovered = panel.text_lines() == _drawn_lines(sim)
+    return passes, reinit_passes, display, recovered
+
+
+def _drawn_lines(sim):
+    """Text of the framebuffer as drawn (decoded with the panel model)."""
+    oled = sim.hardware.oled
+    panel = type(oled.panel)(oled.width, oled.height)
+    panel.ram[:] = oled.buffer
+    return panel.text_lines()
+
+
+def _summary(passes):
+    passes = sorted(passes)
+    n = len(passes)
+    return "{:>6} passes  p99 {:5d} us  max {:5d} us".format(
+        n, passes[min(n - 1, n * 99 // 100)], passes[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--nack-ms", type=int, default=3000)
+    args = parser.parse_args()
+
+    failed = False
+    for label, chunk, budget in (("whole frame per pass:", 128, 0),
+                                 ("chunked:", None, None)):
+        passes, reinit_passes, display, recovered = run(
+            chunk, budget, args.minutes, args.seed, args.nack_ms)
+        print("{:<22}{}".format(label, _summary(passes)))
+        print("{:<22}chunks {}  nacks {}  reinits {} (max {} us)  recovered: {}".format(
+            "", display._chunks_sent, display._nacks, display._reinits,
+            max(reinit_passes, default=0), "yes" if recovered else "NO"))
+        failed = failed or not recovered
+    if max(reinit_passes, default=0) > display.OLED_FLUSH_BUDGET_US:
+        failed = True
+    print("FAIL: panel not recovered or re-init over the flush budget" if failed else
+          "OK: panel recovered, re-init within the {} us budget".format(display.OLED_FLUSH_BUDGET_US))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
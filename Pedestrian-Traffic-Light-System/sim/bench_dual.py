@@ -0,0 +1,202 @@
+# sim/bench_dual.py
+"""
+Safety loop timing with the display in the same loop (main.py) and in
+its own thread (main_dual.py), with a normal and an artificially slow
+display, in real time on CPython threads.
+
+Each run starts in the pedestrian green with the beeps timed by the
+loop (tone sequencer off, so every beep edge is a loop deadline), and
+a vehicle crosses on red every VIOLATION_EVERY_MS from a driver thread
+(pin IRQ). The slow display sleeps --slow-ms in every update_lcd() call
+("blocking", like an I2C transfer) or spins for it ("busy", holding
+the interpreter). For each run: safety passes, wakeup lateness against
+the deadline (worst, p99 bucket, misses over profiler.LOOP_TARGET_MS),
+the longest 50 ms beep, and display refreshes. Exits with status 1 if
+the slow blocking display makes the dual-thread safety loop later than
+with the normal display by more than LOOP_TARGET_MS. A busy display
+holds the interpreter lock, which a second thread cannot work around;
+when the "dual busy" run misses deadlines the bench prints that
+limitation instead of OK (exit status 0, it is not a regression).
+
+    python -m sim.bench_dual [--seconds 6] [--slow-ms 200]
+"""
+import argparse
+import importlib
+import sys
+import threading
+import time
+
+from .clock import RealClock
+from .runner import Simulation
+
+VIOLATION_EVERY_MS = 700
+RUNS = (("single", None), ("single", "blocking"), ("dual", None),
+        ("dual", "blocking"), ("dual", "busy"))
+
+
+def setup():
+    sim = Simulation(clock=RealClock())
+    sim.set_flow(2048)
+    sim.modules["tone"].TONE_SEQUENCER_ENABLED = False
+    sim.modules["profiler"].PROFILE_ENABLED = True
+    return sim
+
+
+def slow_down(sim, kind, slow_ms):
+    """Make every update_lcd() call slow_ms longer; returns the call counter."""
+    display_oled = sim.modules["display_oled"]
+    main = sim.main
+    update_lcd = display_oled.update_lcd
+    calls = [0]
+
+    def slow_update_lcd(now_ms):
+        update_lcd(now_ms)
+        calls[0] += 1
+        if kind == "blocking":
+            time.sleep(slow_ms / 1000)
+        elif kind == "busy":
+            end = time.perf_counter() + slow_ms / 1000
+            while time.perf_counter() < end:
+                pass
+    display_oled.update_lcd = slow_update_lcd
+    # main.py (and main_dual.py through it) call through the subsystem table
+    main.SUBSYSTEMS = tuple(
+        (stage, slot, slow_update_lcd if update is update_lcd else update, next_deadline)
+        for stage, slot, update, next_deadline in main.SUBSYSTEMS)
+    return calls
+
+
+def drive_violations(sim, stop):
+    """Driver thread: a vehicle over the stop line every VIOLATION_EVERY_MS."""
+    pin = sim.hardware.BOT2_PIN
+    while not stop.wait(VIOLATION_EVERY_MS / 1000):
+        sim.board.drive_input(pin, 0)
+        time.sleep(0.1)
+        sim.board.drive_input(pin, 1)
+
+
+def run_single(sim, seconds):
+    """main.main() for a fixed time."""
+    main = sim.main
+    scheduler = sim.modules["scheduler"]
+    profiler = sim.modules["profiler"]
+    main.init_system()
+    sim.modules["startup"].run_all()
+    traffic = sim.modules["traffic"]
+    traffic._enter(traffic.TRAFFIC_PED_GREEN, time.ticks_ms())
+    profiler.reset()
+    passes = 0
+    deadline = None
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        now = time.ticks_ms()
+        profiler.record_wakeup(deadline, now)
+        main.update_all(now)
+        passes += 1
+        deadline = main.next_wakeup(now)
+        scheduler.sleep_until(now, deadline)
+    return passes
+
+
+def run_dual(sim, seconds):
+    """main_dual.main() for a fixed time."""
+    main_dual = importlib.import_module("main_dual")
+    profiler = sim.modules["profiler"]
+    main_dual.start()
+    traffic = sim.modules["traffic"]
+    traffic._enter(traffic.TRAFFIC_PED_GREEN, time.ticks_ms())
+    profiler.reset()
+    timer = threading.Timer(seconds, main_dual.stop)
+    timer.start()
+    main_dual._safety_loop()
+    while main_dual.is_background_running():
+        time.sleep(0.01)
+    return main_dual._safety_passes
+
+
+def longest_beep_ms(sim, start_ms):
+    """Longest buzzer on-time (duty > 0) after start_ms."""
+    longest = 0
+    on = None
+    for t, duty in sim.changes("BUZZER"):
+        if duty and on is None:
+            on = t
+        elif not duty and on is not None:
+            if on >= start_ms:
+                longest = max(longest, t - on)
+            on = None
+    return longest
+
+
+def run(mode, slow, seconds, slow_ms):
+    sim = setup()
+    calls = slow_down(sim, slow, slow_ms)
+    stop = threading.Event()
+    driver = threading.Thread(target=drive_violations, args=(sim, stop))
+
+    def body():
+        driver.start()
+        try:
+            if mode == "single":
+                return run_single(sim, seconds)
+            return run_dual(sim, seconds)
+        finally:
+            stop.set()
+            driver.join()
+    start_ms = sim.clock.now_ms()
+    passes = sim._call(body)
+
+    profiler = sim.modules["profiler"]
+    slot = profiler.PROF_JITTER
+    return {
+        "run": "{} {}".format(mode, slow or "normal"),
+        "passes": passes,
+        "worst_ms": profiler._max_us[slot] / 1000,
+        "p99_ms": profiler.percentile_us(slot, 99) / 1000,
+        "misses": profiler.get_deadline_misses(),
+        "beep_ms": longest_beep_ms(sim, start_ms),
+        "refreshes": calls[0],
+        "fines": sim.modules["violation"].get_fines(),
+        "target_ms": profiler.LOOP_TARGET_MS,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=6)
+    parser.add_argument("--slow-ms", type=int, default=200)
+    args = parser.parse_args()
+
+    print("{:<16}{:>8}{:>11}{:>9}{:>8}{:>10}{:>11}{:>7}".format(
+        "run", "passes", "worst ms", "p99 ms", "misses", "beep ms", "refreshes", "fines"))
+    results = {}
+    for mode, slow in RUNS:
+        r = run(mode, slow, args.seconds, args.slow_ms)
+        results[(mode, slow)] = r
+        print("{:<16}{:>8}{:>11.1f}{:>9.1f}{:>8}{:>10}{:>11}{:>7}".format(
+            r["run"], r["passes"], r["worst_ms"], r["p99_ms"], r["misses"],
+            r["beep_ms"], r["refreshes"], r["fines"]))
+    target = r["target_ms"]
+    print("worst/p99 ms: safety loop wakeup after its deadline; misses: later than {} ms; "
+          "beep ms: longest beep (50 ms)".format(target))
+
+    normal = results[("dual", None)]["worst_ms"]
+    slow = results[("dual", "blocking")]["worst_ms"]
+    busy = results[("dual", "busy")]
+    ok = slow <= normal + target
+    if not ok:
+        print("FAIL: slow display delays the safety loop ({:.1f} ms > {:.1f} ms)".format(
+            slow, normal + target))
+    elif busy["misses"]:
+        # Not a regression: only a display that waits gives the lock away
+        print("LIMITATION: a blocking display leaves the safety loop on time, a busy one "
+              "does not ({} misses, worst {:.1f} ms): it holds the interpreter lock "
+              "(CPython GIL, MicroPython _thread on the ESP32 port), so update_lcd() "
+              "must wait on I/O, not compute".format(busy["misses"], busy["worst_ms"]))
+    else:
+        print("OK: slow display leaves the safety loop on time, blocking or busy")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
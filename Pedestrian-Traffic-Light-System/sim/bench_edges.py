@@ -0,0 +1,154 @@
+# sim/bench_edges.py
+"""
+Bursts of pin edges through the IRQ ring buffers (input_events.py).
+
+Each burst toggles Bot1 (pedestrian button) or Bot2 (violation sensor,
+with the car light red) through the stub Pin IRQ, faster than any loop
+pass, and ends on a press that is held and then released. A ring holds
+RING_SIZE - 1 edges; the rest must be counted as dropped, not lost
+silently. After the burst the loop replays the ring (buttons.py,
+violation.py) and every burst must give exactly one crossing request
+or one fine, whether edges were dropped or not. A second run streams
+thousands of clean presses through the scheduled loop with no drops.
+
+Allocation: the IRQ path (_push, the handlers, the ring accessors) is
+scanned for allocating bytecode as in sim/check_alloc.py, and
+tracemalloc checks that no memory held by input_events.py grows over
+the bursts.
+
+    python -m sim.bench_edges [--presses 2000]
+"""
+import argparse
+import sys
+import tracemalloc
+
+from .check_alloc import allocating_ops
+from .runner import Simulation
+
+BURSTS = (1, 15, 63, 65, 101, 1001, 5001)   # odd: each ends pressed
+EDGE_US = 20                                 # time between two edges of a burst
+HOLD_MS = 300
+
+IRQ_FUNCTIONS = ("_push", "_on_bot1", "_on_bot2", "_resync",
+                 "pending", "peek_ms", "peek_level", "pop", "take_overflows")
+
+
+def setup():
+    """A booted simulation with every stage up and the requests counted."""
+    sim = Simulation()
+    sim.set_flow(2048)
+    sim.boot()
+    sim._call(sim.modules["startup"].run_all)
+    buttons = sim.modules["buttons"]
+    requests = [0]
+    request_crossing = buttons.request_crossing
+
+    def counted(t_ms):
+        requests[0] += 1
+        request_crossing(t_ms)
+    buttons.request_crossing = counted
+    return sim, requests
+
+
+def burst(sim, pin_id, edges):
+    """Toggle a released input `edges` times within one loop pass."""
+    board = sim.board
+    clock = sim.clock
+    level = board.levels[pin_id]
+    for _ in range(edges):
+        clock.now_us += EDGE_US
+        level = 1 - level
+        board.drive_input(pin_id, level)
+
+
+def run_bursts(sim, requests, ch, pin_id):
+    """One burst per size; returns rows (edges, queued, dropped, events, ok)."""
+    events = sim.modules["input_events"]
+    traffic = sim.modules["traffic"]
+    violation = sim.modules["violation"]
+    rows = []
+    for edges in BURSTS:
+        if ch == events.CH_BOT2:
+            traffic._enter(traffic.TRAFFIC_PED_GREEN, sim.clock.ticks_ms())
+        before = requests[0] if ch == events.CH_BOT1 else violation.get_fines()
+        burst(sim, pin_id, edges)
+        queued = events.pending(ch)
+        dropped = events._overflows[ch]
+        t_ms = sim.clock.now_ms()
+        sim.run(t_ms + HOLD_MS)
+        sim.board.drive_input(pin_id, 1)
+        sim.run(t_ms + 2 * HOLD_MS)
+        after = requests[0] if ch == events.CH_BOT1 else violation.get_fines()
+        expected_queued = min(edges, events.RING_SIZE - 1)
+        ok = queued == expected_queued and dropped == edges - expected_queued and \
+            after - before == 1 and events.pending(ch) == 0
+        rows.append((edges, queued, dropped, after - before, ok))
+    return rows
+
+
+def run_stream(presses):
+    """Clean presses, 80 ms down and 80 ms up, through the scheduled loop."""
+    sim, requests = setup()
+    events = sim.modules["input_events"]
+    bot1 = sim.hardware.BOT1_PIN
+    start_ms = sim.clock.now_ms() + 100
+    for k in range(presses):
+        t_us = (start_ms + k * 160) * 1000
+        sim.board.schedule_input(t_us, bot1, 0)
+        sim.board.schedule_input(t_us + 80_000, bot1, 1)
+    sim.run(start_ms + presses * 160 + 500)
+    return requests[0], events.take_overflows(events.CH_BOT1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--presses", type=int, default=2000)
+    args = parser.parse_args()
+    failed = False
+
+    sim, requests = setup()
+    events = sim.modules["input_events"]
+    print("bytecode scan of the IRQ path:")
+    for name in IRQ_FUNCTIONS:
+        code = getattr(events, name).__code__
+        for line, op in allocating_ops(code):
+            print("  input_events.py:{} {}(): {}".format(line, name, op))
+            failed = True
+
+    # One round under tracemalloc first, so both snapshots see the
+    # globals that merely hold a new int (as in check_alloc.py)
+    channels = (("Bot1", events.CH_BOT1, sim.hardware.BOT1_PIN),
+                ("Bot2", events.CH_BOT2, sim.hardware.BOT2_PIN))
+    tracemalloc.start()
+    for _, ch, pin_id in channels:
+        run_bursts(sim, requests, ch, pin_id)
+    first = tracemalloc.take_snapshot()
+    print("{:<10}{:>8}{:>8}{:>9}{:>8}".format("channel", "edges", "queued", "dropped", "events"))
+    for label, ch, pin_id in channels:
+        for edges, queued, dropped, got, ok in run_bursts(sim, requests, ch, pin_id):
+            failed = failed or not ok
+            print("{:<10}{:>8}{:>8}{:>9}{:>8}{}".format(
+                label, edges, queued, dropped, got, "" if ok else "  MISMATCH"))
+    second = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    held = [stat for stat in second.compare_to(first, "lineno")
+            if stat.size_diff > 0 and
+            stat.traceback[0].filename == events.__file__]
+    print("tracemalloc: {} input_events.py lines hold more memory".format(len(held)))
+    for stat in held:
+        print("  {}".format(stat))
+        failed = True
+
+    got, dropped = run_stream(args.presses)
+    ok = got == args.presses and dropped == 0
+    failed = failed or not ok
+    print("stream: {} presses, {} requests, {} dropped{}".format(
+        args.presses, got, dropped, "" if ok else "  MISMATCH"))
+
+    print("FAIL: edges lost, duplicated or allocating" if failed else
+          "OK: drops counted, one event per burst, no allocation")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# sim/bench_inputs.py
+"""
+Cost of one input scan (input_scan.py) from 2 to 32 inputs, against
+reading and debouncing every pin on its own.
+
+Half of the inputs are pedestrian buttons, half lane sensors (at most
+violation.MAX_LANES). Every input gets random presses / vehicles with
+contact bounce on both edges while the car light is red, so each
+clean press must request the crossing and each vehicle must give one
+violation on its lane. The ESP32 has no 32 free input pins, so the
+inputs sit on a simulated 32-bit port (pins 64-95).
+
+Per pass (median): Python lines executed (firmware only, not the stub
+port) and host time of input_scan.update_inputs(), and host time of the per-pin loop (one
+Pin.value() and one counter per input, as buttons.py does for Bot1).
+Passes that route an event also run the event's own handling. Host
+times include the stub port, which builds its word pin by pin.
+
+    python -m sim.bench_inputs [--seconds 60] [--seed 1]
+"""
+import argparse
+import random
+import sys
+import time
+
+from . import machine as machine_stub
+from .runner import Simulation
+
+PORT_REG = 0x60000000
+FIRST_PIN = 64
+COUNTS = (2, 4, 8, 16, 24, 32)
+
+
+def setup(inputs):
+    """A booted simulation scanning `inputs` pins, with the car light red."""
+    sim = Simulation()
+    scan = sim.modules["input_scan"]
+    violation = sim.modules["violation"]
+    sim.board.ports[PORT_REG] = FIRST_PIN
+    lanes = min(inputs // 2, violation.MAX_LANES)
+    pins = tuple(range(FIRST_PIN, FIRST_PIN + inputs))
+    scan.INPUT_SCAN_ENABLED = True
+    scan.INPUT_PORT_REG = PORT_REG
+    scan.INPUT_PORT_FIRST_PIN = FIRST_PIN
+    scan.PED_BUTTON_PINS = pins[:inputs - lanes]
+    scan.LANE_SENSOR_PINS = pins[inputs - lanes:]
+    sim.boot()
+    sim._call(sim.modules["startup"].run_all)
+    traffic = sim.modules["traffic"]
+    traffic._enter(traffic.TRAFFIC_PED_GREEN, sim.clock.ticks_ms())
+    return sim
+
+
+def activity(pins, seconds, rng):
+    """Edges (t_ms, pin, level) of bouncing presses; returns (edges, presses per pin)."""
+    edges = []
+    presses = {}
+    for pin in pins:
+        t = rng.uniform(50, 2000)
+        count = 0
+        while t < seconds * 1000 - 1000:
+            hold = rng.uniform(100, 400)
+            for start, level in ((t, 0), (t + hold, 1)):
+                # Contact bounce: a few short toggles before the final level
+                for k in range(rng.randrange(4)):
+                    edges.append((start + k * 1.5, pin, level))
+                    edges.append((start + k * 1.5 + 0.7, pin, 1 - level))
+                edges.append((start + 5, pin, level))
+            count += 1
+            t += hold + rng.uniform(150, 3000)
+        presses[pin] = count
+    edges.sort()
+    return edges, presses
+
+
+class PerPin:
+    """Reference: one Pin.value() and one integer debounce per input and pass."""
+
+    def __init__(self, pins, pin_class):
+        self.pins = [pin_class(p) for p in pins]
+        self.level = [1] * len(pins)
+        self.count = [0] * len(pins)
+
+    def scan(self):
+        for i, pin in enumerate(self.pins):
+            v = pin.value()
+            if v != self.level[i]:
+                self.count[i] += 1
+                if self.count[i] >= 4:
+                    self.level[i] = v
+                    self.count[i] = 0
+            else:
+                self.count[i] = 0
+
+
+def run(inputs, seconds, seed):
+    sim = setup(inputs)
+    scan = sim.modules["input_scan"]
+    violation = sim.modules["violation"]
+    clock = sim.clock
+    board = sim.board
+    pins = scan.PED_BUTTON_PINS + scan.LANE_SENSOR_PINS
+    edges, presses = activity(pins, seconds, random.Random(seed))
+    reference = PerPin(pins, sim.modules["hardware"].Pin)
+
+    lines = [0]
+    scan_lines = []
+    stub_files = (machine_stub.__file__,)
+
+    def count_lines(frame, event, arg):
+        # Firmware lines only: the stub port builds its word pin by pin
+        if event == "line" and frame.f_code.co_filename not in stub_files:
+            lines[0] += 1
+        return count_lines
+
+    scan_us = []
+    pin_us = []
+    start_us = clock.now_us
+
+    def loop():
+        i = 0
+        t_ms = 0
+        while t_ms < seconds * 1000:
+            t_ms += 1
+            while i < len(edges) and edges[i][0] <= t_ms:
+                _, pin, level = edges[i]
+                board.drive_input(pin, level)
+                i += 1
+            board.advance_to_us(start_us + t_ms * 1000)
+            now = clock.ticks_ms()
+            scans = scan._scans
+            if len(scan_lines) < len(scan_us):
+                # Every other scan counts lines (tracing skews its time)
+                sys.settrace(count_lines)
+                scan.update_inputs(now)
+                sys.settrace(None)
+                if scan._scans != scans:
+                    scan_lines.append(lines[0])
+                lines[0] = 0
+            else:
+                started = time.perf_counter()
+                scan.update_inputs(now)
+                elapsed = time.perf_counter() - started
+                if scan._scans != scans:
+                    scan_us.append(elapsed)
+            if t_ms % scan.SCAN_INTERVAL_MS == 0:
+                started = time.perf_counter()
+                reference.scan()
+                pin_us.append(time.perf_counter() - started)
+    # Fines and crossings print; keep the table readable
+    sim._call(loop)
+
+    lanes = scan.LANE_SENSOR_PINS
+    expected_presses = sum(presses[p] for p in scan.PED_BUTTON_PINS)
+    expected_lanes = [presses[p] for p in lanes]
+    got_lanes = [violation.get_lane_fines(k) for k in range(len(lanes))]
+    ok = scan._presses == expected_presses and got_lanes == expected_lanes
+    return {
+        "inputs": inputs,
+        "ped": len(scan.PED_BUTTON_PINS),
+        "lanes": len(lanes),
+        "presses": "{}/{}".format(scan._presses, expected_presses),
+        "violations": "{}/{}".format(sum(got_lanes), sum(expected_lanes)),
+        "ok": ok,
+        "lines": _median(scan_lines),
+        "scan_us": _median([t for t in scan_us if t is not None]) * 1e6,
+        "pin_us": _median(pin_us) * 1e6,
+        "port_reads": board.port_reads,
+        "scans": scan._scans,
+    }
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("{:>7}{:>11}{:>12}{:>13}{:>7}{:>10}{:>13}{:>12}".format(
+        "inputs", "ped/lanes", "presses", "violations", "lines", "scan us",
+        "per-pin us", "reads/scan"))
+    failed = False
+    for inputs in COUNTS:
+        r = run(inputs, args.seconds, args.seed)
+        failed = failed or not r["ok"]
+        print("{:>7}{:>11}{:>12}{:>13}{:>7}{:>10.1f}{:>13.1f}{:>12.2f}{}".format(
+            r["inputs"], "{}/{}".format(r["ped"], r["lanes"]), r["presses"],
+            r["violations"], r["lines"], r["scan_us"], r["pin_us"],
+            r["port_reads"] / max(r["scans"], 1), "" if r["ok"] else "  MISMATCH"))
+    print("lines, us: median Python lines and host time per pass")
+    print("FAIL: events lost or duplicated" if failed else "OK: every press and vehicle seen once")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# sim/bench_lut.py
+"""
+Checks the integer timing paths against the float formulas they
+replace, and measures heap use per call of each.
+
+    python -m sim.bench_lut
+
+A table entry must hold its curve at the middle of the raw ADC values
+it covers, rounded to LUT_UNIT_MS; the largest error against the curve
+at the exact raw value is printed. The lookup tables are also built
+from a timing table with waits past 65 s (loaded, as
+sim/optimize_timing.py can write one) and from tables with a bad value
+(ignored: the linear maps stay in use). The RAM of both tables and the
+largest wait error are printed for a few values of FLOW_LUT_SHIFT.
+
+Heap use is measured as in sim/check_alloc.py: tracemalloc gives the
+peak above the start while the calls run (on CPython every int above
+256 is a heap object, so no path reads 0), and the bytecode of every
+function a call runs is scanned for instructions that allocate on
+MicroPython. Exits with status 1 on any mismatch.
+"""
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+from .check_alloc import allocating_ops
+from .runner import Simulation
+
+CALLS = 10_000
+
+
+def _float_wait(raw):
+    flow = raw / 4095.0
+    return int(10_000 + (60_000 - 10_000) * flow)
+
+
+def _float_walk(raw):
+    flow = raw / 4095.0
+    return int(40_000 - (40_000 - 10_000) * flow)
+
+
+def _float_interval(remaining, total):
+    ratio = float(remaining) / float(total)
+    return int(100 + ratio * (400 - 100))
+
+
+def _entry_raw(traffic_flow, raw):
+    """The raw ADC value a table entry is evaluated at for raw."""
+    shift = traffic_flow.FLOW_LUT_SHIFT
+    return ((raw >> shift) << shift) + ((1 << shift) >> 1)
+
+
+def _rounded(traffic_flow, ms):
+    unit = traffic_flow.LUT_UNIT_MS
+    return (ms + unit // 2) // unit * unit
+
+
+def check_flow(traffic_flow):
+    """
+    Every raw ADC value through the lookup tables. Return (mismatches,
+    largest error in ms against the formula at the exact raw value).
+    """
+    mismatches = 0
+    worst = 0
+    for raw in range(traffic_flow.ADC_MAX + 1):
+        traffic_flow._ema_fp = raw << traffic_flow._EMA_FRAC
+        entry = _entry_raw(traffic_flow, raw)
+        wait = traffic_flow.compute_wait_before_walk_ms()
+        walk = traffic_flow.compute_ped_green_ms()
+        if wait != _rounded(traffic_flow, _float_wait(entry)):
+            mismatches += 1
+        if walk != _rounded(traffic_flow, _float_walk(entry)):
+            mismatches += 1
+        worst = max(worst, abs(wait - _float_wait(raw)), abs(walk - _float_walk(raw)))
+    return mismatches, worst
+
+
+def table_costs(traffic_flow, shifts=(0, 2, 4, 6)):
+    """
+    Rebuild the tables at each shift; return a list of (shift, entries,
+    bytes of both tables, largest wait error in ms).
+    """
+    saved = traffic_flow.FLOW_LUT_SHIFT
+    rows = []
+    try:
+        for shift in shifts:
+            traffic_flow.FLOW_LUT_SHIFT = shift
+            traffic_flow._build_luts()
+            wait_lut = traffic_flow._wait_lut
+            walk_lut = traffic_flow._walk_lut
+            size = len(wait_lut) * wait_lut.itemsize + len(walk_lut) * walk_lut.itemsize
+            worst = 0
+            for raw in range(traffic_flow.ADC_MAX + 1):
+                traffic_flow._ema_fp = raw << traffic_flow._EMA_FRAC
+                worst = max(worst, abs(traffic_flow.compute_wait_before_walk_ms() - _float_wait(raw)))
+            rows.append((shift, len(wait_lut), size, worst))
+    finally:
+        traffic_flow.FLOW_LUT_SHIFT = saved
+        traffic_flow._build_luts()
+    return rows
+
+
+def check_interval(traffic, buzzer, now, seed=1):
+    """
+    buzzer._crossing_interval_ms() against the float ratio, for every
+    remaining time of a few pedestrian greens (the phase is placed so
+    that remaining ms are left at now).
+    """
+    rng = random.Random(seed)
+    totals = [10_000, 25_000, 40_000] + [rng.randint(10_000, 40_000) for _ in range(20)]
+    mismatches = 0
+    traffic.traffic_state = traffic.TRAFFIC_PED_GREEN
+    for total in totals:
+        traffic._phase_ms[traffic.TRAFFIC_PED_GREEN] = total
+        for remaining in range(total + 1):
+            traffic.traffic_state_start_ms = now - (total - remaining)
+            if buzzer._crossing_interval_ms(now) != _float_interval(remaining, total):
+                mismatches += 1
+    return mismatches
+
+
+def check_table(traffic_flow):
+    """
+    Return (long table mismatches, bad tables not ignored). A table
+    with waits up to 90 s must give the same lookups as its curve; a
+    table with a value out of range or not an int must be ignored.
+    """
+    points = traffic_flow.TABLE_POINTS
+    step = 80_000 // (points - 1)
+    long_wait = [10_000 + i * step for i in range(points)]
+    walk = [10_000] * points
+    bad = (
+        ("negative", [-1] + long_wait[1:]),
+        ("over the limit", long_wait[:-1] + [traffic_flow.TABLE_MAX_MS + 1]),
+        ("float", [10_000.5] + long_wait[1:]),
+    )
+    table_dir = tempfile.mkdtemp(prefix="sim_lut_")
+    path = os.path.join(table_dir, "timing.json")
+    try:
+        with open(path, "w") as f:
+            json.dump({"wait_ms": long_wait, "walk_ms": walk}, f)
+        mismatches = 0 if traffic_flow.load_timing_table(path) else 1
+        for raw in range(traffic_flow.ADC_MAX + 1):
+            traffic_flow._ema_fp = raw << traffic_flow._EMA_FRAC
+            entry = _entry_raw(traffic_flow, raw)
+            expected = _rounded(traffic_flow, traffic_flow._lookup(
+                traffic_flow._wait_table, entry / 4095.0))
+            if traffic_flow.compute_wait_before_walk_ms() != expected:
+                mismatches += 1
+
+        accepted = 0
+        for _, wait in bad:
+            with open(path, "w") as f:
+                json.dump({"wait_ms": wait, "walk_ms": walk}, f)
+            if traffic_flow.load_timing_table(path) or \
+                    traffic_flow.compute_wait_before_walk_ms(0.0) != 10_000:
+                accepted += 1
+        return mismatches, accepted
+    finally:
+        shutil.rmtree(table_dir)
+        traffic_flow.load_timing_table()   # back to the linear maps
+
+
+def _peak_bytes(fn, calls):
+    """Peak traced heap above the start while fn() is called."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = tracemalloc.get_traced_memory()[0]
+    for _ in range(calls):
+        fn()
+    peak = tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+    return peak
+
+
+def _allocating_ops(fn):
+    """Allocating instructions in the functions one call of fn() runs."""
+    codes = set()
+
+    def profile(frame, event, arg):
+        if event == "call":
+            codes.add(frame.f_code)
+    sys.setprofile(profile)
+    try:
+        fn()
+    finally:
+        sys.setprofile(None)
+    return sum(len(allocating_ops(code)) for code in codes)
+
+
+def main():
+    sim = Simulation()
+    sim.boot()
+    sim.modules["startup"].run_all()   # the flow stage builds the tables
+    traffic_flow = sim.modules["traffic_flow"]
+    traffic = sim.modules["traffic"]
+    buzzer = sim.modules["buzzer"]
+
+    flow, flow_error = check_flow(traffic_flow)
+    interval = check_interval(traffic, buzzer, sim.clock.ticks_ms() + 60_000)
+    long_table, bad_tables = check_table(traffic_flow)
+    print("flow table mismatches:     ", flow)
+    print("flow table max error (ms): ", flow_error)
+    print("beep interval mismatches:  ", interval)
+    print("90 s table mismatches:     ", long_table)
+    print("bad tables not ignored:    ", bad_tables)
+
+    print("  {:<8}{:>10}{:>14}{:>18}".format("shift", "entries", "table bytes", "max wait error"))
+    for shift, entries, size, worst in table_costs(traffic_flow):
+        mark = "  (FLOW_LUT_SHIFT)" if shift == traffic_flow.FLOW_LUT_SHIFT else ""
+        print("  {:<8}{:>10}{:>14}{:>15} ms{}".format(shift, entries, size, worst, mark))
+
+    # Pedestrian green running, as in the hot phase of the buzzer
+    traffic._enter(traffic.TRAFFIC_PED_GREEN, sim.clock.ticks_ms())
+    now = sim.clock.ticks_ms() + 5_000
+    raw = 3000
+    traffic_flow._ema_fp = raw << traffic_flow._EMA_FRAC
+
+    rows = (
+        ("wait, float formula", lambda: _float_wait(raw)),
+        ("wait, lookup table", traffic_flow.compute_wait_before_walk_ms),
+        ("interval, float ratio",
+         lambda: _float_interval(*traffic.get_ped_remaining_and_total_ms(now))),
+        ("interval, integer", lambda: buzzer._crossing_interval_ms(now)),
+    )
+    print("  {:<24}{:>12}{:>16}".format(
+        "", "peak bytes", "allocating ops"))
+    for name, fn in rows:
+        print("  {:<24}{:>12}{:>16}".format(name, _peak_bytes(fn, CALLS), _allocating_ops(fn)))
+    print("  (peak over {} calls; ops in the bytecode one call runs)".format(CALLS))
+
+    failed = flow or interval or long_table or bad_tables
+    print("FAIL: integer paths differ from the formulas" if failed else
+          "OK: integer paths match the formulas")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
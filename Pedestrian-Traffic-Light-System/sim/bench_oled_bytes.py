@@ -0,0 +1,76 @@
+# sim/bench_oled_bytes.py
+"""
+I2C bytes sent to the OLED per pedestrian cycle: the original refresh
+(clear, draw and a full show() every LCD_UPDATE_INTERVAL_MS) against
+the cached framebuffers that send only the chunks whose columns
+changed (display_oled.py).
+
+Every cycle is a press, the wait, the crossing and car green until the
+next press, CYCLE_MS apart. Bytes are counted on the stub bus from the
+first press on (address byte included), so panel setup is left out.
+Exits with status 1 if the panel does not end on the same text in
+both runs or the column diff does not send fewer bytes.
+
+    python -m sim.bench_oled_bytes [--cycles 10] [--flow 2048]
+"""
+import argparse
+import sys
+
+from .runner import Simulation
+
+CYCLE_MS = 150_000
+
+
+def _full_show_render(sim):
+    """display_oled._render as it was: redraw everything, then show()."""
+    display = sim.modules["display_oled"]
+    hardware = sim.hardware
+
+    def render(screen, value, texts):
+        oled = hardware.oled
+        if oled is None:
+            return
+        oled.buffer[:] = display._screen_fb[screen]   # same pixels as fill + text
+        if texts is not None:
+            oled.text(texts[value], 0, display.VALUE_Y)
+        oled.show()
+    return render
+
+
+def run(full_show, cycles, flow):
+    sim = Simulation()
+    sim.set_flow(flow)
+    sim.boot()
+    sim._call(sim.modules["startup"].run_all)
+    if full_show:
+        sim.modules["display_oled"]._render = _full_show_render(sim)
+    start_ms = 1_000
+    for k in range(cycles):
+        sim.press(start_ms + k * CYCLE_MS)
+    sim.run(start_ms)
+    before = sim.board.i2c_bytes
+    sim.run(start_ms + cycles * CYCLE_MS)
+    crossings = sim.stats()["crossings"]
+    return (sim.board.i2c_bytes - before) // max(crossings, 1), crossings, \
+        sim.hardware.oled.panel.text_lines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=10)
+    parser.add_argument("--flow", type=int, default=2048, help="raw ADC value")
+    args = parser.parse_args()
+
+    full, full_crossings, full_screen = run(True, args.cycles, args.flow)
+    diff, diff_crossings, diff_screen = run(False, args.cycles, args.flow)
+    print("{:<28}{:>12}{:>11}".format("refresh", "bytes/cycle", "crossings"))
+    print("{:<28}{:>12}{:>11}".format("full show() every 500 ms", full, full_crossings))
+    print("{:<28}{:>12}{:>11}".format("changed chunks only", diff, diff_crossings))
+    ok = diff < full and full_screen == diff_screen and full_crossings == diff_crossings
+    print("OK: {:.1f}x fewer bytes, same screen".format(full / max(diff, 1)) if ok else
+          "FAIL: column diff sends {} vs {} bytes or shows other text".format(diff, full))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# sim/bench_outputs.py
+"""
+Pin and PWM writes over full pedestrian cycles with the output shadow
+registers (hardware.py) against writing through on every call.
+
+Both runs get the same presses and red-light runners. The write-through
+run forgets the shadow state before every hardware.write_output(),
+set_buzzer_freq() and set_buzzer_duty(), so each call reaches the stub
+pin or PWM. The shadowed run reports hardware.get_write_counters(). Pin writes (lights, flash)
+and PWM writes (buzzer duty and frequency) are compared separately:
+nearly every PWM write is a beep edge, so their sum would hide the cut
+in pin writes. Exits with status 1 if the lights and buzzer change
+differently, if the real writes counted by hardware.py are not the
+writes the stub board saw, or if either kind is not cut.
+
+    python -m sim.bench_outputs [--cycles 10]
+"""
+import argparse
+import sys
+
+from .runner import Simulation
+
+CYCLE_MS = 150_000
+OUTPUTS = ("T_RED", "T_YELLOW", "T_GREEN", "P_RED", "P_GREEN",
+           "F_RED", "F_GREEN", "F_BLUE", "BUZZER", "BUZZER.freq")
+
+
+def _write_through(hardware):
+    """Wrap the shadowed writers so every call reaches the peripheral."""
+    for name in ("write_output", "set_buzzer_freq", "set_buzzer_duty"):
+        write = getattr(hardware, name)
+
+        def through(*args, write=write):
+            hardware.invalidate_outputs()
+            write(*args)
+        setattr(hardware, name, through)
+
+
+def run(shadowed, cycles):
+    sim = Simulation()
+    sim.set_flow(2048)
+    hardware = sim.hardware
+    sim.boot()
+    sim._call(sim.modules["startup"].run_all)
+    if not shadowed:
+        _write_through(hardware)
+    hardware.reset_write_counters()
+    gpio, pwm = sim.board.gpio_writes, sim.board.pwm_writes
+    for k in range(cycles):
+        start = 1_000 + k * CYCLE_MS
+        sim.press(start)
+        sim.violation(start + 50_000)
+    sim.run(1_000 + cycles * CYCLE_MS)
+    changes = [c for c in sim.timeline if c[1] in OUTPUTS]
+    return {
+        "gpio": sim.board.gpio_writes - gpio,
+        "pwm": sim.board.pwm_writes - pwm,
+        "counters": hardware.get_write_counters(),
+        "changes": changes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=10)
+    args = parser.parse_args()
+
+    through = run(False, args.cycles)
+    shadow = run(True, args.cycles)
+    real, suppressed = shadow["counters"]
+    print("{:<16}{:>12}{:>12}{:>14}{:>12}".format(
+        "outputs", "pin writes", "pwm writes", "real (count)", "suppressed"))
+    print("{:<16}{:>12}{:>12}{:>14}{:>12}".format(
+        "write-through", through["gpio"], through["pwm"], "-", "-"))
+    print("{:<16}{:>12}{:>12}{:>14}{:>12}".format(
+        "shadowed", shadow["gpio"], shadow["pwm"], real, suppressed))
+    print("output changes: {} and {}".format(len(through["changes"]), len(shadow["changes"])))
+
+    same = through["changes"] == shadow["changes"]
+    counted = real == shadow["gpio"] + shadow["pwm"]
+    fewer = shadow["gpio"] < through["gpio"] and shadow["pwm"] <= through["pwm"]
+    pin_cut = through["gpio"] / max(shadow["gpio"], 1)
+    pwm_cut = through["pwm"] / max(shadow["pwm"], 1)
+    print("pin writes {:.1f}x fewer; pwm writes {:.2f}x fewer: {} of the {} calls change "
+          "the duty or frequency".format(pin_cut, pwm_cut, shadow["pwm"], through["pwm"]))
+    if same and counted and fewer:
+        print("OK: same output changes with {:.1f}x fewer pin writes".format(pin_cut))
+    else:
+        print("FAIL: changes {}, counters {}, fewer writes {}".format(
+            "same" if same else "DIFFER", "match" if counted else "DIFFER",
+            "yes" if fewer else "NO"))
+    sys.exit(0 if same and counted and fewer else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# sim/bench_telemetry.py
+"""
+Telemetry end to end, on loopback only:
+
+1. A simulated intersection sends its batches over the UART stub; the
+   decoded records must match the pedestrian phases in the timeline.
+2. The same with the link down for a while and a tiny ring: cycles are
+   merged, none is lost.
+3. The collector ingests the batch stream of --devices intersections
+   at once (half over UDP, half as TCP byte streams with line noise
+   between frames) on 127.0.0.1. Every device sends a batch every
+   PACE_S on average, far faster than a real one (one per few minutes).
+
+    python -m sim.bench_telemetry [--hours 6] [--seed 1] [--devices 2000]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from .runner import Simulation
+from .__main__ import build_scenario
+from . import collector as col
+
+
+def run_device(hours, seed, ring_records=None, outage=None):
+    """Simulate one intersection; returns (sim, frames sent on the UART)."""
+    sim = Simulation()
+    telemetry = sim.modules["telemetry"]
+    telemetry.TELEMETRY_ENABLED = True
+    if ring_records is not None:
+        telemetry.TELEMETRY_RING_RECORDS = ring_records
+    end_ms = build_scenario(sim, hours, seed)
+    if outage is None:
+        sim.run(end_ms)
+    else:
+        # Link down: the UART never reports the last batch as sent
+        start_ms, stop_ms = outage
+        sim.run(start_ms)
+        uart = telemetry._uart
+        txdone = uart.txdone
+        uart.txdone = lambda: False
+        sim.run(stop_ms)
+        uart.txdone = txdone
+        sim.run(end_ms + telemetry.TELEMETRY_FLUSH_MS)
+    decoder = col.StreamDecoder()
+    frames = decoder.feed(bytes(sim.board.uart_tx.get(telemetry.TELEMETRY_UART_ID, b"")))
+    return sim, frames
+
+
+def check_records(sim, frames):
+    """Compare the decoded walk times with the P_GREEN phases of the timeline."""
+    walks = []
+    on = None
+    for t_ms, value in sim.changes("P_GREEN"):
+        if value:
+            on = t_ms
+        elif on is not None:
+            walks.append(t_ms - on)
+    records = [r for f in frames for r in col.decode_frame(f)[3]]
+    sent = [r[3] for r in records]
+    return len(records), sent == walks[:len(sent)], len(walks)
+
+
+PACE_S = 0.005   # mean gap between two batches of one device
+
+
+async def _send_udp(frames, port, rng):
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        asyncio.DatagramProtocol, remote_addr=("127.0.0.1", port))
+    for frame in frames:
+        await asyncio.sleep(rng.uniform(0, 2 * PACE_S))
+        transport.sendto(frame)
+    transport.close()
+
+
+async def _send_tcp(frames, port, rng):
+    _, writer = await asyncio.open_connection("127.0.0.1", port)
+    for frame in frames:
+        await asyncio.sleep(rng.uniform(0, 2 * PACE_S))
+        # Line noise between frames, as on a UART bridge
+        writer.write(bytes(rng.randrange(256) for _ in range(rng.randrange(4))))
+        writer.write(frame)
+        await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+
+async def _fleet(frames, devices, seed):
+    collector = col.Collector()
+    udp, server = await col.start(collector, "127.0.0.1", 0, 0)
+    udp_port = udp.port
+    tcp_port = server.sockets[0].getsockname()[1]
+    rng = random.Random(seed)
+
+    decoded = [col.decode_frame(f) for f in frames]
+    tasks = []
+    for device in range(devices):
+        device_id = 0x10000 + device
+        own = [col.encode_frame(device_id, seq, merged, records)
+               for _, seq, merged, records in decoded]
+        if device % 2:
+            tasks.append(_send_tcp(own, tcp_port, rng))
+        else:
+            tasks.append(_send_udp(own, udp_port, rng))
+
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    frames = -1
+    while collector.frames != frames:
+        frames = collector.frames
+        await asyncio.sleep(0.1)
+    elapsed = time.perf_counter() - started
+    udp.close()
+    server.close()
+    await server.wait_closed()
+    return collector.summary(), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--devices", type=int, default=2000)
+    args = parser.parse_args()
+
+    sim, frames = run_device(args.hours, args.seed)
+    count, match, walks = check_records(sim, frames)
+    print("device: {} batches, {} cycle records for {} crossings, walk times {}".format(
+        len(frames), count, walks, "match" if match else "DIFFER"))
+
+    end_ms = args.hours * 3_600_000
+    sim2, frames2 = run_device(args.hours, args.seed, ring_records=4,
+                               outage=(end_ms // 4, end_ms // 4 + 7_200_000))
+    cycles = sum(r[1] for f in frames2 for r in col.decode_frame(f)[3])
+    telemetry = sim2.modules["telemetry"]
+    print("2 h link outage, 4-record ring: {} cycles reported of {}, {} merged, {} busy".format(
+        cycles, telemetry._cycles, telemetry._merged, telemetry._busy))
+
+    summary, elapsed = asyncio.run(_fleet(frames, args.devices, args.seed))
+    expected = args.devices * len(frames)
+    print("collector: {} devices, {}/{} batches in {:.2f} s ({:.0f} batches/s), "
+          "{} bad, {} lost".format(summary["devices"], summary["frames"], expected,
+                                    elapsed, summary["frames"] / elapsed,
+                                    summary["bad_frames"], summary["lost_batches"]))
+
+
+if __name__ == "__main__":
+    main()
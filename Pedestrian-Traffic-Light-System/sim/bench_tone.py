@@ -0,0 +1,100 @@
+# sim/bench_tone.py
+"""
+Buzzer edge timing: loop-timed beeps (buzzer.py) against the timer
+driven tone sequencer (tone.py).
+
+The loop is run as the original firmware did, with a fixed sleep
+between passes (--poll-ms) and I2C transfers that take real bus time,
+so OLED refreshes delay the loop. Every buzzer edge is compared with
+its ideal time.
+
+    python -m sim.bench_tone [--minutes 30] [--poll-ms 5] [--seed 1]
+"""
+import argparse
+import random
+
+from .runner import Simulation
+
+I2C_US_PER_BYTE = 23          # 9 bits per byte at 400 kHz
+CONFIRM_EDGES = (100, 150, 250)
+PULSE_MS = 50
+
+
+def _next_beep(last, total):
+    """Crossing rule: first t with t - last >= 100 + (total - t) * 300 // total."""
+    t = last + 100
+    while t - last < 100 + max(total - t, 0) * 300 // total:
+        t += 1
+    return t
+
+
+def edge_errors(sim):
+    """
+    Absolute error (ms) of every buzzer edge against the edge before it:
+    confirmation edges 100/150/250 ms after the first one, crossing
+    beeps PULSE_MS long and started by the interval rule from the
+    previous beep.
+    """
+    edges = sim.changes("BUZZER")
+    walk = sim.changes("P_GREEN")
+    phases = list(zip([t for t, v in walk if v], [t for t, v in walk if not v]))
+    errors = []
+
+    i = 0
+    while i + 1 < len(edges):
+        t = edges[i][0]
+        phase = [(g, e) for g, e in phases if g <= t < e + PULSE_MS]
+        if phase:
+            start, end = phase[0]
+            last = 0
+            while i + 1 < len(edges) and edges[i][0] < end + PULSE_MS:
+                on_t = edges[i][0] - start
+                errors.append(abs(on_t - _next_beep(last, end - start)))
+                errors.append(abs(edges[i + 1][0] - edges[i][0] - PULSE_MS))
+                last = on_t
+                i += 2
+            continue
+        for k, offset in enumerate(CONFIRM_EDGES):
+            if i + 1 + k < len(edges):
+                errors.append(abs(edges[i + 1 + k][0] - (t + offset)))
+        i += 4
+    return errors
+
+
+def run(sequencer, minutes, poll_ms, seed):
+    rng = random.Random(seed)
+    sim = Simulation(poll_ms=poll_ms)
+    sim.board.i2c_us_per_byte = I2C_US_PER_BYTE
+    sim.modules["tone"].TONE_SEQUENCER_ENABLED = sequencer
+    sim.set_flow(lambda t_ms: 1500 + (t_ms // 60_000) % 5 * 400)
+    t = 1_000
+    end_ms = minutes * 60_000
+    while t < end_ms:
+        sim.press(t)
+        t += rng.randint(90_000, 150_000)
+    sim.run(end_ms)
+    return edge_errors(sim)
+
+
+def _summary(errors):
+    errors = sorted(errors)
+    if not errors:
+        return "no edges"
+    n = len(errors)
+    return "{:>5} edges  mean {:5.2f} ms  p99 {:3d} ms  max {:3d} ms".format(
+        n, sum(errors) / n, errors[min(n - 1, n * 99 // 100)], errors[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=int, default=30)
+    parser.add_argument("--poll-ms", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("main loop timed: ", _summary(run(False, args.minutes, args.poll_ms, args.seed)))
+    print("tone sequencer:  ", _summary(run(True, args.minutes, args.poll_ms, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
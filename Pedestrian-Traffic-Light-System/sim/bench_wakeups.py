@@ -0,0 +1,108 @@
+# sim/bench_wakeups.py
+"""
+CPU wakeups of the tickless loop (main.main()) against the original
+loop that slept 5 ms after every pass.
+
+Both runs get the same random day from `python -m sim` (pedestrians,
+red-light runners, varying flow) on the virtual clock. A wakeup is one
+return from time.sleep_ms() or machine.lightsleep() on the stub board.
+For each run: loop passes and wakeups per hour, the share of time in
+light sleep, crossings and fines, and the delay from a press to the
+first confirmation beep. Last, every sleep_ms() is made to overrun by
+OVERRUN_MS, as host sleeps do: scheduler.sleep_until() sleeps once per
+pass, so a long sleep wakes at most that late, not once per step.
+Exits with status 1 if the tickless loop does not wake at least 10
+times less often, serves different crossings, or wakes later than one
+overrun.
+
+    python -m sim.bench_wakeups [--hours 2] [--seed 1]
+"""
+import argparse
+import sys
+import time
+
+from .__main__ import build_scenario
+from .runner import Simulation
+
+POLL_MS = 5
+OVERRUN_MS = 2      # each sleep_ms() returns this much late
+
+
+def run(poll_ms, hours, seed):
+    sim = Simulation(poll_ms=poll_ms)
+    end_ms = build_scenario(sim, hours, seed)
+    bot1 = sim.hardware.BOT1_PIN
+    presses = sorted(t // 1000 for t, _, pin, level in sim.board.inputs
+                     if pin == bot1 and level == 0)
+    sim.run(end_ms)
+
+    # Press -> first beep, for the presses that got a confirmation beep
+    beeps = [t for t, duty in sim.changes("BUZZER") if duty]
+    delays = []
+    k = 0
+    for t in presses:
+        while k < len(beeps) and beeps[k] < t:
+            k += 1
+        if k < len(beeps) and beeps[k] - t < 500:
+            delays.append(beeps[k] - t)
+    delays.sort()
+    stats = sim.stats()
+    stats["beep_p50"] = delays[len(delays) // 2] if delays else 0
+    stats["beep_max"] = delays[-1] if delays else 0
+    stats["hours"] = hours
+    return stats
+
+
+def overrun_lateness(overrun_ms):
+    """
+    Return (sleep ms, lateness ms) of sleep_until()'s longest sleep when
+    every sleep_ms() overruns.
+    """
+    sim = Simulation()
+    scheduler = sim.modules["scheduler"]
+    sleep_ms = time.sleep_ms
+
+    def late_sleep_ms(ms):
+        sleep_ms(ms)
+        sim.clock.advance_ms(overrun_ms)
+    time.sleep_ms = late_sleep_ms
+    try:
+        now = time.ticks_ms()
+        deadline = time.ticks_add(now, scheduler.MAX_SLEEP_MS)
+        scheduler.sleep_until(now, deadline)
+        return scheduler.MAX_SLEEP_MS, time.ticks_diff(time.ticks_ms(), deadline)
+    finally:
+        time.sleep_ms = sleep_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("{:<18}{:>12}{:>14}{:>13}{:>11}{:>7}{:>18}".format(
+        "loop", "passes/h", "wakeups/h", "light sleep", "crossings", "fines",
+        "beep ms p50/max"))
+    results = []
+    for name, poll_ms in (("sleep_ms(5)", POLL_MS), ("tickless", None)):
+        r = run(poll_ms, args.hours, args.seed)
+        results.append(r)
+        print("{:<18}{:>12}{:>14}{:>13.0%}{:>11}{:>7}{:>14}/{}".format(
+            name, int(r["passes"] / r["hours"]), r["wakeups_per_hour"],
+            r["light_sleep_share"], r["crossings"], r["fines"],
+            r["beep_p50"], r["beep_max"]))
+    poll, tickless = results
+    ratio = poll["wakeups_per_hour"] / max(tickless["wakeups_per_hour"], 1)
+    slept, late = overrun_lateness(OVERRUN_MS)
+    print("{} ms sleep, every sleep_ms() {} ms late: woke {} ms after the deadline".format(
+        slept, OVERRUN_MS, late))
+    ok = ratio >= 10 and poll["crossings"] == tickless["crossings"] and late <= OVERRUN_MS
+    print("OK: {:.0f}x fewer wakeups, same crossings, one overrun per sleep".format(ratio)
+          if ok else "FAIL: {:.1f}x fewer wakeups, crossings {} vs {}, {} ms late".format(
+              ratio, poll["crossings"], tickless["crossings"], late))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# sim/check_alloc.py
+"""
+Check that the main loop does not allocate: runs one full pedestrian
+cycle (press, wait, crossing, back to car green, a red-light runner)
+and exits with status 1 if the loop allocates.
+
+    python -m sim.check_alloc
+
+Two checks, because CPython is not MicroPython:
+
+1. Every project function that runs during a loop pass is scanned for
+   bytecode that allocates on MicroPython: tuple/list/dict/slice
+   building, string formatting and true division (float results).
+   Functions that only run at safe points (phase changes, log flushes)
+   are listed in SAFE_POINT_FUNCTIONS and skipped.
+2. tracemalloc compares the heap after two consecutive cycles and
+   fails if memory held by project code keeps growing. Transient
+   allocations are left to check 1: on CPython every int above 256 is
+   a heap object, so no pass is ever allocation-free on the host.
+"""
+import dis
+import os
+import sys
+import tracemalloc
+
+from .runner import Simulation, PROJECT_DIR
+
+# Run only when the traffic phase changes or when the log is written
+SAFE_POINT_FUNCTIONS = {
+    ("traffic", "_enter"),
+    ("display_oled", "_load_background"),
+    ("display_oled", "_take_full_frame"),
+    ("display_oled", "_reinit_panel"),
+    ("display_oled", "_probe_panel"),
+    ("violation_log", "append_violation"),
+    ("violation_log", "flush"),
+    ("violation_log", "_checksum"),
+    ("violation_log", "_segment_path"),
+    ("heap", "collect"),
+    ("heap", "safe_point"),
+    ("trace_log", "flush"),
+}
+
+CYCLE_MS = 150_000   # one press to the next, longer than any crossing
+
+_ALLOC_OPS = {"BUILD_TUPLE", "BUILD_LIST", "BUILD_MAP", "BUILD_SET",
+              "BUILD_STRING", "BUILD_SLICE", "FORMAT_VALUE",
+              "LIST_EXTEND", "BUILD_CONST_KEY_MAP"}
+_ALLOC_NAMES = {"format", "float", "str", "tuple", "list", "bytearray",
+                "bytes", "memoryview"}
+
+
+def allocating_ops(code):
+    """Return (line, opname) for every allocating instruction in code."""
+    found = []
+    line = code.co_firstlineno
+    for ins in dis.get_instructions(code):
+        if ins.starts_line is not None:
+            line = ins.starts_line
+        name = ins.opname
+        if name in _ALLOC_OPS:
+            found.append((line, name))
+        elif (name == "BINARY_OP" and ins.argrepr in ("/", "/=")) or \
+                name in ("BINARY_TRUE_DIVIDE", "INPLACE_TRUE_DIVIDE"):
+            found.append((line, "true division"))
+        elif name in ("LOAD_ATTR", "LOAD_METHOD", "LOAD_GLOBAL") and ins.argval in _ALLOC_NAMES:
+            found.append((line, ins.argval))
+    return found
+
+
+def _cycle(sim, start_ms):
+    """Press, a red-light runner, and the whole crossing cycle."""
+    sim.press(start_ms + 1_000)
+    sim.violation(start_ms + 20_000)
+    sim.run(start_ms + CYCLE_MS)
+    return start_ms + CYCLE_MS
+
+
+def called_functions(sim, start_ms):
+    """Run one cycle and return the project code objects called in the loop."""
+    called = set()
+
+    def profile(frame, event, arg):
+        if event == "call":
+            code = frame.f_code
+            if _is_project(code.co_filename):
+                called.add((frame.f_globals.get("__name__"), code.co_name, code))
+
+    main = sim.main
+    update_all = main.update_all
+
+    def traced_update_all(now):
+        sys.setprofile(profile)
+        try:
+            update_all(now)
+        finally:
+            sys.setprofile(None)
+
+    main.update_all = traced_update_all
+    try:
+        end_ms = _cycle(sim, start_ms)
+    finally:
+        main.update_all = update_all
+    return called, end_ms
+
+
+def retained_allocations(sim, start_ms):
+    """
+    Run two cycles under tracemalloc and return the project lines whose
+    held memory grew from one cycle to the next. Comparing two cycles
+    (not before/after one) ignores globals that merely hold a new int.
+    """
+    tracemalloc.start()
+    start_ms = _cycle(sim, start_ms)
+    del sim.board.timeline[:]   # the recorded outputs are the simulator's
+    first = tracemalloc.take_snapshot()
+    end_ms = _cycle(sim, start_ms)
+    del sim.board.timeline[:]
+    second = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    held = [stat for stat in second.compare_to(first, "lineno")
+            if stat.size_diff > 0 and _is_project(stat.traceback[0].filename)]
+    return held, end_ms
+
+
+def _is_project(filename):
+    return filename.startswith(PROJECT_DIR) and os.sep + "sim" + os.sep not in filename
+
+
+def main():
+    sim = Simulation()
+    sim.set_flow(2048)
+    sim.boot()
+    # The first cycle fills the display, the log batch and the caches
+    now_ms = _cycle(sim, 0)
+    called, now_ms = called_functions(sim, now_ms)
+    held, now_ms = retained_allocations(sim, now_ms)
+    failed = False
+
+    print("bytecode scan of {} functions called in the loop".format(len(called)))
+    for module, name, code in sorted(called, key=lambda c: (c[0], c[1])):
+        if (module, name) in SAFE_POINT_FUNCTIONS or name.startswith("init_"):
+            continue
+        for line, op in allocating_ops(code):
+            print("  {}.py:{} {}(): {}".format(module, line, name, op))
+            failed = True
+
+    print("tracemalloc: {} project lines hold more memory after each cycle".format(len(held)))
+    for stat in held:
+        print("  {}".format(stat))
+        failed = True
+
+    print("FAIL: the loop allocates" if failed else "OK: no allocation in the loop")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# sim/check_fsm.py
+"""
+Check the table-driven traffic FSM (traffic.py) against the original
+if/elif state machine, pass by pass, and exit with status 1 on the
+first difference.
+
+BaselineTraffic below is the original update_traffic_state() with the
+lights kept in attributes instead of pins. It runs after every loop
+pass with the same tick, the same crossing requests (wrapped
+traffic.request_pedestrian()) and the same flow-based durations, so
+after each pass both must be in the same state with the same five
+lights on. Besides random presses, red-light runners and flow, every
+n-th crossing gets a request on the very pass where the pedestrian
+green ends, which the original ignored.
+
+    python -m sim.check_fsm [--hours 3] [--seed 1]
+"""
+import argparse
+import sys
+
+from .__main__ import build_scenario
+from .clock import ticks_diff
+from .runner import Simulation
+
+
+class BaselineTraffic:
+    """The original if/elif traffic FSM (lights as attributes)."""
+
+    def __init__(self, traffic, traffic_flow, now_ms, ticks_diff):
+        self.t = traffic
+        self.flow = traffic_flow
+        self.diff = ticks_diff
+        self.state = traffic.TRAFFIC_CAR_GREEN
+        self.start_ms = now_ms
+        self.wait_ms = 0
+        self.walk_ms = 0
+        self.request = False
+        self.crossing = False
+        self.car = (False, False, True)
+        self.ped = (True, False)
+
+    def request_pedestrian(self):
+        self.request = True
+
+    def is_car_red(self):
+        return self.state in (self.t.TRAFFIC_PED_GREEN, self.t.TRAFFIC_TRANSITION_TO_CAR)
+
+    def update(self, now_ms):
+        t = self.t
+        elapsed = self.diff(now_ms, self.start_ms)
+        if self.state == t.TRAFFIC_CAR_GREEN:
+            self.car, self.ped = (False, False, True), (True, False)
+            self.crossing = False
+            if self.request:
+                self.wait_ms = self.flow.compute_wait_before_walk_ms()
+                self.start_ms = now_ms
+                self.state = t.TRAFFIC_WAIT_BEFORE_PED
+        elif self.state == t.TRAFFIC_WAIT_BEFORE_PED:
+            self.car, self.ped = (False, False, True), (True, False)
+            if elapsed >= self.wait_ms:
+                self.car = (False, True, False)
+                self.start_ms = now_ms
+                self.state = t.TRAFFIC_YELLOW_BEFORE_PED
+        elif self.state == t.TRAFFIC_YELLOW_BEFORE_PED:
+            self.car, self.ped = (False, True, False), (True, False)
+            if elapsed >= 3000:
+                self.car, self.ped = (True, False, False), (False, True)
+                self.walk_ms = self.flow.compute_ped_green_ms()
+                self.start_ms = now_ms
+                self.state = t.TRAFFIC_PED_GREEN
+                self.crossing = True
+                self.request = False
+        elif self.state == t.TRAFFIC_PED_GREEN:
+            self.request = False
+            if elapsed >= self.walk_ms:
+                self.ped, self.car = (True, False), (True, False, False)
+                self.start_ms = now_ms
+                self.state = t.TRAFFIC_TRANSITION_TO_CAR
+                self.crossing = False
+        elif self.state == t.TRAFFIC_TRANSITION_TO_CAR:
+            if elapsed >= 1000:
+                self.car, self.ped = (False, False, True), (True, False)
+                self.state = t.TRAFFIC_CAR_GREEN
+                self.start_ms = now_ms
+
+    def lights(self):
+        """(T_RED, T_YELLOW, T_GREEN, P_RED, P_GREEN) as 0/1."""
+        return tuple(int(v) for v in self.car + self.ped)
+
+
+def run(hours, seed, end_press_every):
+    """Return (passes, crossings, first difference or None)."""
+    sim = Simulation()
+    end_ms = build_scenario(sim, hours, seed)
+    sim.boot()
+    traffic = sim.modules["traffic"]
+    hardware = sim.hardware
+    ref = BaselineTraffic(traffic, sim.modules["traffic_flow"],
+                          traffic.get_state_start_ms(), ticks_diff)
+
+    request_pedestrian = traffic.request_pedestrian
+
+    def request_both():
+        request_pedestrian()
+        ref.request_pedestrian()
+    traffic.request_pedestrian = request_both
+
+    main = sim.main
+    update_all = main.update_all
+    passes = [0]
+    crossings = [0]
+    diff = [None]
+
+    def checked_update_all(now):
+        # A press on the pass where the crossing ends (every n-th crossing)
+        if traffic.get_state() == traffic.TRAFFIC_PED_GREEN and \
+                ticks_diff(now, traffic.get_state_start_ms()) >= traffic.get_phase_ms():
+            crossings[0] += 1
+            if crossings[0] % end_press_every == 0:
+                traffic.request_pedestrian()
+        update_all(now)
+        passes[0] += 1
+        ref.update(now)
+        lights = tuple(hardware._out_shadow[i] for i in range(5))
+        if diff[0] is None and (traffic.get_state() != ref.state or
+                                lights != ref.lights() or
+                                traffic.is_car_red() != ref.is_car_red()):
+            diff[0] = (now, traffic.get_state(), ref.state, lights, ref.lights())
+    main.update_all = checked_update_all
+    sim.run(end_ms)
+    main.update_all = update_all
+    return passes[0], crossings[0], diff[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--end-press-every", type=int, default=3,
+                        help="press on the last pass of every n-th crossing")
+    args = parser.parse_args()
+
+    passes, crossings, diff = run(args.hours, args.seed, args.end_press_every)
+    print("{} passes, {} crossings compared".format(passes, crossings))
+    if diff is None:
+        print("OK: same state and lights as the if/elif FSM after every pass")
+        sys.exit(0)
+    now, state, ref_state, lights, ref_lights = diff
+    print("FAIL at t={} ms: state {} lights {}, original state {} lights {}".format(
+        now, state, lights, ref_state, ref_lights))
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# sim/check_profiler.py
+"""
+Check the profiler (profiler.py) against delays injected on the
+virtual clock, and exit with status 1 on any difference.
+
+The loop is main.main() with PROFILE_ENABLED, except for the sleep:
+every wakeup comes a scripted number of ms after the deadline
+(LATENESS, cycled), so the jitter histogram and the deadline misses
+are known in advance. The stub ADC takes ADC_US per read, so every
+flow update that samples lands in one bucket and all others in
+bucket 0 (firmware code takes no virtual time). Expected buckets are
+computed with int.bit_length(), not with profiler.record(). Last,
+samples that all fall in one bucket must give a p99 equal to their
+maximum, not the bucket's upper bound.
+
+    python -m sim.check_profiler [--minutes 10]
+"""
+import argparse
+import sys
+
+from .runner import Simulation
+
+ADC_US = 3000                          # one slow ADC read
+LATENESS = (0, 0, 1, 3, 5, 6, 12, 40)  # ms after each deadline
+CYCLE_MS = 150_000
+ONE_BUCKET_US = (2100, 3000)           # all in the 2048..4095 us bucket
+
+
+def _bucket(profiler, us):
+    return min(us.bit_length(), profiler.NUM_BUCKETS - 1)
+
+
+def run(minutes):
+    sim = Simulation()
+    clock = sim.clock
+    board = sim.board
+    profiler = sim.modules["profiler"]
+    scheduler = sim.modules["scheduler"]
+    profiler.PROFILE_ENABLED = True
+    reads = [0]
+
+    def slow_adc(t_ms):
+        reads[0] += 1
+        clock.now_us += ADC_US
+        return 2048
+    sim.set_flow(slow_adc)
+    end_ms = minutes * 60_000
+    for t in range(1_000, end_ms, CYCLE_MS):
+        sim.press(t)
+
+    sim.boot()
+    sim._call(sim.modules["startup"].run_all)
+    profiler.reset()
+    reads[0] = 0
+
+    main = sim.main
+    late_hist = [0] * profiler.NUM_BUCKETS
+    late_misses = 0
+    passes = 0
+    deadline = None
+    late = None       # lateness of the wakeup to come, in ms
+    k = 0
+
+    def loop():
+        nonlocal deadline, late, late_misses, passes, k
+        while clock.now_ms() < end_ms:
+            board.apply_inputs(clock.now_us)
+            now = clock.ticks_ms()
+            profiler.record_wakeup(deadline, now)
+            if late is not None:
+                late_hist[_bucket(profiler, late * 1000)] += 1
+                if late > profiler.LOOP_TARGET_MS:
+                    late_misses += 1
+                late = None
+            main.update_all(now)
+            passes += 1
+
+            deadline = main.next_wakeup(now)
+            if deadline is None:
+                board.advance_to_us((now + scheduler.MAX_SLEEP_MS) * 1000)
+                continue
+            late = LATENESS[k % len(LATENESS)]
+            k += 1
+            target = max(deadline, clock.now_ms()) + late
+            board.advance_to_us(target * 1000)
+            late = target - deadline
+    sim._call(loop)
+
+    flow_hist = [0] * profiler.NUM_BUCKETS
+    flow_hist[_bucket(profiler, ADC_US)] = reads[0]
+    flow_hist[0] = passes - reads[0]
+    return profiler, passes, {
+        profiler.PROF_JITTER: (late_hist, late_misses),
+        profiler.PROF_FLOW: (flow_hist, None),
+    }
+
+
+def check_one_bucket(profiler):
+    """Return (p99, max) of a slot whose samples all lie in one bucket."""
+    profiler.reset()
+    slot = profiler.PROF_DISPLAY
+    for us in range(ONE_BUCKET_US[0], ONE_BUCKET_US[1] + 1, 7):
+        profiler.record(slot, us)
+    return profiler.percentile_us(slot, 99), profiler._max_us[slot]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=int, default=10)
+    args = parser.parse_args()
+
+    profiler, passes, expected = run(args.minutes)
+    failed = False
+    for slot, (hist, misses) in expected.items():
+        base = slot * profiler.NUM_BUCKETS
+        got = list(profiler._hist[base:base + profiler.NUM_BUCKETS])
+        ok = got == hist
+        print("{:<8} buckets {}".format(profiler.SLOT_NAMES[slot], "ok" if ok else "MISMATCH"))
+        if not ok:
+            print("  expected {}\n  got      {}".format(hist, got))
+            failed = True
+        if misses is not None:
+            ok = profiler.get_deadline_misses() == misses
+            print("{:<8} misses {} (expected {}){}".format(
+                "", profiler.get_deadline_misses(), misses, "" if ok else "  MISMATCH"))
+            failed = failed or not ok
+    ok = profiler._count[profiler.PROF_LOOP] == passes and \
+        profiler._max_us[profiler.PROF_FLOW] == ADC_US
+    print("loop passes {} (expected {}), flow max {} us (expected {}){}".format(
+        profiler._count[profiler.PROF_LOOP], passes,
+        profiler._max_us[profiler.PROF_FLOW], ADC_US, "" if ok else "  MISMATCH"))
+    failed = failed or not ok
+
+    profiler.report()
+
+    p99, worst = check_one_bucket(profiler)
+    ok = p99 == worst
+    print("one bucket: p99 {} us, max {} us{}".format(p99, worst, "" if ok else "  MISMATCH"))
+    failed = failed or not ok
+    print("FAIL: profiler differs from the injected delays" if failed else
+          "OK: histograms and deadline misses match the injected delays")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# sim/clock.py
+"""
+Virtual clock with MicroPython's ticks API.
+
+install() adds ticks_ms / ticks_us / ticks_diff / ticks_add / sleep_ms /
+sleep_us to CPython's time module, so the project modules run unchanged.
+RealClock has the same API on wall-clock time, for runs with threads.
+"""
+import time
+
+TICKS_PERIOD = 1 << 30          # same wrap-around as the ESP32 port
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+
+class VirtualClock:
+    """Monotonic simulated time in microseconds."""
+
+    def __init__(self, start_ms=0):
+        self.now_us = start_ms * 1000
+        self.sleeper = None     # Board that runs timers and inputs through sleep_ms()
+
+    # ------- Time control -------
+    def now_ms(self):
+        return self.now_us // 1000
+
+    def set_ms(self, t_ms):
+        if t_ms * 1000 > self.now_us:
+            self.now_us = t_ms * 1000
+
+    def advance_ms(self, ms):
+        self.now_us += ms * 1000
+
+    # ------- MicroPython time API -------
+    def ticks_ms(self):
+        return (self.now_us // 1000) & TICKS_MAX
+
+    def ticks_us(self):
+        return self.now_us & TICKS_MAX
+
+    def sleep_ms(self, ms):
+        if self.sleeper is not None:
+            self.sleeper.sleep_us(max(ms, 0) * 1000)
+        elif ms > 0:
+            self.now_us += ms * 1000
+
+    def sleep_us(self, us):
+        if us > 0:
+            self.now_us += us
+
+
+class RealClock:
+    """Wall-clock time from start, for real-time runs (sim/bench_dual.py)."""
+
+    def __init__(self):
+        self._start_ns = time.perf_counter_ns()
+
+    @property
+    def now_us(self):
+        return (time.perf_counter_ns() - self._start_ns) // 1000
+
+    def now_ms(self):
+        return self.now_us // 1000
+
+    def ticks_ms(self):
+        return self.now_ms() & TICKS_MAX
+
+    def ticks_us(self):
+        return self.now_us & TICKS_MAX
+
+    def sleep_ms(self, ms):
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+    def sleep_us(self, us):
+        if us > 0:
+            time.sleep(us / 1_000_000)
+
+
+def ticks_diff(a, b):
+    """Signed difference a - b, correct across the wrap-around."""
+    return ((a - b + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+def ticks_add(t, delta):
+    return (t + delta) & TICKS_MAX
+
+
+def install(clock):
+    """Expose the clock through the time module."""
+    time.ticks_ms = clock.ticks_ms
+    time.ticks_us = clock.ticks_us
+    time.ticks_diff = ticks_diff
+    time.ticks_add = ticks_add
+    time.sleep_ms = clock.sleep_ms
+    time.sleep_us = clock.sleep_us
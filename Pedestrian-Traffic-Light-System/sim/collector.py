@@ -0,0 +1,260 @@
+# sim/collector.py
+"""
+Host collector for the telemetry batches sent by telemetry.py.
+
+Batches arrive as UDP datagrams (one batch each) or as TCP byte
+streams, e.g. from UART-to-network bridges, where frames are found by
+their magic and checksum and garbage is skipped. Both are served by one
+asyncio loop, so thousands of intersections can report at once. Per
+device it keeps cycles, mean wait and walk times, the latest flow and
+fines, the longest loop pass, lost batches (gaps in the batch
+sequence) and cycles the device had to merge under backpressure.
+
+    python -m sim.collector [--host 0.0.0.0] [--udp 5005] [--tcp 5006] [--report-s 10]
+"""
+import argparse
+import asyncio
+import socket
+import struct
+
+MAGIC = b"TL"
+VERSION = 1
+HEADER_FORMAT = "<2sBBIHH"     # magic, version, count, device id, seq, merged
+RECORD_FORMAT = "<IHHHHHHH"    # t_ms, cycles, wait, walk, flow, fines, passes, pass max
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+CHECKSUM_SIZE = 2
+UDP_RCVBUF = 4 * 1024 * 1024
+
+
+def frame_size(count):
+    return HEADER_SIZE + count * RECORD_SIZE + CHECKSUM_SIZE
+
+
+def checksum(data):
+    return sum(data) & 0xFFFF
+
+
+def decode_frame(data):
+    """
+    Decode one batch. Returns (device_id, seq, merged, records) where
+    records are RECORD_FORMAT tuples; raises ValueError if malformed.
+    """
+    if len(data) < HEADER_SIZE + CHECKSUM_SIZE:
+        raise ValueError("short frame")
+    magic, version, count, device_id, seq, merged = struct.unpack_from(HEADER_FORMAT, data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("bad magic or version")
+    size = frame_size(count)
+    if len(data) != size:
+        raise ValueError("frame size {} for {} records".format(len(data), count))
+    end = size - CHECKSUM_SIZE
+    if checksum(data[:end]) != struct.unpack_from("<H", data, end)[0]:
+        raise ValueError("bad checksum")
+    records = [struct.unpack_from(RECORD_FORMAT, data, HEADER_SIZE + i * RECORD_SIZE)
+               for i in range(count)]
+    return device_id, seq, merged, records
+
+
+def encode_frame(device_id, seq, merged, records):
+    """Build a batch (the device does the same in telemetry.py)."""
+    body = struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(records), device_id, seq, merged)
+    body += b"".join(struct.pack(RECORD_FORMAT, *r) for r in records)
+    return body + struct.pack("<H", checksum(body))
+
+
+class StreamDecoder:
+    """Split a byte stream into frames, resynchronizing on the magic."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self.skipped = 0     # bytes thrown away while resynchronizing
+
+    def feed(self, data):
+        """Add bytes; returns the complete frames found."""
+        buf = self._buf
+        buf.extend(data)
+        frames = []
+        while True:
+            start = buf.find(MAGIC)
+            if start < 0:
+                keep = 1 if buf[-1:] == MAGIC[:1] else 0
+                self.skipped += len(buf) - keep
+                del buf[:len(buf) - keep]
+                return frames
+            if start:
+                self.skipped += start
+                del buf[:start]
+            if len(buf) < 4:
+                return frames
+            size = frame_size(buf[3])
+            if len(buf) < size:
+                return frames
+            frame = bytes(buf[:size])
+            try:
+                decode_frame(frame)
+            except ValueError:
+                # A magic inside garbage: skip it and look for the next one
+                self.skipped += 1
+                del buf[:1]
+                continue
+            del buf[:size]
+            frames.append(frame)
+
+
+class DeviceStats:
+    __slots__ = ("cycles", "wait_ms_sum", "walk_ms_sum", "flow", "fines",
+                 "passes", "pass_max_us", "batches", "lost", "merged",
+                 "last_seq", "last_t_ms")
+
+    def __init__(self):
+        self.cycles = 0
+        self.wait_ms_sum = 0
+        self.walk_ms_sum = 0
+        self.flow = 0
+        self.fines = 0
+        self.passes = 0
+        self.pass_max_us = 0
+        self.batches = 0
+        self.lost = 0
+        self.merged = 0
+        self.last_seq = None
+        self.last_t_ms = 0
+
+    def mean_wait_ms(self):
+        return self.wait_ms_sum // self.cycles if self.cycles else 0
+
+    def mean_walk_ms(self):
+        return self.walk_ms_sum // self.cycles if self.cycles else 0
+
+
+class Collector:
+    """Per-device aggregation of decoded batches."""
+
+    def __init__(self):
+        self.devices = {}
+        self.frames = 0
+        self.bad_frames = 0
+
+    def ingest(self, frame):
+        """Decode and account one batch; malformed ones are counted."""
+        try:
+            device_id, seq, merged, records = decode_frame(frame)
+        except ValueError:
+            self.bad_frames += 1
+            return
+        self.frames += 1
+        stats = self.devices.get(device_id)
+        if stats is None:
+            stats = self.devices[device_id] = DeviceStats()
+        if stats.last_seq is not None:
+            stats.lost += (seq - stats.last_seq - 1) & 0xFFFF
+        stats.last_seq = seq
+        stats.merged = merged
+        stats.batches += 1
+        for t_ms, cycles, wait, walk, flow, fines, passes, pass_max in records:
+            stats.cycles += cycles
+            stats.wait_ms_sum += wait * cycles
+            stats.walk_ms_sum += walk * cycles
+            stats.flow = flow
+            stats.fines = fines
+            stats.passes += passes
+            if pass_max > stats.pass_max_us:
+                stats.pass_max_us = pass_max
+            stats.last_t_ms = t_ms
+
+    def summary(self):
+        devices = self.devices.values()
+        return {
+            "devices": len(self.devices),
+            "frames": self.frames,
+            "bad_frames": self.bad_frames,
+            "cycles": sum(d.cycles for d in devices),
+            "lost_batches": sum(d.lost for d in devices),
+            "merged_cycles": sum(d.merged for d in devices),
+        }
+
+
+class UdpReceiver:
+    """
+    Non-blocking UDP socket drained completely on every readiness event
+    (asyncio's datagram transport reads one datagram per loop turn,
+    which loses bursts from many devices).
+    """
+
+    def __init__(self, collector, host, port):
+        self.collector = collector
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RCVBUF)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.port = self.sock.getsockname()[1]
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self.sock.fileno(), self._ready)
+
+    def _ready(self):
+        while True:
+            try:
+                data = self.sock.recv(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            self.collector.ingest(data)
+
+    def close(self):
+        self._loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+
+
+async def _handle_stream(collector, reader, writer):
+    decoder = StreamDecoder()
+    try:
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                break
+            for frame in decoder.feed(data):
+                collector.ingest(frame)
+    finally:
+        writer.close()
+
+
+async def start(collector, host="0.0.0.0", udp_port=5005, tcp_port=5006):
+    """
+    Serve UDP and TCP on host. Port 0 picks a free port. Returns
+    (UdpReceiver, tcp server); udp.port and the server sockets give the
+    bound ports.
+    """
+    udp = UdpReceiver(collector, host, udp_port)
+    server = await asyncio.start_server(
+        lambda r, w: _handle_stream(collector, r, w), host, tcp_port, backlog=4096)
+    return udp, server
+
+
+async def _serve(args):
+    collector = Collector()
+    udp, server = await start(collector, args.host, args.udp, args.tcp)
+    print("collecting on udp {} / tcp {}".format(args.udp, args.tcp))
+    try:
+        while True:
+            await asyncio.sleep(args.report_s)
+            print(collector.summary())
+    finally:
+        udp.close()
+        server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--udp", type=int, default=5005)
+    parser.add_argument("--tcp", type=int, default=5006)
+    parser.add_argument("--report-s", type=float, default=10)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
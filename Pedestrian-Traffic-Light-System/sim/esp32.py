@@ -0,0 +1,17 @@
+# sim/esp32.py
+"""
+Stand-in for MicroPython's esp32 module: the light-sleep wake sources
+(ext0: one pin, ext1: a group of pins), kept on the active Board.
+"""
+from . import machine
+
+WAKEUP_ALL_LOW = 0
+WAKEUP_ANY_HIGH = 1
+
+
+def wake_on_ext0(pin, level):
+    machine.board.wake_ext0 = (pin.id, level)
+
+
+def wake_on_ext1(pins, level):
+    machine.board.wake_ext1 = (tuple(pin.id for pin in pins), level)
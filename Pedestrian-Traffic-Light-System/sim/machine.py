@@ -0,0 +1,424 @@
+# sim/machine.py
+"""
+Stand-in for MicroPython's machine module (Pin, ADC, PWM, I2C, Timer,
+UART, I2S, RTC, mem32 input ports, lightsleep).
+
+All objects share the active Board, which holds pin levels, the
+virtual clock, scripted input changes and the output timeline.
+"""
+import heapq
+
+
+class Board:
+    """Simulated ESP32 pins and buses."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.levels = {}         # pin id -> level
+        self.modes = {}          # pin id -> Pin.IN / Pin.OUT
+        self.irqs = {}           # pin id -> (handler, trigger, pin object)
+        self.names = {}          # pin id -> name used in the timeline
+        self.adc_source = None   # callable(t_ms) -> raw 0..4095
+        self.timeline = []       # (t_ms, name, value)
+        self.gpio_writes = 0     # Pin.value(x) calls on outputs
+        self.pwm_writes = 0      # PWM.duty(x) / freq(x) calls
+        self.i2c_bytes = 0       # bytes written on any I2C bus
+        self.i2c_fail = False    # make every I2C transfer raise OSError
+        self.oled_present = True  # an SSD1306 answers at 0x3C
+        self.i2c_us_per_byte = 0  # bus time charged per byte (0 = free)
+        self.timers = []          # armed Timer objects
+        self.uart_tx = {}         # UART id -> bytearray of everything sent
+        self.uid = b"\x24\x0a\xc4\x00\x00\x01"   # machine.unique_id()
+        self.rtc_date = (2000, 1, 1)   # RTC date at t = 0 (2000 = never set)
+        # mem32 address -> first pin of a 32-bit input port
+        self.ports = {0x3FF4403C: 0, 0x3FF44040: 32}   # ESP32 GPIO_IN, GPIO_IN1
+        self.port_reads = 0
+        self.i2s_bytes = 0        # audio bytes played on I2S
+        self.i2s_gaps = []        # (end_us, resume_us) of every silence between writes
+        self.inputs = []          # heap of scripted (t_us, seq, pin id, level)
+        self._input_seq = 0
+        self.sleeps = 0           # time.sleep_ms() and machine.lightsleep() calls
+        self.light_sleeps = 0
+        self.light_sleep_us = 0   # time spent in light sleep
+        self.sleep_limit_us = None   # no sleep goes past this (end of a run)
+        self.wake_ext0 = None     # (pin id, level) ending a light sleep
+        self.wake_ext1 = None     # ((pin ids), level)
+
+    def record(self, name, value):
+        self.timeline.append((self.clock.now_ms(), name, value))
+
+    def name_of(self, pin_id):
+        return self.names.get(pin_id, "GPIO{}".format(pin_id))
+
+    def advance_to_us(self, t_us, light=False):
+        """
+        Move the clock forward to t_us, firing every timer that expires
+        and applying every scripted input change on the way, each at its
+        exact time. In light sleep, stop at the first input that meets a
+        wake condition; returns True then.
+        """
+        clock = self.clock
+        while True:
+            due = None
+            for timer in self.timers:
+                if timer.due_us <= t_us and (due is None or timer.due_us < due.due_us):
+                    due = timer
+            if self.inputs and self.inputs[0][0] <= t_us and \
+                    (due is None or self.inputs[0][0] <= due.due_us):
+                t, _, pin_id, level = heapq.heappop(self.inputs)
+                if t > clock.now_us:
+                    clock.now_us = t
+                self.drive_input(pin_id, level)
+                if light and self._wake_condition():
+                    return True
+                continue
+            if due is None:
+                break
+            if due.due_us > clock.now_us:
+                clock.now_us = due.due_us
+            due.fire()
+        if t_us > clock.now_us:
+            clock.now_us = t_us
+        return False
+
+    def advance_to_ms(self, t_ms):
+        self.advance_to_us(t_ms * 1000)
+
+    def schedule_input(self, t_us, pin_id, level):
+        """Script an input level change at t_us."""
+        heapq.heappush(self.inputs, (t_us, self._input_seq, pin_id, level))
+        self._input_seq += 1
+
+    def apply_inputs(self, t_us):
+        """Apply the scripted changes due by t_us."""
+        while self.inputs and self.inputs[0][0] <= t_us:
+            _, _, pin_id, level = heapq.heappop(self.inputs)
+            self.drive_input(pin_id, level)
+
+    def sleep_us(self, us, light=False):
+        """One sleep of the CPU: time passes, timers and inputs run."""
+        self.sleeps += 1
+        start = self.clock.now_us
+        end = start + us
+        if self.sleep_limit_us is not None and end > self.sleep_limit_us:
+            end = max(self.sleep_limit_us, start)
+        if light:
+            self.light_sleeps += 1
+            self.advance_to_us(end, light=True)
+            self.light_sleep_us += self.clock.now_us - start
+        else:
+            self.advance_to_us(end)
+
+    def _wake_condition(self):
+        levels = self.levels
+        if self.wake_ext0 is not None:
+            pin_id, level = self.wake_ext0
+            if levels.get(pin_id, 0) == level:
+                return True
+        if self.wake_ext1 is not None:
+            pin_ids, level = self.wake_ext1
+            if level:
+                return any(levels.get(p, 0) for p in pin_ids)
+            return not any(levels.get(p, 0) for p in pin_ids)
+        return False
+
+    def drive_input(self, pin_id, level):
+        """Change an input level from outside, firing its IRQ if armed."""
+        old = self.levels.get(pin_id, 1)
+        self.levels[pin_id] = level
+        if old == level:
+            return
+        irq = self.irqs.get(pin_id)
+        if irq is None:
+            return
+        handler, trigger, pin = irq
+        if (level == 0 and trigger & Pin.IRQ_FALLING) or \
+                (level == 1 and trigger & Pin.IRQ_RISING):
+            handler(pin)
+
+
+board = None  # set by the simulation before the project is imported
+
+
+class _Mem32:
+    """machine.mem32: reading a port address returns its pin levels."""
+
+    def __getitem__(self, addr):
+        first = board.ports[addr]
+        board.port_reads += 1
+        levels = board.levels
+        word = 0
+        for bit in range(32):
+            if levels.get(first + bit, 0):
+                word |= 1 << bit
+        return word
+
+
+mem32 = _Mem32()
+
+
+def disable_irq():
+    return 1
+
+
+def enable_irq(state=1):
+    pass
+
+
+def unique_id():
+    return board.uid
+
+
+def lightsleep(time_ms=None):
+    """Stop the CPU until time_ms passes or a wake source (sim.esp32) fires."""
+    board.sleep_us((time_ms or 0) * 1000, light=True)
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 2
+    PULL_DOWN = 1
+    IRQ_FALLING = 2
+    IRQ_RISING = 1
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        if id not in board.levels:
+            board.levels[id] = 1 if pull == Pin.PULL_UP else 0
+        if mode != -1:
+            board.modes[id] = mode
+        if value is not None:
+            self.value(value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        self.__init__(self.id, mode, pull, value)
+
+    def value(self, v=None):
+        if v is None:
+            return board.levels[self.id]
+        v = 1 if v else 0
+        if board.modes.get(self.id) == Pin.OUT:
+            board.gpio_writes += 1
+            if board.levels.get(self.id) != v:
+                board.record(board.name_of(self.id), v)
+        board.levels[self.id] = v
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        if handler is None:
+            board.irqs.pop(self.id, None)
+        else:
+            board.irqs[self.id] = (handler, trigger, self)
+
+
+class ADC:
+    ATTN_0DB = 0
+    ATTN_11DB = 3
+    WIDTH_12BIT = 3
+
+    def __init__(self, pin, atten=None):
+        self.pin = pin
+
+    def atten(self, value):
+        pass
+
+    def width(self, value):
+        pass
+
+    def read(self):
+        if board.adc_source is None:
+            return 0
+        return int(board.adc_source(board.clock.now_ms()))
+
+    def read_u16(self):
+        return self.read() << 4
+
+
+class PWM:
+    def __init__(self, pin, freq=None, duty=None):
+        self.pin = pin
+        self._freq = 5000 if freq is None else freq
+        self._duty = 0
+        if duty is not None:
+            self.duty(duty)
+
+    def freq(self, f=None):
+        if f is None:
+            return self._freq
+        board.pwm_writes += 1
+        if f != self._freq:
+            board.record(board.name_of(self.pin.id) + ".freq", f)
+        self._freq = f
+
+    def duty(self, d=None):
+        if d is None:
+            return self._duty
+        board.pwm_writes += 1
+        if d != self._duty:
+            board.record(board.name_of(self.pin.id), d)
+        self._duty = d
+
+    def deinit(self):
+        self.duty(0)
+
+
+class I2C:
+    def __init__(self, id, scl=None, sda=None, freq=400000):
+        self.id = id
+        self.freq = freq
+        self.devices = {}  # address -> object with receive(bytes)
+
+    def attach(self, addr, device):
+        self.devices[addr] = device
+
+    def _send(self, addr, data):
+        if board.i2c_fail:
+            raise OSError(19)  # ENODEV, as on a NACK
+        device = self.devices.get(addr)
+        if device is None:
+            raise OSError(19)
+        board.i2c_bytes += len(data) + 1  # payload + address byte
+        device.receive(data)
+        if board.i2c_us_per_byte:
+            # The CPU waits for the transfer; timers keep running
+            board.advance_to_us(board.clock.now_us + (len(data) + 1) * board.i2c_us_per_byte)
+
+    def writeto(self, addr, buf, stop=True):
+        self._send(addr, bytes(buf))
+        return len(buf)
+
+    def writevto(self, addr, vector, stop=True):
+        data = b"".join(bytes(b) for b in vector)
+        self._send(addr, data)
+        return len(data)
+
+    def scan(self):
+        return list(self.devices)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id, mode=PERIODIC, period=-1, callback=None):
+        self.id = id
+        self.mode = mode
+        self.period_us = 0
+        self.due_us = 0
+        self.callback = None
+        if callback is not None:
+            self.init(mode=mode, period=period, callback=callback)
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, freq=-1):
+        if freq > 0:
+            period = 1000 // freq
+        self.mode = mode
+        self.period_us = max(period, 1) * 1000
+        self.callback = callback
+        self.due_us = board.clock.now_us + self.period_us
+        if self not in board.timers:
+            board.timers.append(self)
+
+    def deinit(self):
+        if self in board.timers:
+            board.timers.remove(self)
+
+    def fire(self):
+        """Called by the board when the timer expires."""
+        callback = self.callback
+        if self.mode == Timer.ONE_SHOT:
+            self.deinit()
+        else:
+            self.due_us += self.period_us
+        if callback is not None:
+            callback(self)
+
+
+class UART:
+    """Transmit side only: bytes go to board.uart_tx and take line time."""
+
+    def __init__(self, id, baudrate=115200, tx=None, rx=None, txbuf=256, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+        self.txbuf = txbuf
+        self.busy_until_us = 0
+        board.uart_tx.setdefault(id, bytearray())
+
+    def write(self, buf):
+        data = bytes(buf)
+        if len(data) > self.txbuf:
+            raise OSError(116)   # would block beyond the driver buffer
+        board.uart_tx[self.id].extend(data)
+        start = max(board.clock.now_us, self.busy_until_us)
+        # 10 bits per byte on the line (start, 8 data, stop)
+        self.busy_until_us = start + len(data) * 10_000_000 // self.baudrate
+        return len(data)
+
+    def txdone(self):
+        return board.clock.now_us >= self.busy_until_us
+
+
+class I2S:
+    """
+    Transmit side only, non-blocking (irq set): a write plays for its
+    sample time, then the callback runs at the exact end, as a timer.
+    """
+    TX = 0
+    RX = 1
+    MONO = 0
+    STEREO = 1
+
+    def __init__(self, id, sck=None, ws=None, sd=None, mode=TX, bits=16,
+                 format=MONO, rate=8000, ibuf=2048):
+        self.bytes_per_s = rate * bits // 8 * (2 if format == I2S.STEREO else 1)
+        self.callback = None
+        self.due_us = 0
+        self.end_us = 0     # end of the last write (0: nothing played yet)
+
+    def irq(self, handler):
+        self.callback = handler
+
+    def write(self, buf):
+        n = len(buf)
+        now = board.clock.now_us
+        if self.end_us and now > self.end_us:
+            board.i2s_gaps.append((self.end_us, now))
+        start = max(now, self.end_us)
+        self.end_us = start + n * 1_000_000 // self.bytes_per_s
+        board.i2s_bytes += n
+        if self.callback is not None:
+            self.due_us = self.end_us
+            if self not in board.timers:
+                board.timers.append(self)
+        return n
+
+    def fire(self):
+        """Called by the board once the written samples have played."""
+        if self in board.timers:
+            board.timers.remove(self)
+        if self.callback is not None:
+            self.callback(self)
+
+    def deinit(self):
+        if self in board.timers:
+            board.timers.remove(self)
+
+
+class RTC:
+    """Calendar clock: board.rtc_date at midnight when the simulation starts."""
+
+    def datetime(self):
+        s = board.clock.now_ms() // 1000
+        year, month, day = board.rtc_date
+        return (year, month, day + s // 86400, 0,
+                s // 3600 % 24, s // 60 % 60, s % 60, 0)
@@ -0,0 +1,387 @@
+# sim/optimize_timing.py
+"""
+Offline search for the flow-to-timing curves used by traffic_flow.
+
+Replays a recorded flow trace and pedestrian presses through the phase
+logic of traffic.PHASE_PLAN for every candidate parameter set and keeps
+the one with the lowest cost:
+
+    cost = pedestrian wait (s) + VEHICLE_WEIGHT * vehicle delay (veh*s)
+           + SHORTFALL_WEIGHT * walk time missing for the crowd served (s)
+
+Vehicle delay is the queue built up during each car red, plus STOP_S
+for every vehicle the switch to red stops. The queue drains at
+SATURATION_RATE once the cars have green again, after LOST_GREEN_MS of
+start-up time; vehicles still queued when the next red comes wait
+through that red as well. So a phase switch at high flow is not free,
+and a longer wait that serves several presses with one phase can pay
+off. Candidates are
+
+    wait_ms = wait_min + (wait_max - wait_min) * flow ** wait_gamma
+    walk_ms = walk_max - (walk_max - walk_min) * flow ** walk_gamma
+
+never below the minimum car green and walk time of the built-in maps
+(MIN_WAIT_MS, MIN_WALK_MS).
+
+All candidates are simulated together with NumPy (one array element per
+candidate); simulate_candidate() is the plain per-candidate reference.
+The winner is written as a timing table that traffic_flow loads at boot:
+
+    python -m sim.optimize_timing --flow flow.csv --presses presses.csv
+    python -m sim.optimize_timing --hours 24 --seed 1 --bench
+    mpremote cp timing.json :timing.json
+
+flow.csv holds "t_ms,raw" lines (raw ADC 0–4095, evenly spaced) and
+presses.csv one "t_ms" per line. Without them a synthetic day is used.
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# ======= Phase Model (see traffic.PHASE_PLAN) =======
+YELLOW_MS = 3000
+TRANSITION_MS = 1000
+
+# ======= Cost Model =======
+MAX_VEHICLE_RATE = 0.5    # vehicles per second at flow 1.0
+VEHICLE_WEIGHT = 1.0      # one vehicle-second vs one pedestrian-second
+SHORTFALL_WEIGHT = 20.0   # per second of walk time missing
+SATURATION_RATE = 0.6     # vehicles per second leaving a queue
+LOST_GREEN_MS = 3000      # start-up time of a queue, per car green
+STOP_S = 20               # delay equivalent of stopping one vehicle
+WALK_BASE_MS = 7000       # walk time needed by a single pedestrian
+WALK_PER_PED_MS = 1500    # extra walk time per additional pedestrian
+
+# ======= Floors (the built-in linear maps start there) =======
+MIN_WAIT_MS = 10_000      # car green after a press
+MIN_WALK_MS = 10_000
+
+# ======= Candidate Grid =======
+WAIT_MIN = (10_000, 15_000, 20_000, 25_000)
+WAIT_MAX = (30_000, 45_000, 60_000, 75_000, 90_000)
+WAIT_GAMMA = (0.5, 0.75, 1.0, 1.5, 2.0, 3.0)
+WALK_MIN = (10_000, 12_000, 15_000)
+WALK_MAX = (20_000, 25_000, 30_000, 40_000)
+WALK_GAMMA = (0.5, 1.0, 2.0)
+
+# Mean time between presses at the peak of the synthetic day
+SYNTHETIC_PRESS_MS = 30_000
+
+# Table exported for traffic_flow (flow = i / (TABLE_POINTS - 1))
+TABLE_POINTS = 17
+
+
+GRID_AXES = (("wait_min", WAIT_MIN), ("wait_max", WAIT_MAX), ("wait_gamma", WAIT_GAMMA),
+             ("walk_min", WALK_MIN), ("walk_max", WALK_MAX), ("walk_gamma", WALK_GAMMA))
+
+
+def candidate_grid():
+    """Every combination of the grid axes, as a list of 6-tuples."""
+    return list(itertools.product(*(axis for _, axis in GRID_AXES)))
+
+
+def grid_edges(params):
+    """
+    Names of the axes on which params sit at the end of the grid (the
+    floors MIN_WAIT_MS and MIN_WALK_MS excepted): widen those axes.
+    """
+    edges = []
+    for value, (name, axis) in zip(params, GRID_AXES):
+        if value in (MIN_WAIT_MS, MIN_WALK_MS) and name in ("wait_min", "walk_min"):
+            continue
+        if value == min(axis) or value == max(axis):
+            edges.append(name)
+    return edges
+
+
+# ======= Traces =======
+
+def load_flow(path):
+    """Return (raw samples, sample period in ms) from a t_ms,raw CSV."""
+    times = []
+    raws = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] == "#":
+                continue
+            t_ms, raw = line.split(",")[:2]
+            times.append(int(t_ms))
+            raws.append(int(raw))
+    period = (times[-1] - times[0]) // (len(times) - 1) if len(times) > 1 else 1000
+    return raws, period
+
+
+def load_presses(path):
+    with open(path) as f:
+        return sorted(int(line.split(",")[0]) for line in f
+                      if line.strip() and line[0] != "#")
+
+
+def _day_shape(t_ms):
+    """Rush-hour shaped load, 0.1 at night to 0.9 at the peak (as in python -m sim)."""
+    day = (t_ms % 86_400_000) / 86_400_000
+    return 0.5 - 0.4 * math.cos(2 * math.pi * day)
+
+
+def synthetic_trace(hours, seed, period_ms=1000):
+    """
+    Rush-hour shaped flow and presses: pedestrians follow the same
+    shape, one every SYNTHETIC_PRESS_MS on average at the peak.
+    """
+    rng = random.Random(seed)
+    end_ms = int(hours * 3_600_000)
+    raws = []
+    for t_ms in range(0, end_ms, period_ms):
+        base = _day_shape(t_ms)
+        raws.append(min(4095, max(0, int(base * 4095 + rng.gauss(0, 60)))))
+    presses = []
+    t = 0
+    while True:
+        t += int(rng.expovariate(1 / SYNTHETIC_PRESS_MS))
+        if t >= end_ms:
+            break
+        if rng.random() < _day_shape(t) / 0.9:
+            presses.append(t)
+    return raws, period_ms, presses
+
+
+# ======= Reference Simulation =======
+
+def simulate_candidate(params, raws, period_ms, presses):
+    """
+    Cost of one candidate (plain Python). Mirrors traffic.py: a press in
+    WAIT or yellow joins the coming walk phase, a press during the walk
+    phase crosses at once, and a press during the all-red transition is
+    latched and starts the next cycle as soon as car green returns.
+    """
+    wait_min, wait_max, wait_gamma, walk_min, walk_max, walk_gamma = params
+    last = len(raws) - 1
+
+    def flow_at(t_ms):
+        return raws[min(t_ms // period_ms, last)] / 4095.0
+
+    ped_wait = 0
+    vehicle = 0.0
+    shortfall = 0
+    queue = 0.0       # vehicles queued when the last car red ended
+    ped_start = ped_end = cyc_end = -1
+    served = 0
+    pending = 0
+    pending_sum = 0
+
+    def start_cycle(t_ms):
+        nonlocal queue
+        wait = max(MIN_WAIT_MS, int(wait_min + (wait_max - wait_min) * flow_at(t_ms) ** wait_gamma))
+        p_start = t_ms + wait + YELLOW_MS
+        flow = flow_at(p_start)
+        walk = max(MIN_WALK_MS, int(walk_max - (walk_max - walk_min) * flow ** walk_gamma))
+        rate = MAX_VEHICLE_RATE * flow
+        green_s = max(0, p_start - cyc_end - LOST_GREEN_MS) / 1000
+        left = max(0.0, queue - (SATURATION_RATE - rate) * green_s)
+        red_s = (walk + TRANSITION_MS) / 1000
+        queue = left + rate * red_s
+        return p_start, p_start + walk, p_start + walk + TRANSITION_MS, \
+            (left + rate * red_s / 2 + rate * STOP_S) * red_s
+
+    def missing(served, ped_start, ped_end):
+        need = WALK_BASE_MS + WALK_PER_PED_MS * (served - 1)
+        gap = need - (ped_end - ped_start)
+        return gap if served > 0 and gap > 0 else 0
+
+    for t in presses:
+        if pending and t >= cyc_end:
+            shortfall += missing(served, ped_start, ped_end)
+            ped_start, ped_end, cyc_end, delay = start_cycle(cyc_end)
+            vehicle += delay
+            ped_wait += pending * ped_start - pending_sum
+            served = pending
+            pending = pending_sum = 0
+        if t >= cyc_end:
+            shortfall += missing(served, ped_start, ped_end)
+            ped_start, ped_end, cyc_end, delay = start_cycle(t)
+            vehicle += delay
+            ped_wait += ped_start - t
+            served = 1
+        elif t < ped_start:
+            ped_wait += ped_start - t
+            served += 1
+        elif t >= ped_end:
+            pending += 1
+            pending_sum += t
+    shortfall += missing(served, ped_start, ped_end)
+    if pending:
+        ped_start, ped_end, cyc_end, delay = start_cycle(cyc_end)
+        vehicle += delay
+        ped_wait += pending * ped_start - pending_sum
+        shortfall += missing(pending, ped_start, ped_end)
+
+    return ped_wait / 1000 + VEHICLE_WEIGHT * vehicle + SHORTFALL_WEIGHT * shortfall / 1000
+
+
+# ======= Batched Simulation =======
+
+def simulate_batch(grid, raws, period_ms, presses):
+    """
+    Cost of every candidate at once: the same event walk as
+    simulate_candidate(), with one array element per candidate.
+    """
+    params = np.asarray(grid, dtype=np.float64)
+    wait_min, wait_max, wait_gamma, walk_min, walk_max, walk_gamma = params.T
+    flows = np.asarray(raws, dtype=np.float64) / 4095.0
+    last = len(raws) - 1
+    n = len(params)
+
+    def flow_at(t_ms):
+        return flows[np.minimum(t_ms // period_ms, last)]
+
+    ped_wait = np.zeros(n, dtype=np.int64)
+    vehicle = np.zeros(n)
+    shortfall = np.zeros(n, dtype=np.int64)
+    queue = np.zeros(n)
+    ped_start = np.full(n, -1, dtype=np.int64)
+    ped_end = np.full(n, -1, dtype=np.int64)
+    cyc_end = np.full(n, -1, dtype=np.int64)
+    served = np.zeros(n, dtype=np.int64)
+    pending = np.zeros(n, dtype=np.int64)
+    pending_sum = np.zeros(n, dtype=np.int64)
+
+    def start_cycle(mask, t_ms):
+        """Start a cycle at t_ms (array) where mask is set."""
+        wait = np.maximum(MIN_WAIT_MS, (wait_min + (wait_max - wait_min)
+                                        * flow_at(t_ms) ** wait_gamma).astype(np.int64))
+        p_start = t_ms + wait + YELLOW_MS
+        flow = flow_at(p_start)
+        walk = np.maximum(MIN_WALK_MS, (walk_max - (walk_max - walk_min)
+                                        * flow ** walk_gamma).astype(np.int64))
+        rate = MAX_VEHICLE_RATE * flow
+        green_s = np.maximum(0, p_start - cyc_end - LOST_GREEN_MS) / 1000
+        left = np.maximum(0.0, queue - (SATURATION_RATE - rate) * green_s)
+        red_s = (walk + TRANSITION_MS) / 1000
+        vehicle[mask] += ((left + rate * red_s / 2 + rate * STOP_S) * red_s)[mask]
+        np.copyto(queue, left + rate * red_s, where=mask)
+        np.copyto(ped_start, p_start, where=mask)
+        np.copyto(ped_end, p_start + walk, where=mask)
+        np.copyto(cyc_end, p_start + walk + TRANSITION_MS, where=mask)
+
+    def close_cycle(mask):
+        gap = WALK_BASE_MS + WALK_PER_PED_MS * (served - 1) - (ped_end - ped_start)
+        shortfall[mask & (served > 0) & (gap > 0)] += gap[mask & (served > 0) & (gap > 0)]
+
+    for t in presses:
+        latched = (pending > 0) & (t >= cyc_end)
+        if latched.any():
+            close_cycle(latched)
+            start_cycle(latched, cyc_end.copy())
+            ped_wait[latched] += (pending * ped_start - pending_sum)[latched]
+            served[latched] = pending[latched]
+            pending[latched] = 0
+            pending_sum[latched] = 0
+
+        idle = t >= cyc_end
+        close_cycle(idle)
+        start_cycle(idle, np.full(n, t, dtype=np.int64))
+        ped_wait[idle] += (ped_start - t)[idle]
+        served[idle] = 1
+
+        joining = ~idle & (t < ped_start)
+        ped_wait[joining] += (ped_start - t)[joining]
+        served[joining] += 1
+
+        late = ~idle & (t >= ped_end)
+        pending[late] += 1
+        pending_sum[late] += t
+
+    close_cycle(np.ones(n, dtype=bool))
+    left = pending > 0
+    if left.any():
+        start_cycle(left, cyc_end.copy())
+        ped_wait[left] += (pending * ped_start - pending_sum)[left]
+        served[left] = pending[left]
+        close_cycle(left)
+
+    return ped_wait / 1000 + VEHICLE_WEIGHT * vehicle + SHORTFALL_WEIGHT * shortfall / 1000
+
+
+# ======= Export =======
+
+def timing_table(params):
+    """Sampled wait/walk curves of one candidate, as traffic_flow loads them."""
+    wait_min, wait_max, wait_gamma, walk_min, walk_max, walk_gamma = params
+    wait_ms = []
+    walk_ms = []
+    for i in range(TABLE_POINTS):
+        flow = i / (TABLE_POINTS - 1)
+        wait_ms.append(max(MIN_WAIT_MS, int(wait_min + (wait_max - wait_min) * flow ** wait_gamma)))
+        walk_ms.append(max(MIN_WALK_MS, int(walk_max - (walk_max - walk_min) * flow ** walk_gamma)))
+    return {"wait_ms": wait_ms, "walk_ms": walk_ms}
+
+
+def linear_params():
+    """The built-in linear maps of traffic_flow (10–60 s, 10–40 s)."""
+    return (10_000, 60_000, 1.0, 10_000, 40_000, 1.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--flow", help="t_ms,raw CSV of the recorded flow")
+    parser.add_argument("--presses", help="t_ms per line of button presses")
+    parser.add_argument("--hours", type=float, default=24, help="synthetic trace length")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="timing.json")
+    parser.add_argument("--bench", action="store_true",
+                        help="also time the per-candidate Python loop")
+    args = parser.parse_args()
+
+    if args.flow and args.presses:
+        raws, period_ms = load_flow(args.flow)
+        presses = load_presses(args.presses)
+    else:
+        raws, period_ms, presses = synthetic_trace(args.hours, args.seed)
+
+    grid = candidate_grid()
+    print("{} candidates, {} presses, {} flow samples".format(
+        len(grid), len(presses), len(raws)))
+
+    if np is None:
+        print("NumPy not installed: using the per-candidate loop")
+        started = time.perf_counter()
+        costs = [simulate_candidate(p, raws, period_ms, presses) for p in grid]
+        print("sweep: {:.2f} s".format(time.perf_counter() - started))
+    else:
+        started = time.perf_counter()
+        costs = simulate_batch(grid, raws, period_ms, presses).tolist()
+        batched_s = time.perf_counter() - started
+        print("batched sweep: {:.3f} s".format(batched_s))
+        if args.bench:
+            started = time.perf_counter()
+            loop_costs = [simulate_candidate(p, raws, period_ms, presses) for p in grid]
+            loop_s = time.perf_counter() - started
+            worst = max(abs(a - b) for a, b in zip(costs, loop_costs))
+            print("python loop:   {:.3f} s  ({:.0f}x slower, max cost difference {:.2g})".format(
+                loop_s, loop_s / batched_s, worst))
+
+    best = min(range(len(grid)), key=costs.__getitem__)
+    baseline = simulate_candidate(linear_params(), raws, period_ms, presses)
+    print("linear maps cost: {:.0f}".format(baseline))
+    print("best cost:        {:.0f}  wait {}–{} ms ^{}, walk {}–{} ms ^{}".format(
+        costs[best], *grid[best]))
+    edges = grid_edges(grid[best])
+    if edges:
+        print("at the end of the grid:", ", ".join(edges))
+
+    with open(args.out, "w") as f:
+        json.dump(timing_table(grid[best]), f)
+    print("wrote", args.out)
+
+
+if __name__ == "__main__":
+    main()
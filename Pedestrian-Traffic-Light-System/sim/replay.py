@@ -0,0 +1,152 @@
+# sim/replay.py
+"""
+Replay a binary trace (trace_log.py) through the real FSMs and diff
+the outputs.
+
+The recorded inputs (button and sensor edges, ADC samples) are fed to
+a fresh simulated board at their original ticks; the replayed run is
+traced too, and its output records (lights, buzzer, display) are
+compared stream by stream with the recorded ones.
+
+    python -m sim.replay trace.0.bin trace.bin [--tolerance-ms 5] [--show 10]
+
+Traces recorded on the board carry real loop timing, so allow a few
+ms of tolerance; traces from "python -m sim --trace" replay exactly.
+"""
+import argparse
+import bisect
+import os
+import struct
+import tempfile
+import time
+
+from .runner import Simulation
+from . import clock as sim_clock
+
+RECORD_FORMAT = "<IBBH"
+RECORD_SIZE = 8
+FILE_MAGIC = b"TRC1"
+K_BOOT, K_INPUT, K_ADC, K_OUTPUT, K_BUZZER, K_DISPLAY = range(6)
+KIND_NAMES = ("boot", "input", "adc", "output", "buzzer", "display")
+OUTPUT_KINDS = (K_OUTPUT, K_BUZZER, K_DISPLAY)
+
+
+def read_trace(paths):
+    """
+    Parse trace files (oldest first) into (t_ms, kind, channel, value)
+    with t_ms unwrapped to a monotonic time.
+    """
+    records = []
+    last_tick = None
+    t_ms = 0
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:len(FILE_MAGIC)] != FILE_MAGIC:
+            raise ValueError("{}: not a trace file".format(path))
+        end = len(FILE_MAGIC) + (len(data) - len(FILE_MAGIC)) // RECORD_SIZE * RECORD_SIZE
+        for tick, kind, channel, value in struct.iter_unpack(
+                RECORD_FORMAT, data[len(FILE_MAGIC):end]):
+            if last_tick is None:
+                t_ms = tick
+            else:
+                t_ms += sim_clock.ticks_diff(tick, last_tick)
+            last_tick = tick
+            records.append((t_ms, kind, channel, value))
+    return records
+
+
+def boot_segment(records):
+    """Records from the first boot up to the next one (a reset)."""
+    boots = [i for i, r in enumerate(records) if r[1] == K_BOOT]
+    if not boots:
+        raise ValueError("trace has no boot record")
+    first = boots[0]
+    last = boots[1] if len(boots) > 1 else len(records)
+    return records[first:last]
+
+
+def replay(records, trace_path):
+    """Run the recorded inputs; returns (simulation, replayed records)."""
+    boot_ms = records[0][0]
+    end_ms = records[-1][0] + 1_000
+    sim = Simulation(start_ms=boot_ms, trace_path=trace_path)
+
+    adc_t = [t for t, kind, _, _ in records if kind == K_ADC]
+    adc_v = [v for _, kind, _, v in records if kind == K_ADC]
+
+    def adc(t_ms):
+        i = bisect.bisect_right(adc_t, t_ms) - 1
+        return adc_v[i] if i >= 0 else 0
+    sim.set_flow(adc)
+
+    pins = (sim.hardware.BOT1_PIN, sim.hardware.BOT2_PIN)
+    for t_ms, kind, channel, value in records:
+        if kind == K_INPUT:
+            sim.set_input(t_ms, pins[channel], value)
+
+    sim.run(end_ms)
+    return sim, read_trace([trace_path])
+
+
+def diff(recorded, replayed, tolerance_ms):
+    """
+    Compare output streams (kind, channel) pairwise.
+    Returns a list of (t_ms, stream, recorded, replayed) differences.
+    """
+    def streams(records, end_ms):
+        out = {}
+        for t_ms, kind, channel, value in records:
+            if kind in OUTPUT_KINDS and t_ms <= end_ms:
+                out.setdefault((kind, channel), []).append((t_ms, value))
+        return out
+
+    end_ms = recorded[-1][0]
+    a = streams(recorded, end_ms)
+    b = streams(replayed, end_ms)
+    differences = []
+    for key in sorted(set(a) | set(b)):
+        rec = a.get(key, [])
+        rep = b.get(key, [])
+        for i in range(max(len(rec), len(rep))):
+            x = rec[i] if i < len(rec) else None
+            y = rep[i] if i < len(rep) else None
+            if x is None or y is None or x[1] != y[1] or abs(x[0] - y[0]) > tolerance_ms:
+                differences.append(((x or y)[0], key, x, y))
+    differences.sort()
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="trace files, oldest first")
+    parser.add_argument("--tolerance-ms", type=int, default=0)
+    parser.add_argument("--show", type=int, default=10, help="differences to print")
+    args = parser.parse_args()
+
+    recorded = boot_segment(read_trace(args.paths))
+    counts = [0] * len(KIND_NAMES)
+    for record in recorded:
+        counts[record[1]] += 1
+    span_ms = recorded[-1][0] - recorded[0][0]
+    print("{} records over {:.1f} min: {}".format(
+        len(recorded), span_ms / 60_000,
+        ", ".join("{} {}".format(n, name) for name, n in zip(KIND_NAMES, counts) if n)))
+
+    out_dir = tempfile.mkdtemp(prefix="sim_replay_")
+    started = time.perf_counter()
+    sim, replayed = replay(recorded, os.path.join(out_dir, "replay.bin"))
+    elapsed = time.perf_counter() - started
+    print("replayed in {:.2f} s ({:.0f}x real time)".format(
+        elapsed, span_ms / 1000 / max(elapsed, 1e-9)))
+
+    differences = diff(recorded, replayed, args.tolerance_ms)
+    for t_ms, (kind, channel), x, y in differences[:args.show]:
+        print("  {:>10} {}[{}]: recorded {} replayed {}".format(
+            t_ms, KIND_NAMES[kind], channel, x, y))
+    print("{} output differences (tolerance {} ms)".format(len(differences), args.tolerance_ms))
+    raise SystemExit(1 if differences else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# sim/runner.py
+"""
+Deterministic host-side run of the full FSM stack.
+
+The runner mirrors main.main(): one pass of main.update_all(), then
+scheduler.sleep_until() on main.next_wakeup(). Its sleeps go to the
+stub board, which jumps the virtual clock to the deadline, applying
+scripted inputs and firing timers on the way; a light sleep ends at the
+first input on a wake pin. No real time is spent sleeping, so a
+simulated day takes seconds. Every sleep is counted as a CPU wakeup.
+"""
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+from . import clock as sim_clock
+from . import esp32 as sim_esp32
+from . import machine as sim_machine
+from . import ssd1306 as sim_ssd1306
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _project_modules():
+    return [f[:-3] for f in os.listdir(PROJECT_DIR) if f.endswith(".py")]
+
+
+class Simulation:
+    """
+    One simulated intersection.
+
+        sim = Simulation()
+        sim.set_flow(lambda t_ms: 2048)
+        sim.press(1_000)
+        sim.run(120_000)
+        sim.changes("P_GREEN")  ->  [(t_ms, 1), (t_ms, 0), ...]
+    """
+
+    def __init__(self, start_ms=0, oled=True, quiet=True, log_dir=None,
+                 timing_table=None, poll_ms=None, trace_path=None, clock=None):
+        self.clock = clock or sim_clock.VirtualClock(start_ms)
+        self.board = sim_machine.Board(self.clock)
+        self.board.oled_present = oled
+        self.quiet = quiet
+        self.passes = 0
+        self._screen = None
+        self._booted = False
+        self.modules = {}
+        self.log_dir = log_dir or tempfile.mkdtemp(prefix="sim_vlog_")
+        self.timing_table = timing_table   # path of a timing.json, or None
+        self.poll_ms = poll_ms             # sleep_ms(poll_ms) after each pass (original loop)
+        self.trace_path = trace_path       # record a binary trace there
+        self._load()
+
+    # ------- Setup -------
+    def _load(self):
+        """Import a fresh copy of the project against the stubs."""
+        sim_clock.install(self.clock)
+        if isinstance(self.clock, sim_clock.VirtualClock):
+            self.clock.sleeper = self.board
+        sim_machine.board = self.board
+        sys.modules["machine"] = sim_machine
+        sys.modules["esp32"] = sim_esp32
+        sys.modules["ssd1306"] = sim_ssd1306
+        if PROJECT_DIR not in sys.path:
+            sys.path.insert(0, PROJECT_DIR)
+        for name in _project_modules():
+            sys.modules.pop(name, None)
+
+        self.main = importlib.import_module("main")
+        for name in _project_modules():
+            if name in sys.modules:
+                self.modules[name] = sys.modules[name]
+        self.hardware = self.modules["hardware"]
+        self.modules["violation_log"].LOG_DIR = self.log_dir
+        if self.timing_table is not None:
+            self.modules["traffic_flow"].TIMING_TABLE_PATH = self.timing_table
+        if self.trace_path is not None:
+            trace_log = self.modules["trace_log"]
+            trace_log.TRACE_ENABLED = True
+            trace_log.TRACE_PATH = self.trace_path
+            trace_log.TRACE_OLD_PATH = self.trace_path + ".0"
+            trace_log.TRACE_MAX_BYTES = 1 << 62   # one file on the host
+            if os.path.exists(self.trace_path):
+                os.remove(self.trace_path)        # a new recording, not appended
+
+        # Name pins after their hardware.*_PIN constant (T_RED_PIN -> T_RED)
+        for attr in dir(self.hardware):
+            if attr.endswith("_PIN"):
+                self.board.names[getattr(self.hardware, attr)] = attr[:-4]
+
+    def _call(self, fn, *args):
+        if not self.quiet:
+            return fn(*args)
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        try:
+            return fn(*args)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    # ------- Scenario scripting -------
+    def set_flow(self, source):
+        """ADC raw value (0..4095): a constant or a callable(t_ms)."""
+        if callable(source):
+            self.board.adc_source = source
+        else:
+            self.board.adc_source = lambda t_ms: source
+
+    def set_input(self, t_ms, pin_id, level):
+        """Schedule an input pin level change."""
+        self.board.schedule_input(t_ms * 1000, pin_id, level)
+
+    def pulse(self, t_ms, pin_id, hold_ms=200):
+        """Active-low pulse on an input (pressed for hold_ms)."""
+        self.set_input(t_ms, pin_id, 0)
+        self.set_input(t_ms + hold_ms, pin_id, 1)
+
+    def press(self, t_ms, hold_ms=200):
+        """Pedestrian button press on Bot1."""
+        self.pulse(t_ms, self.hardware.BOT1_PIN, hold_ms)
+
+    def violation(self, t_ms, hold_ms=200):
+        """Vehicle crossing the stop line (Bot2)."""
+        self.pulse(t_ms, self.hardware.BOT2_PIN, hold_ms)
+
+    # ------- Running -------
+    def boot(self):
+        self._booted = True
+        self._call(self.main.init_system)
+        self._check_screen()
+
+    def run(self, until_ms):
+        """Run the system until the virtual clock reaches until_ms."""
+        if not self._booted:
+            self.boot()
+        self._call(self._run, until_ms)
+        if self.trace_path is not None:
+            self.modules["trace_log"].flush()
+
+    def _run(self, until_ms):
+        main = self.main
+        clock = self.clock
+        board = self.board
+        scheduler = self.modules["scheduler"]
+
+        board.sleep_limit_us = until_ms * 1000
+        try:
+            while clock.now_ms() < until_ms:
+                board.apply_inputs(clock.now_us)
+                now = clock.ticks_ms()
+                main.update_all(now)
+                self.passes += 1
+                self._check_screen()
+
+                before_us = clock.now_us
+                if self.poll_ms is not None:
+                    time.sleep_ms(self.poll_ms)
+                else:
+                    scheduler.sleep_until(now, main.next_wakeup(now), main.can_light_sleep())
+                if clock.now_us == before_us:
+                    board.advance_to_us(before_us + 1000)  # a pass is never free on the device
+        finally:
+            board.sleep_limit_us = None
+
+    def _check_screen(self):
+        oled = self.hardware.oled
+        if oled is None or oled.panel is None or not oled.panel.changed:
+            return
+        if self.modules["display_oled"].is_flushing():
+            return   # only complete frames are recorded
+        oled.panel.changed = False
+        screen = " | ".join(oled.panel.text_lines())
+        if screen != self._screen:
+            self._screen = screen
+            self.board.record("OLED", screen)
+
+    # ------- Results -------
+    @property
+    def timeline(self):
+        """All output changes as (t_ms, name, value)."""
+        return self.board.timeline
+
+    def changes(self, name):
+        """Changes of one output as (t_ms, value)."""
+        return [(t, v) for t, n, v in self.board.timeline if n == name]
+
+    def stats(self):
+        hours = max(self.clock.now_ms(), 1) / 3_600_000
+        return {
+            "sim_ms": self.clock.now_ms(),
+            "passes": self.passes,
+            "wakeups": self.board.sleeps,
+            "wakeups_per_hour": int(self.board.sleeps / hours),
+            "light_sleeps": self.board.light_sleeps,
+            "light_sleep_share": round(self.board.light_sleep_us / max(self.clock.now_us, 1), 3),
+            "gpio_writes": self.board.gpio_writes,
+            "pwm_writes": self.board.pwm_writes,
+            "i2c_bytes": self.board.i2c_bytes,
+            "fines": self.modules["violation"].get_fines(),
+            "crossings": sum(1 for _, v in self.changes("P_GREEN") if v),
+        }
@@ -0,0 +1,189 @@
+# sim/ssd1306.py
+"""
+Stand-in for the ssd1306 driver plus a model of the panel itself.
+
+The driver half keeps a MONO_VLSB framebuffer like framebuf does and
+talks to the panel over the simulated I2C bus, so every byte sent is
+counted. The panel half decodes the command/data stream into its own
+display RAM, which is what the simulation reads back as screen text.
+
+Glyphs are not a real font: each character is an 8x8 cell whose first
+column holds the character code (plus a marker bit) and whose second
+column is a fixed marker, so text can be decoded back from pixels.
+"""
+from . import machine
+
+SET_COL_ADDR = 0x21
+SET_PAGE_ADDR = 0x22
+
+_CMD_ARGS = {SET_COL_ADDR: 2, SET_PAGE_ADDR: 2, 0x81: 1, 0x8D: 1, 0xA8: 1,
+             0xD3: 1, 0xD5: 1, 0xD9: 1, 0xDA: 1, 0xDB: 1, 0x20: 1}
+
+_MARK_COL = 0x81
+
+
+class Panel:
+    """SSD1306 controller RAM in horizontal addressing mode."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.pages = height // 8
+        self.ram = bytearray(width * self.pages)
+        self.col_start, self.col_end = 0, width - 1
+        self.page_start, self.page_end = 0, self.pages - 1
+        self.col, self.page = 0, 0
+        self._cmd = None
+        self._args = []
+        self.changed = False
+
+    def receive(self, data):
+        if data[0] == 0x40:
+            self._data(data[1:])
+        elif data[0] == 0x00:
+            # Command stream: every following byte is a command
+            for byte in data[1:]:
+                self._command(byte)
+        else:
+            # Command stream: control byte 0x80 followed by the command
+            for i in range(1, len(data), 2):
+                self._command(data[i])
+
+    def _command(self, byte):
+        if self._cmd is None:
+            need = _CMD_ARGS.get(byte, 0)
+            if need:
+                self._cmd = byte
+                self._args = []
+            return
+        self._args.append(byte)
+        if len(self._args) < _CMD_ARGS[self._cmd]:
+            return
+        if self._cmd == SET_COL_ADDR:
+            self.col_start, self.col_end = self._args
+            self.col = self.col_start
+        elif self._cmd == SET_PAGE_ADDR:
+            self.page_start, self.page_end = self._args
+            self.page = self.page_start
+        self._cmd = None
+
+    def _data(self, data):
+        for b in data:
+            self.ram[self.page * self.width + self.col] = b
+            self.col += 1
+            if self.col > self.col_end:
+                self.col = self.col_start
+                self.page += 1
+                if self.page > self.page_end:
+                    self.page = self.page_start
+        self.changed = True
+
+    def _column_bits(self, x):
+        """All pixels of column x as one integer (bit y = row y)."""
+        bits = 0
+        for page in range(self.pages):
+            bits |= self.ram[page * self.width + x] << (page * 8)
+        return bits
+
+    def text_lines(self):
+        """Decode the text rows currently visible on the panel."""
+        cols = [self._column_bits(x) for x in range(self.width)]
+        lines = []
+        for y in range(0, self.pages * 8 - 7):
+            chars = []
+            for x in range(0, self.width - 7, 8):
+                code = (cols[x] >> y) & 0xFF
+                mark = (cols[x + 1] >> y) & 0xFF
+                if mark != _MARK_COL or not code & 0x80:
+                    break
+                chars.append(chr(code & 0x7F))
+            if chars:
+                lines.append("".join(chars).rstrip())
+        return lines
+
+
+class SSD1306_I2C:
+    def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False):
+        self.width = width
+        self.height = height
+        self.pages = height // 8
+        self.buffer = bytearray(self.pages * width)
+        self.i2c = i2c
+        self.addr = addr
+        self.panel = None
+        if machine.board.oled_present:
+            self.panel = Panel(width, height)
+            i2c.attach(addr, self.panel)
+        self.init_display()
+
+    # ------- Driver -------
+    def init_display(self):
+        for cmd in (0xAE, 0x20, 0x00, 0x8D, 0x14, 0xAF):
+            self.write_cmd(cmd)
+        self.fill(0)
+        self.show()
+
+    def write_cmd(self, cmd):
+        self.i2c.writeto(self.addr, bytes((0x80, cmd)))
+
+    def write_data(self, buf):
+        self.i2c.writevto(self.addr, (b"\x40", buf))
+
+    def show(self):
+        self.write_cmd(SET_COL_ADDR)
+        self.write_cmd(0)
+        self.write_cmd(self.width - 1)
+        self.write_cmd(SET_PAGE_ADDR)
+        self.write_cmd(0)
+        self.write_cmd(self.pages - 1)
+        self.write_data(self.buffer)
+
+    def poweroff(self):
+        self.write_cmd(0xAE)
+
+    def poweron(self):
+        self.write_cmd(0xAF)
+
+    def contrast(self, contrast):
+        self.write_cmd(0x81)
+        self.write_cmd(contrast)
+
+    # ------- framebuf subset -------
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return 0
+        i = (y >> 3) * self.width + x
+        bit = 1 << (y & 7)
+        if c is None:
+            return 1 if self.buffer[i] & bit else 0
+        if c:
+            self.buffer[i] |= bit
+        else:
+            self.buffer[i] &= ~bit & 0xFF
+
+    def fill(self, c):
+        v = 0xFF if c else 0
+        for i in range(len(self.buffer)):
+            self.buffer[i] = v
+
+    def fill_rect(self, x, y, w, h, c):
+        x0, x1 = max(x, 0), min(x + w, self.width)
+        y0, y1 = max(y, 0), min(y + h, self.height)
+        for page in range(y0 >> 3, ((y1 - 1) >> 3) + 1):
+            lo = max(y0, page * 8) - page * 8
+            hi = min(y1, page * 8 + 8) - page * 8
+            mask = ((1 << hi) - 1) & ~((1 << lo) - 1)
+            base = page * self.width
+            for xx in range(x0, x1):
+                if c:
+                    self.buffer[base + xx] |= mask
+                else:
+                    self.buffer[base + xx] &= ~mask & 0xFF
+
+    def text(self, s, x, y, c=1):
+        for ch in s:
+            cols = ((ord(ch) & 0x7F) | 0x80, _MARK_COL, 0, 0, 0, 0, 0, 0)
+            for dx in range(8):
+                for r in range(8):
+                    if (cols[dx] >> r) & 1:
+                        self.pixel(x + dx, y + r, c)
+            x += 8
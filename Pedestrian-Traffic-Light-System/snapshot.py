@@ -0,0 +1,98 @@
+# snapshot.py
+import time
+from array import array
+import traffic
+
+# ======= Traffic Snapshot =======
+# What the display needs from traffic.py, handed from the safety loop to
+# the display thread of main_dual.py without a lock. The safety loop is
+# the only writer: it bumps _seq to odd, writes the fields, bumps it to
+# even. The reader copies the fields and keeps the copy only if _seq was
+# even and unchanged around it, so a torn copy is retried, never shown.
+F_STATE = 0
+F_START_MS = 1
+F_PHASE_MS = 2
+NUM_FIELDS = 3
+
+MAX_RETRIES = 8       # then the reader keeps its previous copy
+
+_shared = array('i', [0] * NUM_FIELDS)   # written by the safety loop only
+_seq = 0
+
+_copy = array('i', [0] * NUM_FIELDS)     # the reader's copy
+_retries = 0
+_stale = 0            # reads that gave up and kept the previous copy
+
+
+def init_snapshot():
+    """Publish the current phase and take a first copy."""
+    global _seq, _retries, _stale
+    _seq = 0
+    _retries = 0
+    _stale = 0
+    _write(traffic.get_state(), traffic.get_state_start_ms(), traffic.get_phase_ms())
+    take()
+
+
+def _write(state, start_ms, phase_ms):
+    global _seq
+    _seq += 1             # odd: write in progress
+    _shared[F_STATE] = state
+    _shared[F_START_MS] = start_ms
+    _shared[F_PHASE_MS] = phase_ms
+    _seq += 1
+
+
+def publish():
+    """Safety loop: publish the phase if it changed since the last call."""
+    start_ms = traffic.get_state_start_ms()
+    state = traffic.get_state()
+    if state != _shared[F_STATE] or start_ms != _shared[F_START_MS]:
+        _write(state, start_ms, traffic.get_phase_ms())
+
+
+def take():
+    """
+    Reader: copy the latest published phase. Returns False if every try
+    overlapped a write (the previous copy is kept).
+    """
+    global _retries, _stale
+    tries = 0
+    while tries < MAX_RETRIES:
+        seq = _seq
+        if not seq & 1:
+            _copy[F_STATE] = _shared[F_STATE]
+            _copy[F_START_MS] = _shared[F_START_MS]
+            _copy[F_PHASE_MS] = _shared[F_PHASE_MS]
+            if seq == _seq:
+                return True
+        _retries += 1
+        tries += 1
+    _stale += 1
+    return False
+
+
+# ======= Reader side: the traffic.py calls display_oled.py makes =======
+
+def get_state():
+    return _copy[F_STATE]
+
+
+def _remaining_ms(state, now_ms):
+    if _copy[F_STATE] != state:
+        return 0
+    remaining = _copy[F_PHASE_MS] - time.ticks_diff(now_ms, _copy[F_START_MS])
+    return remaining if remaining > 0 else 0
+
+
+def get_wait_remaining_ms(now_ms):
+    return _remaining_ms(traffic.TRAFFIC_WAIT_BEFORE_PED, now_ms)
+
+
+def get_ped_remaining_ms(now_ms):
+    return _remaining_ms(traffic.TRAFFIC_PED_GREEN, now_ms)
+
+
+def report():
+    """Print the snapshot counters (call from the REPL)."""
+    print("snapshot seq: {}  retries: {}  stale reads: {}".format(_seq, _retries, _stale))
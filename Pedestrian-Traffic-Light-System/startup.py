@@ -0,0 +1,78 @@
+# startup.py
+from array import array
+import time
+
+# ======= Staged Boot =======
+# Stage 0 must leave the lights in a safe state; it runs inside
+# init_system(). The remaining stages run one per loop pass after it,
+# so a slow one (timing table, I2C probe, flash log) never keeps the
+# intersection dark. With STAGED_BOOT = False every stage runs in
+# init_system(), as before.
+STAGED_BOOT = True
+
+MAX_STAGES = 12
+
+_stages = ()          # (name, init function) in boot order
+_done = 0             # stages completed
+_import_us = time.ticks_us()   # imported first by main: start of the imports
+_stage_end_us = array('i', [0] * MAX_STAGES)
+
+
+def init_startup(stages):
+    """Set the stage list and run stage 0 (plus all others if not staged)."""
+    global _stages, _done
+    if len(stages) > MAX_STAGES:
+        raise ValueError("too many boot stages")
+    _stages = stages
+    _done = 0
+    run_stage()
+    if not STAGED_BOOT:
+        run_all()
+
+
+def run_stage():
+    """Run the next pending stage and record when it finished."""
+    global _done
+    if _done >= len(_stages):
+        return
+    _stages[_done][1]()
+    _stage_end_us[_done] = time.ticks_us()
+    _done += 1
+
+
+def run_all():
+    """Run every pending stage now."""
+    while _done < len(_stages):
+        run_stage()
+
+
+def is_ready(stage):
+    """True once the given stage has run."""
+    return stage < _done
+
+
+def pending():
+    """True while boot stages are still waiting."""
+    return _done < len(_stages)
+
+
+def update_startup(now_ms):
+    """Run one pending stage per loop pass."""
+    if _done < len(_stages):
+        run_stage()
+
+
+def next_deadline_ms(now_ms):
+    """Next pass right away while stages are pending, else None."""
+    if _done < len(_stages):
+        return now_ms
+    return None
+
+
+def report():
+    """Print when each boot stage finished, from import and from reset (call from the REPL)."""
+    print("stage       from import    from reset")
+    for i in range(_done):
+        end = _stage_end_us[i]
+        print("{:<10}{:>11} us{:>11} us".format(
+            _stages[i][0], time.ticks_diff(end, _import_us), end))
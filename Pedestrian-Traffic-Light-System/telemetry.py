@@ -0,0 +1,302 @@
+# telemetry.py
+import time
+from machine import UART, unique_id
+import traffic
+import traffic_flow
+import violation
+
+# ======= Telemetry =======
+# One fixed-size record per pedestrian cycle, queued in a RAM ring and
+# sent in batches over UART or UDP. Nothing ever waits for the link:
+# a batch that cannot go out stays queued, and when the ring is full a
+# new cycle is merged into the newest record instead of being dropped.
+# sim/collector.py receives and decodes the batches.
+TELEMETRY_ENABLED = False
+
+TRANSPORT_UART = 0
+TRANSPORT_UDP = 1
+TELEMETRY_TRANSPORT = TRANSPORT_UART
+
+TELEMETRY_DEVICE_ID = 0          # 0 = last 4 bytes of machine.unique_id()
+TELEMETRY_UART_ID = 1
+TELEMETRY_UART_TX_PIN = 17
+TELEMETRY_UART_BAUD = 115200
+TELEMETRY_UDP_HOST = "192.168.4.2"
+TELEMETRY_UDP_PORT = 5005
+
+TELEMETRY_RING_RECORDS = 32
+TELEMETRY_BATCH_RECORDS = 8      # 12 + 8 * 18 + 2 = 158 bytes per batch
+TELEMETRY_FLUSH_MS = 300_000     # send a partial batch once this old
+TELEMETRY_RETRY_MS = 1000        # wait after a failed send
+
+# ======= Wire Format (little endian) =======
+# Batch: header, count records, checksum (16-bit sum of all bytes before)
+#   header "<2sBBIHH": b"TL", version, count, device id, batch seq, merged
+#   record "<IHHHHHHH": t_ms (end of the last cycle), cycles, wait_ms,
+#   walk_ms (means over the cycles), flow (raw 0-4095), fines, loop
+#   passes, longest pass (us)
+# merged counts cycles folded into a record because the ring was full.
+MAGIC = b"TL"
+VERSION = 1
+HEADER_SIZE = 12
+RECORD_SIZE = 18
+CHECKSUM_SIZE = 2
+
+# Field offsets inside a record
+_F_TIME = 0
+_F_CYCLES = 4
+_F_WAIT = 6
+_F_WALK = 8
+_F_FLOW = 10
+_F_FINES = 12
+_F_PASSES = 14
+_F_PASS_MAX = 16
+
+_ring = None          # allocated by init_telemetry() when enabled
+_head = 0             # records queued (monotonic)
+_tail = 0             # records sent (monotonic)
+_oldest_ms = 0
+_frame = None
+_frame_views = ()     # one view per batch size, so sending allocates nothing
+_uart = None
+_sock = None
+_addr = None
+_device_id = 0
+_seq = 0
+_retry_ms = 0
+_failing = False
+
+# Current cycle
+_wait_start_ms = 0
+_ped_start_ms = 0
+_wait_ms = 0
+_walk_ms = 0
+_passes = 0
+_pass_max_us = 0
+
+# Statistics
+_cycles = 0
+_merged = 0
+_batches = 0
+_send_errors = 0
+_busy = 0             # sends skipped because the link was still busy
+
+
+def init_telemetry():
+    """Open the link and allocate the buffers. Does nothing unless enabled."""
+    global _ring, _head, _tail, _frame, _frame_views, _uart, _sock, _addr
+    global _device_id, _seq, _failing, _passes, _pass_max_us
+    global _cycles, _merged, _batches, _send_errors, _busy, TELEMETRY_ENABLED
+    _head = 0
+    _tail = 0
+    _seq = 0
+    _failing = False
+    _passes = 0
+    _pass_max_us = 0
+    _cycles = 0
+    _merged = 0
+    _batches = 0
+    _send_errors = 0
+    _busy = 0
+    if not TELEMETRY_ENABLED:
+        return
+
+    _device_id = TELEMETRY_DEVICE_ID
+    if not _device_id:
+        uid = unique_id()
+        for b in uid[-4:]:
+            _device_id = (_device_id << 8) | b
+
+    if _ring is None:
+        _ring = bytearray(TELEMETRY_RING_RECORDS * RECORD_SIZE)
+        _frame = bytearray(frame_size(TELEMETRY_BATCH_RECORDS))
+        view = memoryview(_frame)
+        _frame_views = tuple(view[:frame_size(n)]
+                             for n in range(1, TELEMETRY_BATCH_RECORDS + 1))
+    # Constant header fields, written once (the id may be a long int)
+    _frame[0] = MAGIC[0]
+    _frame[1] = MAGIC[1]
+    _frame[2] = VERSION
+    _put32(_frame, 4, _device_id)
+
+    try:
+        if TELEMETRY_TRANSPORT == TRANSPORT_UDP:
+            import socket
+            _addr = socket.getaddrinfo(TELEMETRY_UDP_HOST, TELEMETRY_UDP_PORT)[0][-1]
+            _sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            _sock.setblocking(False)
+        else:
+            _uart = UART(TELEMETRY_UART_ID, baudrate=TELEMETRY_UART_BAUD,
+                         tx=TELEMETRY_UART_TX_PIN, txbuf=2 * len(_frame))
+    except OSError as e:
+        print("Telemetry link failed, disabled:", e)
+        TELEMETRY_ENABLED = False
+
+
+def frame_size(count):
+    """Bytes of a batch holding count records."""
+    return HEADER_SIZE + count * RECORD_SIZE + CHECKSUM_SIZE
+
+
+def _get16(buf, i):
+    return buf[i] | (buf[i + 1] << 8)
+
+
+def _put16(buf, i, value):
+    if value > 0xFFFF:
+        value = 0xFFFF
+    buf[i] = value & 0xFF
+    buf[i + 1] = (value >> 8) & 0xFF
+
+
+def _put32(buf, i, value):
+    buf[i] = value & 0xFF
+    buf[i + 1] = (value >> 8) & 0xFF
+    buf[i + 2] = (value >> 16) & 0xFF
+    buf[i + 3] = (value >> 24) & 0xFF
+
+
+def note_pass(duration_us):
+    """Called by the main loop after every pass."""
+    global _passes, _pass_max_us
+    _passes += 1
+    if duration_us > _pass_max_us:
+        _pass_max_us = duration_us
+
+
+def note_phase(state, now_ms):
+    """Called when the traffic phase changes; a return to car green ends a cycle."""
+    global _wait_start_ms, _ped_start_ms, _wait_ms, _walk_ms
+    if _ring is None or not TELEMETRY_ENABLED:
+        return
+    if state == traffic.TRAFFIC_WAIT_BEFORE_PED:
+        _wait_start_ms = now_ms
+    elif state == traffic.TRAFFIC_PED_GREEN:
+        _wait_ms = time.ticks_diff(now_ms, _wait_start_ms)
+        _ped_start_ms = now_ms
+    elif state == traffic.TRAFFIC_TRANSITION_TO_CAR:
+        _walk_ms = time.ticks_diff(now_ms, _ped_start_ms)
+    elif state == traffic.TRAFFIC_CAR_GREEN:
+        _add_cycle(now_ms)
+
+
+def _add_cycle(now_ms):
+    """Queue the finished cycle, or fold it into the newest record if the ring is full."""
+    global _head, _oldest_ms, _cycles, _merged, _passes, _pass_max_us
+    _cycles += 1
+    buf = _ring
+    if _head - _tail >= TELEMETRY_RING_RECORDS:
+        # Backpressure: aggregate instead of dropping
+        i = ((_head - 1) % TELEMETRY_RING_RECORDS) * RECORD_SIZE
+        n = _get16(buf, i + _F_CYCLES)
+        _put16(buf, i + _F_WAIT, (_get16(buf, i + _F_WAIT) * n + _wait_ms) // (n + 1))
+        _put16(buf, i + _F_WALK, (_get16(buf, i + _F_WALK) * n + _walk_ms) // (n + 1))
+        _put16(buf, i + _F_CYCLES, n + 1)
+        _put16(buf, i + _F_PASSES, _get16(buf, i + _F_PASSES) + _passes)
+        if _pass_max_us > _get16(buf, i + _F_PASS_MAX):
+            _put16(buf, i + _F_PASS_MAX, _pass_max_us)
+        _merged += 1
+    else:
+        if _head == _tail:
+            _oldest_ms = now_ms
+        i = (_head % TELEMETRY_RING_RECORDS) * RECORD_SIZE
+        _put16(buf, i + _F_CYCLES, 1)
+        _put16(buf, i + _F_WAIT, _wait_ms)
+        _put16(buf, i + _F_WALK, _walk_ms)
+        _put16(buf, i + _F_PASSES, _passes)
+        _put16(buf, i + _F_PASS_MAX, _pass_max_us)
+        _head += 1
+    _put32(buf, i + _F_TIME, now_ms)
+    _put16(buf, i + _F_FLOW, traffic_flow.get_flow_raw())
+    _put16(buf, i + _F_FINES, violation.get_fines())
+    _passes = 0
+    _pass_max_us = 0
+
+
+def _build_frame(count):
+    """Count, seq, the count oldest records and the checksum into _frame."""
+    frame = _frame
+    frame[3] = count
+    _put16(frame, 8, _seq)
+    frame[10] = _merged & 0xFF
+    frame[11] = (_merged >> 8) & 0xFF
+    pos = HEADER_SIZE
+    for r in range(count):
+        src = ((_tail + r) % TELEMETRY_RING_RECORDS) * RECORD_SIZE
+        for k in range(RECORD_SIZE):
+            frame[pos + k] = _ring[src + k]
+        pos += RECORD_SIZE
+    total = 0
+    for k in range(pos):
+        total += frame[k]
+    frame[pos] = total & 0xFF
+    frame[pos + 1] = (total >> 8) & 0xFF
+
+
+def _send(now_ms):
+    """Send one batch if the link can take it right now."""
+    global _tail, _seq, _batches, _send_errors, _busy, _retry_ms, _failing
+    global _oldest_ms
+    if _uart is not None and not _uart.txdone():
+        _busy += 1
+        _retry_ms = time.ticks_add(now_ms, TELEMETRY_RETRY_MS)
+        _failing = True
+        return
+    count = _head - _tail
+    if count > TELEMETRY_BATCH_RECORDS:
+        count = TELEMETRY_BATCH_RECORDS
+    _build_frame(count)
+    try:
+        if _uart is not None:
+            _uart.write(_frame_views[count - 1])
+        else:
+            _sock.sendto(_frame_views[count - 1], _addr)
+    except OSError:
+        # e.g. EAGAIN with the Wi-Fi queue full: keep the batch
+        _send_errors += 1
+        _retry_ms = time.ticks_add(now_ms, TELEMETRY_RETRY_MS)
+        _failing = True
+        return
+    _failing = False
+    _tail += count
+    _seq = (_seq + 1) & 0xFFFF
+    _batches += 1
+    _oldest_ms = now_ms   # the rest waits at most another TELEMETRY_FLUSH_MS
+
+
+def is_sending():
+    """True while the UART still shifts out a batch."""
+    return _uart is not None and not _uart.txdone()
+
+
+def next_deadline_ms(now_ms):
+    """Return the tick of the next batch, or None with nothing queued."""
+    if not TELEMETRY_ENABLED or _head == _tail:
+        return None
+    if _failing:
+        return _retry_ms
+    if _head - _tail >= TELEMETRY_BATCH_RECORDS:
+        return now_ms
+    return time.ticks_add(_oldest_ms, TELEMETRY_FLUSH_MS)
+
+
+def update_telemetry(now_ms):
+    """
+    Send a batch once TELEMETRY_BATCH_RECORDS are queued or the oldest
+    waited TELEMETRY_FLUSH_MS. Called periodically in the main loop.
+    """
+    if not TELEMETRY_ENABLED or _head == _tail:
+        return
+    if _failing and time.ticks_diff(now_ms, _retry_ms) < 0:
+        return
+    if _head - _tail >= TELEMETRY_BATCH_RECORDS or \
+            time.ticks_diff(now_ms, _oldest_ms) >= TELEMETRY_FLUSH_MS:
+        _send(now_ms)
+
+
+def report():
+    """Print telemetry statistics (call from the REPL)."""
+    print("device {:08x}  cycles: {}  queued: {}  merged: {}".format(
+        _device_id, _cycles, _head - _tail, _merged))
+    print("batches: {}  send errors: {}  link busy: {}".format(
+        _batches, _send_errors, _busy))
@@ -0,0 +1,182 @@
+# tone.py
+from array import array
+from machine import Timer
+import hardware
+
+# ======= Tone Sequencer =======
+# Buzzer tones driven by a hardware timer. A pattern is a flat array of
+# (freq_hz, duty, duration_ms) triples; the timer callback applies one
+# step and re-arms itself for the step's duration, so tone edges do not
+# depend on when the main loop runs. The crossing beeps are generated
+# step by step from the remaining pedestrian time, with the same
+# interval rule as buzzer.py.
+
+# Single switch: when False buzzer.py times the beeps in the main loop
+TONE_SEQUENCER_ENABLED = True
+TONE_TIMER_ID = 0
+
+BEEP_DUTY = 512
+BEEP_PULSE_MS = 50
+MIN_INTERVAL_MS = 100
+MAX_INTERVAL_MS = 400
+
+# (freq_hz, duty, duration_ms); freq 0 keeps the current frequency
+CONFIRM_PATTERN = array('H', [
+    0, BEEP_DUTY, 100,   # first beep
+    0, 0, 50,            # silence
+    0, BEEP_DUTY, 100,   # second beep
+])
+
+MODE_IDLE = 0
+MODE_PATTERN = 1
+MODE_CROSSING = 2
+
+_timer = None
+_mode = MODE_IDLE
+
+# Pattern playback
+_pattern = CONFIRM_PATTERN
+_step = 0
+
+# Crossing beeps, in ms from the start of the pedestrian green
+_cross_total_ms = 0
+_cross_beep_ms = 0      # start of the current / last beep
+_cross_next_ms = 0      # start of the upcoming beep
+_cross_on = False
+_cross_last = False     # stop after the current beep
+
+
+def pattern_ms(pattern):
+    """Total duration of a pattern."""
+    total = 0
+    for i in range(2, len(pattern), 3):
+        total += pattern[i]
+    return total
+
+
+def init_tone():
+    """Create the timer and make sure the buzzer is silent."""
+    global _timer, _mode
+    _mode = MODE_IDLE
+    if _timer is not None:
+        _timer.deinit()
+    _timer = Timer(TONE_TIMER_ID)
+    hardware.set_buzzer_duty(0)
+
+
+def is_playing():
+    return _mode != MODE_IDLE
+
+
+def stop():
+    """Silence the buzzer and cancel whatever is playing."""
+    global _mode
+    if _timer is not None:
+        _timer.deinit()
+    _mode = MODE_IDLE
+    hardware.set_buzzer_duty(0)
+
+
+def finish():
+    """Stop after the beep being played (if any) has ended."""
+    global _cross_last
+    if _mode == MODE_CROSSING and _cross_on:
+        _cross_last = True
+    else:
+        stop()
+
+
+def _arm(delay_ms):
+    if delay_ms < 1:
+        delay_ms = 1
+    _timer.init(mode=Timer.ONE_SHOT, period=delay_ms, callback=_on_timer)
+
+
+def _apply_step():
+    """Output the current pattern step and arm the timer for its end."""
+    base = _step * 3
+    freq = _pattern[base]
+    if freq:
+        hardware.set_buzzer_freq(freq)
+    hardware.set_buzzer_duty(_pattern[base + 1])
+    _arm(_pattern[base + 2])
+
+
+def play(pattern):
+    """Start a pattern now; the buzzer is silent again when it ends."""
+    global _mode, _pattern, _step
+    stop()
+    _pattern = pattern
+    _step = 0
+    _mode = MODE_PATTERN
+    _apply_step()
+
+
+def _next_beep_ms(last_ms):
+    """
+    First time t (ms into the crossing) with
+        t - last_ms >= MIN + (total - t) * (MAX - MIN) // total,
+    i.e. when the loop-timed buzzer would start the next beep.
+    """
+    total = _cross_total_ms
+    span = MAX_INTERVAL_MS - MIN_INTERVAL_MS
+    low = last_ms + MIN_INTERVAL_MS
+    high = last_ms + MAX_INTERVAL_MS
+    while low < high:
+        mid = (low + high) >> 1
+        remaining = total - mid
+        if remaining < 0:
+            remaining = 0
+        if mid - last_ms >= MIN_INTERVAL_MS + remaining * span // total:
+            high = mid
+        else:
+            low = mid + 1
+    return low
+
+
+def play_crossing(elapsed_ms, total_ms):
+    """
+    Start the accelerating crossing beeps for a pedestrian phase of
+    total_ms that started elapsed_ms ago.
+    """
+    global _mode, _cross_total_ms, _cross_beep_ms, _cross_next_ms
+    global _cross_on, _cross_last
+    stop()
+    if total_ms <= 0:
+        return
+    _cross_total_ms = total_ms
+    _cross_beep_ms = 0
+    _cross_next_ms = _next_beep_ms(0)
+    _cross_on = False
+    _cross_last = False
+    _mode = MODE_CROSSING
+    _arm(_cross_next_ms - elapsed_ms)
+
+
+def _on_timer(timer):
+    """Timer callback: end of a step. Integer work only, no allocation."""
+    global _mode, _step, _cross_beep_ms, _cross_next_ms, _cross_on
+
+    if _mode == MODE_PATTERN:
+        _step += 1
+        if _step * 3 >= len(_pattern):
+            hardware.set_buzzer_duty(0)
+            _mode = MODE_IDLE
+        else:
+            _apply_step()
+
+    elif _mode == MODE_CROSSING:
+        if _cross_on:
+            # End of a beep: schedule the next one while time remains
+            hardware.set_buzzer_duty(0)
+            _cross_on = False
+            _cross_next_ms = _next_beep_ms(_cross_beep_ms)
+            if _cross_last or _cross_next_ms >= _cross_total_ms:
+                _mode = MODE_IDLE
+            else:
+                _arm(_cross_next_ms - _cross_beep_ms - BEEP_PULSE_MS)
+        else:
+            hardware.set_buzzer_duty(BEEP_DUTY)
+            _cross_on = True
+            _cross_beep_ms = _cross_next_ms
+            _arm(BEEP_PULSE_MS)
@@ -0,0 +1,179 @@
+# trace_log.py
+import os
+import time
+from machine import disable_irq, enable_irq
+
+# ======= Binary Trace Recorder =======
+# Every input sample and output change goes into a RAM ring of fixed
+# 8-byte records, written to flash in bulk. sim/replay.py feeds a trace
+# back through the FSMs on the host and diffs the outputs.
+TRACE_ENABLED = False
+
+TRACE_PATH = "/trace.bin"       # current file
+TRACE_OLD_PATH = "/trace.0.bin" # previous file, kept after rotation
+TRACE_MAX_BYTES = 256 * 1024    # rotate the file beyond this size
+
+TRACE_RING_RECORDS = 512        # 4 KB of RAM
+TRACE_FLUSH_RECORDS = 256       # flush once this many are waiting
+TRACE_FLUSH_MS = 10_000         # ... or once the oldest is this old
+
+# ticks_ms, kind, channel, value
+RECORD_FORMAT = "<IBBH"
+RECORD_SIZE = 8
+FILE_MAGIC = b"TRC1"
+
+# ======= Record Kinds =======
+K_BOOT = 0      # value: 0
+K_INPUT = 1     # channel: input_events.CH_*, value: pin level
+K_ADC = 2       # value: raw ADC sample
+K_OUTPUT = 3    # channel: hardware.OUT_*, value: pin level
+K_BUZZER = 4    # channel: 0 duty / 1 frequency, value
+K_DISPLAY = 5   # channel: display screen, value: countdown (0xFFFF = none)
+
+KIND_NAMES = ("boot", "input", "adc", "output", "buzzer", "display")
+
+_ring = None         # allocated by init_trace_log() when tracing
+_head = 0            # records written (monotonic)
+_tail = 0            # records flushed (monotonic)
+_oldest_ms = 0       # tick of the oldest unflushed record
+_last_adc = -1
+
+# Overhead and loss statistics
+_dropped = 0
+_flushes = 0
+_flush_max_us = 0
+_flush_total_us = 0
+_file_bytes = 0
+
+
+def init_trace_log(now_ms):
+    """
+    Reset the ring and start the trace with a boot record.
+    Does nothing (and uses no RAM) unless TRACE_ENABLED is set.
+    """
+    global _ring, _head, _tail, _last_adc, _dropped
+    global _flushes, _flush_max_us, _flush_total_us, _file_bytes
+    _head = 0
+    _tail = 0
+    _last_adc = -1
+    _dropped = 0
+    _flushes = 0
+    _flush_max_us = 0
+    _flush_total_us = 0
+    if not TRACE_ENABLED:
+        return
+    if _ring is None:
+        _ring = bytearray(TRACE_RING_RECORDS * RECORD_SIZE)
+    try:
+        _file_bytes = os.stat(TRACE_PATH)[6]
+    except OSError:
+        _file_bytes = 0
+    record(now_ms, K_BOOT, 0, 0)
+
+
+def record(t_ms, kind, channel, value):
+    """
+    Append one record (no allocation). Called from the main loop and
+    from soft IRQ handlers (pin edges, tone timer): the slot is reserved
+    with interrupts off, so a handler that runs meanwhile takes the next
+    one. Records are dropped and counted when the ring is full.
+    """
+    global _head, _oldest_ms, _dropped
+    state = disable_irq()
+    head = _head
+    if head - _tail >= TRACE_RING_RECORDS:
+        _dropped += 1
+        enable_irq(state)
+        return
+    if head == _tail:
+        _oldest_ms = t_ms
+    _head = head + 1
+    enable_irq(state)
+
+    i = (head % TRACE_RING_RECORDS) * RECORD_SIZE
+    buf = _ring
+    buf[i] = t_ms & 0xFF
+    buf[i + 1] = (t_ms >> 8) & 0xFF
+    buf[i + 2] = (t_ms >> 16) & 0xFF
+    buf[i + 3] = (t_ms >> 24) & 0xFF
+    buf[i + 4] = kind
+    buf[i + 5] = channel
+    buf[i + 6] = value & 0xFF
+    buf[i + 7] = (value >> 8) & 0xFF
+
+
+def record_adc(t_ms, raw):
+    """Record an ADC sample if it differs from the last one recorded."""
+    global _last_adc
+    if raw != _last_adc:
+        _last_adc = raw
+        record(t_ms, K_ADC, 0, raw)
+
+
+def flush():
+    """Write all waiting records to TRACE_PATH, rotating it when full."""
+    global _tail, _flushes, _flush_max_us, _flush_total_us, _file_bytes
+    global TRACE_ENABLED
+
+    head = _head   # records added by IRQs meanwhile wait for the next flush
+    if head == _tail:
+        return
+    start = time.ticks_us()
+    try:
+        if _file_bytes >= TRACE_MAX_BYTES:
+            try:
+                os.remove(TRACE_OLD_PATH)
+            except OSError:
+                pass
+            os.rename(TRACE_PATH, TRACE_OLD_PATH)
+            _file_bytes = 0
+        with open(TRACE_PATH, "ab") as f:
+            if _file_bytes == 0:
+                f.write(FILE_MAGIC)
+                _file_bytes = len(FILE_MAGIC)
+            view = memoryview(_ring)
+            first = _tail % TRACE_RING_RECORDS
+            count = head - _tail
+            # At most two chunks: up to the end of the ring, then from 0
+            chunk = min(count, TRACE_RING_RECORDS - first)
+            f.write(view[first * RECORD_SIZE:(first + chunk) * RECORD_SIZE])
+            if count > chunk:
+                f.write(view[0:(count - chunk) * RECORD_SIZE])
+            _file_bytes += count * RECORD_SIZE
+    except OSError as e:
+        print("Trace write failed:", e)
+        TRACE_ENABLED = False
+    _tail = head
+
+    elapsed = time.ticks_diff(time.ticks_us(), start)
+    _flushes += 1
+    _flush_total_us += elapsed
+    if elapsed > _flush_max_us:
+        _flush_max_us = elapsed
+
+
+def next_deadline_ms(now_ms):
+    """Return the tick of the next time-based flush, or None."""
+    if not TRACE_ENABLED or _head == _tail:
+        return None
+    return time.ticks_add(_oldest_ms, TRACE_FLUSH_MS)
+
+
+def update_trace_log(now_ms):
+    """
+    Flush in bulk when enough records are waiting or the oldest one
+    is TRACE_FLUSH_MS old. Called periodically in the main loop.
+    """
+    if _head == _tail:
+        return
+    if _head - _tail >= TRACE_FLUSH_RECORDS or \
+            time.ticks_diff(now_ms, _oldest_ms) >= TRACE_FLUSH_MS:
+        flush()
+
+
+def report():
+    """Print recorder statistics (call from the REPL)."""
+    print("records: {}  dropped: {}  file: {} bytes".format(_head, _dropped, _file_bytes))
+    if _flushes:
+        print("flushes: {}  max {} us  mean {} us".format(
+            _flushes, _flush_max_us, _flush_total_us // _flushes))
@@ -1,181 +1,267 @@
-# traffic.py
-import time
-import hardware
-import traffic_flow
-
-# ======= Traffic States =======
-TRAFFIC_CAR_GREEN = 0
-TRAFFIC_WAIT_BEFORE_PED = 1
-TRAFFIC_PED_GREEN = 2
-TRAFFIC_TRANSITION_TO_CAR = 3
-TRAFFIC_YELLOW_BEFORE_PED = 4
-
-# ======= Internal State =======
-traffic_state = TRAFFIC_CAR_GREEN
-traffic_state_start_ms = time.ticks_ms()
-
-wait_before_ped_ms = 0
-ped_green_ms = 0
-
-# Interaction flags
-_pedestrian_request = False
-_crossing_active = False
-
-
-def init_traffic():
-    """
-    Initialize traffic state machine:
-    - Cars start with green
-    - Pedestrians start with red
-    """
-    global traffic_state, traffic_state_start_ms
-    global wait_before_ped_ms, ped_green_ms
-    global _pedestrian_request, _crossing_active
-
-    traffic_state = TRAFFIC_CAR_GREEN
-    traffic_state_start_ms = time.ticks_ms()
-    wait_before_ped_ms = 0
-    ped_green_ms = 0
-    _pedestrian_request = False
-    _crossing_active = False
-
-    hardware.set_car_lights(False, False, True)   # green for cars
-    hardware.set_ped_lights(True, False)          # red for pedestrians
-
-
-def request_pedestrian():
-    """Called when the pedestrian presses the crossing button."""
-    global _pedestrian_request
-    _pedestrian_request = True
-
-
-def is_crossing_active():
-    """True while pedestrians are allowed to cross the street."""
-    return _crossing_active
-
-
-def is_pedestrian_green():
-    """True if the pedestrian light is green ."""
-    return traffic_state == TRAFFIC_PED_GREEN
-
-
-def is_car_red():
-    """
-    True if the car traffic light should be red.
-    """
-    return traffic_state in (TRAFFIC_PED_GREEN, TRAFFIC_TRANSITION_TO_CAR)
-
-
-def get_state():
-    """Return the current traffic state ."""
-    return traffic_state
-
-
-def get_wait_remaining_ms(now_ms):
-    """
-    Return remaining milliseconds in the WAIT_BEFORE_PED phase.
-    Returns 0 if not in that state.
-    """
-    if traffic_state != TRAFFIC_WAIT_BEFORE_PED:
-        return 0
-    elapsed = time.ticks_diff(now_ms, traffic_state_start_ms)
-    remaining = wait_before_ped_ms - elapsed
-    if remaining < 0:
-        remaining = 0
-    return remaining
-
-
-def get_ped_remaining_and_total_ms(now_ms):
-    """
-    Return (remaining_ms, total_ms) for the pedestrian green phase.
-    If not in pedestrian green, remaining_ms = 0.
-    """
-    if traffic_state != TRAFFIC_PED_GREEN:
-        return 0, ped_green_ms
-    elapsed = time.ticks_diff(now_ms, traffic_state_start_ms)
-    remaining = ped_green_ms - elapsed
-    if remaining < 0:
-        remaining = 0
-    return remaining, ped_green_ms
-
-
-def get_ped_ratio(now_ms):
-    """
-    Return remaining fraction of pedestrian green time (0.0–1.0).
-    Used by the buzzer to adjust beep speed.
-    """
-    remaining, total = get_ped_remaining_and_total_ms(now_ms)
-    if total <= 0:
-        return 0.0
-    return float(remaining) / float(total)
-
-
-def update_traffic_state(now_ms):
-    """
-    Main state machine for the traffic lights.
-    Called periodically in the main loop.
-    """
-    global traffic_state, traffic_state_start_ms
-    global wait_before_ped_ms, ped_green_ms
-    global _pedestrian_request, _crossing_active
-
-    # 1. Car green (default state)
-    if traffic_state == TRAFFIC_CAR_GREEN:
-        hardware.set_car_lights(False, False, True)
-        hardware.set_ped_lights(True, False)
-        _crossing_active = False
-
-        if _pedestrian_request:
-            wait_before_ped_ms = traffic_flow.compute_wait_before_walk_ms()
-            traffic_state_start_ms = now_ms
-            traffic_state = TRAFFIC_WAIT_BEFORE_PED
-
-    # 2. Waiting before pedestrian green (cars still green)
-    elif traffic_state == TRAFFIC_WAIT_BEFORE_PED:
-        hardware.set_car_lights(False, False, True)
-        hardware.set_ped_lights(True, False)
-
-        elapsed = time.ticks_diff(now_ms, traffic_state_start_ms)
-        if elapsed >= wait_before_ped_ms:
-            hardware.set_car_lights(False, True, False)  # yellow
-            traffic_state_start_ms = now_ms
-            traffic_state = TRAFFIC_YELLOW_BEFORE_PED
-
-    # 3. Yellow phase before pedestrians
-    elif traffic_state == TRAFFIC_YELLOW_BEFORE_PED:
-        hardware.set_car_lights(False, True, False)
-        hardware.set_ped_lights(True, False)
-
-        elapsed = time.ticks_diff(now_ms, traffic_state_start_ms)
-        if elapsed >= 3000:  # 3 seconds
-            # Close car traffic, open for pedestrians
-            hardware.set_car_lights(True, False, False)   # red for cars
-            hardware.set_ped_lights(False, True)          # green for pedestrians
-
-            ped_green_ms = traffic_flow.compute_ped_green_ms()
-            traffic_state_start_ms = now_ms
-            traffic_state = TRAFFIC_PED_GREEN
-
-            _crossing_active = True
-            _pedestrian_request = False
-
-    # 4. Pedestrian green (crossing active)
-    elif traffic_state == TRAFFIC_PED_GREEN:
-        _pedestrian_request = False
-        elapsed = time.ticks_diff(now_ms, traffic_state_start_ms)
-        if elapsed >= ped_green_ms:
-            hardware.set_ped_lights(True, False)          # red for pedestrians
-            hardware.set_car_lights(True, False, False)    # red for cars
-            traffic_state_start_ms = now_ms
-            traffic_state = TRAFFIC_TRANSITION_TO_CAR
-            _crossing_active = False
-
-    # 5. Transition back to car green (1 second)
-    elif traffic_state == TRAFFIC_TRANSITION_TO_CAR:
-        elapsed = time.ticks_diff(now_ms, traffic_state_start_ms)
-        if elapsed >= 1000:  # 1 second
-            hardware.set_car_lights(False, False, True)   # green for cars
-            hardware.set_ped_lights(True, False)          # red for pedestrians
-            traffic_state = TRAFFIC_CAR_GREEN
-            traffic_state_start_ms = now_ms
-
+# traffic.py
+import time
+from array import array
+import hardware
+import traffic_flow
+import demand
+
+# ======= Traffic States =======
+TRAFFIC_CAR_GREEN = 0
+TRAFFIC_WAIT_BEFORE_PED = 1
+TRAFFIC_PED_GREEN = 2
+TRAFFIC_TRANSITION_TO_CAR = 3
+TRAFFIC_YELLOW_BEFORE_PED = 4
+
+# ======= Phase Plan =======
+# Each phase: (state, light pattern, duration, next state)
+# Duration is a fixed time in ms or one of the DUR_* sources below.
+# The plan is compiled once into per-state tables, so adding a phase
+# only adds a row here and costs nothing on the hot path.
+DUR_ON_REQUEST = -1   # stay until a pedestrian request arrives
+DUR_FLOW_WAIT = -2    # traffic_flow.compute_wait_before_walk_ms(), see demand.py
+DUR_FLOW_WALK = -3    # traffic_flow.compute_ped_green_ms()
+
+PHASE_PLAN = (
+    # 1. Car green (default state)
+    (TRAFFIC_CAR_GREEN,
+     hardware.LIGHT_T_GREEN | hardware.LIGHT_P_RED,
+     DUR_ON_REQUEST, TRAFFIC_WAIT_BEFORE_PED),
+    # 2. Waiting before pedestrian green (cars still green)
+    (TRAFFIC_WAIT_BEFORE_PED,
+     hardware.LIGHT_T_GREEN | hardware.LIGHT_P_RED,
+     DUR_FLOW_WAIT, TRAFFIC_YELLOW_BEFORE_PED),
+    # 3. Yellow phase before pedestrians (3 seconds)
+    (TRAFFIC_YELLOW_BEFORE_PED,
+     hardware.LIGHT_T_YELLOW | hardware.LIGHT_P_RED,
+     3000, TRAFFIC_PED_GREEN),
+    # 4. Pedestrian green (crossing active)
+    (TRAFFIC_PED_GREEN,
+     hardware.LIGHT_T_RED | hardware.LIGHT_P_GREEN,
+     DUR_FLOW_WALK, TRAFFIC_TRANSITION_TO_CAR),
+    # 5. All red, then back to car green (1 second)
+    (TRAFFIC_TRANSITION_TO_CAR,
+     hardware.LIGHT_T_RED | hardware.LIGHT_P_RED,
+     1000, TRAFFIC_CAR_GREEN),
+)
+
+
+def compile_plan(plan):
+    """
+    Turn a phase plan into flat per-state lookup tables:
+    (pattern, duration, next, car_red, ped_green).
+    """
+    size = 0
+    for phase in plan:
+        if phase[0] + 1 > size:
+            size = phase[0] + 1
+    pattern_t = bytearray(size)
+    duration_t = array('i', [0] * size)
+    next_t = bytearray(size)
+    car_red_t = bytearray(size)
+    ped_green_t = bytearray(size)
+    for state, pattern, duration, nxt in plan:
+        pattern_t[state] = pattern
+        duration_t[state] = duration
+        next_t[state] = nxt
+        car_red_t[state] = 1 if pattern & hardware.LIGHT_T_RED else 0
+        ped_green_t[state] = 1 if pattern & hardware.LIGHT_P_GREEN else 0
+    return pattern_t, duration_t, next_t, car_red_t, ped_green_t
+
+
+# ======= Compiled Tables (indexed by state) =======
+# _pattern: light pattern of each phase
+# _duration: fixed duration or DUR_* source
+# _next: next state
+# _car_red / _ped_green: 1 if cars see red / pedestrians see green
+# _phase_ms: current / last duration of each phase
+_pattern, _duration, _next, _car_red, _ped_green = compile_plan(PHASE_PLAN)
+_phase_ms = array('i', [0] * len(_pattern))
+
+# ======= Internal State =======
+traffic_state = TRAFFIC_CAR_GREEN
+traffic_state_start_ms = time.ticks_ms()
+_car_red_start_ms = 0
+_car_red_end_ms = 0      # when the car light last left red
+
+# Interaction flags
+_pedestrian_request = False
+_crossing_active = False
+
+
+def init_traffic():
+    """
+    Initialize traffic state machine:
+    - Cars start with green
+    - Pedestrians start with red
+    """
+    global _pedestrian_request
+
+    for i in range(len(_phase_ms)):
+        _phase_ms[i] = 0
+    _pedestrian_request = False
+    _enter(TRAFFIC_CAR_GREEN, time.ticks_ms())
+
+
+def _enter(state, now_ms):
+    """Switch to a phase: lights, duration and flags come from the tables."""
+    global traffic_state, traffic_state_start_ms, _car_red_start_ms, _car_red_end_ms
+    global _pedestrian_request, _crossing_active
+
+    if _car_red[state] and not _car_red[traffic_state]:
+        _car_red_start_ms = now_ms
+    elif _car_red[traffic_state] and not _car_red[state]:
+        _car_red_end_ms = now_ms
+    left_ms = time.ticks_diff(now_ms, traffic_state_start_ms)  # time in the phase left
+
+    traffic_state = state
+    traffic_state_start_ms = now_ms
+    hardware.commit_lights(_pattern[state])
+
+    duration = _duration[state]
+    if duration == DUR_FLOW_WAIT:
+        duration = traffic_flow.compute_wait_before_walk_ms()
+        if demand.DEMAND_ENABLED:
+            # Entered from car green: left_ms is the car green so far
+            duration = demand.adjust_wait_ms(duration, left_ms, now_ms)
+    elif duration == DUR_FLOW_WALK:
+        duration = traffic_flow.compute_ped_green_ms()
+    _phase_ms[state] = duration
+
+    _crossing_active = _ped_green[state] == 1
+    if _crossing_active:
+        _pedestrian_request = False
+
+
+def request_pedestrian():
+    """Called when the pedestrian presses the crossing button."""
+    global _pedestrian_request
+    _pedestrian_request = True
+
+
+def is_crossing_active():
+    """True while pedestrians are allowed to cross the street."""
+    return _crossing_active
+
+
+def is_pedestrian_green():
+    """True if the pedestrian light is green ."""
+    return _ped_green[traffic_state] == 1
+
+
+def is_car_red():
+    """
+    True if the car traffic light should be red.
+    """
+    return _car_red[traffic_state] == 1
+
+
+def was_car_red_at(t_ms):
+    """
+    True if the car light was red at tick t_ms, a recent past time such
+    as an edge timestamp (only the last red period is remembered).
+    """
+    if time.ticks_diff(t_ms, _car_red_start_ms) < 0:
+        return False
+    return is_car_red() or time.ticks_diff(t_ms, _car_red_end_ms) < 0
+
+
+def get_car_red_elapsed_ms(t_ms):
+    """
+    Return how long the car light had been red at tick t_ms (0 if it
+    was not red then).
+    """
+    if not was_car_red_at(t_ms):
+        return 0
+    return time.ticks_diff(t_ms, _car_red_start_ms)
+
+
+def get_state():
+    """Return the current traffic state ."""
+    return traffic_state
+
+
+def get_state_start_ms():
+    """Tick at which the current phase started."""
+    return traffic_state_start_ms
+
+
+def get_phase_ms():
+    """Duration of the current phase (negative while it waits for a request)."""
+    return _phase_ms[traffic_state]
+
+
+def get_wait_remaining_ms(now_ms):
+    """
+    Return remaining milliseconds in the WAIT_BEFORE_PED phase.
+    Returns 0 if not in that state.
+    """
+    if traffic_state != TRAFFIC_WAIT_BEFORE_PED:
+        return 0
+    elapsed = time.ticks_diff(now_ms, traffic_state_start_ms)
+    remaining = _phase_ms[TRAFFIC_WAIT_BEFORE_PED] - elapsed
+    if remaining < 0:
+        remaining = 0
+    return remaining
+
+
+def get_ped_remaining_and_total_ms(now_ms):
+    """
+    Return (remaining_ms, total_ms) for the pedestrian green phase.
+    If not in pedestrian green, remaining_ms = 0.
+    Allocates a tuple: the main loop uses get_ped_remaining_ms() and
+    get_ped_total_ms() instead.
+    """
+    return get_ped_remaining_ms(now_ms), _phase_ms[TRAFFIC_PED_GREEN]
+
+
+def get_ped_remaining_ms(now_ms):
+    """Remaining pedestrian green time (0 outside the crossing phase)."""
+    if traffic_state != TRAFFIC_PED_GREEN:
+        return 0
+    remaining = _phase_ms[TRAFFIC_PED_GREEN] - time.ticks_diff(now_ms, traffic_state_start_ms)
+    return remaining if remaining > 0 else 0
+
+
+def get_ped_total_ms():
+    """Duration of the current (or last) pedestrian green phase."""
+    return _phase_ms[TRAFFIC_PED_GREEN]
+
+
+def get_ped_ratio(now_ms):
+    """
+    Return remaining fraction of pedestrian green time (0.0–1.0).
+    Used by the buzzer to adjust beep speed.
+    """
+    remaining, total = get_ped_remaining_and_total_ms(now_ms)
+    if total <= 0:
+        return 0.0
+    return float(remaining) / float(total)
+
+
+def next_deadline_ms(now_ms):
+    """
+    Return the tick at which the current phase ends, or None while
+    waiting for a pedestrian request that has not arrived.
+    """
+    if _duration[traffic_state] == DUR_ON_REQUEST:
+        return now_ms if _pedestrian_request else None
+    return time.ticks_add(traffic_state_start_ms, _phase_ms[traffic_state])
+
+
+def update_traffic_state(now_ms):
+    """
+    Main state machine for the traffic lights.
+    Called periodically in the main loop.
+    One table lookup decides whether the current phase is over.
+    """
+    global _pedestrian_request
+
+    state = traffic_state
+    if _duration[state] == DUR_ON_REQUEST:
+        if _pedestrian_request:
+            _enter(_next[state], now_ms)
+        return
+    if _crossing_active:
+        _pedestrian_request = False  # presses during the crossing are ignored
+    if time.ticks_diff(now_ms, traffic_state_start_ms) >= _phase_ms[state]:
+        _enter(_next[state], now_ms)
@@ -1,40 +1,289 @@
-# traffic_flow.py
-import hardware
-
-
-def read_traffic_flow_level():
-    """
-    Returns a normalized value 0.0–1.0 based on ADC reading.
-    In a real system, this would represent vehicle flow intensity.
-    """
-    raw = hardware.adc.read()  
-    value = raw / 4095.0
-    if value < 0.0:
-        value = 0.0
-    if value > 1.0:
-        value = 1.0
-    return value
-
-
-def compute_wait_before_walk_ms():
-    """
-    Return the waiting time before pedestrians can cross.
-    Range: 10–60 seconds, proportional to traffic flow
-    (higher flow → longer waiting time).
-    """
-    flow = read_traffic_flow_level()
-    min_ms = 10_000
-    max_ms = 60_000
-    return int(min_ms + (max_ms - min_ms) * flow)
-
-
-def compute_ped_green_ms():
-    """
-    Return the green time for pedestrians.
-    Range: 10–40 seconds, inversely proportional to traffic flow
-    (higher flow → shorter pedestrian green time).
-    """
-    flow = read_traffic_flow_level()
-    min_ms = 10_000
-    max_ms = 40_000
-    return int(max_ms - (max_ms - min_ms) * flow)
+# traffic_flow.py
+import time
+import json
+from array import array
+import hardware
+import detector
+import trace_log
+
+ADC_MAX = 4095
+
+# ======= Flow Source =======
+FLOW_SOURCE_ADC = 0        # potentiometer on hardware.adc
+FLOW_SOURCE_DETECTOR = 1   # vehicle detector pulses (detector.py)
+FLOW_SOURCE = FLOW_SOURCE_ADC
+
+# ======= Background Sampler =======
+FLOW_SAMPLE_INTERVAL_MS = 200  # ADC sampling period
+FLOW_WINDOW = 32               # samples kept for mean/variance
+FLOW_EMA_SHIFT = 3             # EMA weight = 1 / 2**FLOW_EMA_SHIFT
+_EMA_FRAC = 4                  # fixed-point fraction bits of the EMA
+
+# Fixed-size ring of raw samples (no allocation per sample)
+_samples = array('H', [0] * FLOW_WINDOW)
+_index = 0
+_count = 0
+_sum = 0           # running sum of the window
+_sum_sq = 0        # running sum of squares of the window
+_ema_fp = 0        # EMA of raw samples, fixed point
+_last_sample_ms = 0
+
+# ======= Timing Table =======
+# Optional wait/walk curves produced offline by sim/optimize_timing.py,
+# sampled at TABLE_POINTS evenly spaced flow levels. Without the file
+# the linear maps below are used.
+TIMING_TABLE_PATH = "/timing.json"
+TABLE_POINTS = 17
+TABLE_MAX_MS = 600_000     # longest wait or walk accepted from the file
+
+_wait_table = None
+_walk_table = None
+
+# ======= Integer Lookup Tables =======
+# Wait and walk times for every 2**FLOW_LUT_SHIFT raw ADC values, built
+# once at boot so the phase logic indexes them with the integer EMA
+# instead of doing float math. Entries are in LUT_UNIT_MS steps so 'H'
+# holds TABLE_MAX_MS. The EMA is already smoothed: at shift 4 a step
+# of the index moves the default wait by ~200 ms, for 256 entries
+# (1 KB for both tables; 16 KB at shift 0).
+FLOW_LUT_SHIFT = 4
+LUT_UNIT_MS = 10
+
+_wait_lut = None
+_walk_lut = None
+
+
+def load_timing_table(path=None):
+    """
+    Load the wait/walk lookup table (default TIMING_TABLE_PATH).
+    Returns True if it was loaded, False if the linear maps stay in use.
+    """
+    global _wait_table, _walk_table
+    if path is None:
+        path = TIMING_TABLE_PATH
+    _wait_table = None
+    _walk_table = None
+    try:
+        with open(path) as f:
+            table = json.load(f)
+        wait_ms = table["wait_ms"]
+        walk_ms = table["walk_ms"]
+        if len(wait_ms) != TABLE_POINTS or len(walk_ms) != TABLE_POINTS:
+            raise ValueError("expected {} points".format(TABLE_POINTS))
+        for ms in wait_ms + walk_ms:
+            if not isinstance(ms, int) or not 0 < ms <= TABLE_MAX_MS:
+                raise ValueError("{} ms out of range".format(ms))
+        _wait_table = array('i', wait_ms)
+        _walk_table = array('i', walk_ms)
+        return True
+    except OSError:
+        return False  # no table: linear maps
+    except (ValueError, KeyError, TypeError) as e:
+        print("Timing table ignored:", e)
+        return False
+    finally:
+        _build_luts()
+
+
+def _build_luts():
+    """
+    Evaluate the timing curves once per table entry, at the middle of
+    the raw ADC values it covers, rounded to LUT_UNIT_MS.
+    """
+    global _wait_lut, _walk_lut
+    _wait_lut = None   # the builders below must use the float curves
+    _walk_lut = None
+    size = (ADC_MAX >> FLOW_LUT_SHIFT) + 1
+    half = (1 << FLOW_LUT_SHIFT) >> 1
+    wait_lut = array('H', [0] * size)
+    walk_lut = array('H', [0] * size)
+    for i in range(size):
+        flow = ((i << FLOW_LUT_SHIFT) + half) / 4095.0
+        wait_lut[i] = (compute_wait_before_walk_ms(flow) + LUT_UNIT_MS // 2) // LUT_UNIT_MS
+        walk_lut[i] = (compute_ped_green_ms(flow) + LUT_UNIT_MS // 2) // LUT_UNIT_MS
+    _wait_lut = wait_lut
+    _walk_lut = walk_lut
+
+
+def _lookup(table, flow):
+    """Linear interpolation in a timing table at flow 0.0–1.0."""
+    pos = flow * (TABLE_POINTS - 1)
+    i = int(pos)
+    if i >= TABLE_POINTS - 1:
+        return table[TABLE_POINTS - 1]
+    if i < 0:
+        return table[0]
+    return int(table[i] + (table[i + 1] - table[i]) * (pos - i))
+
+
+def init_traffic_flow():
+    """Reset the sampler, load the timing table and take a first ADC sample."""
+    global _index, _count, _sum, _sum_sq, _ema_fp, _last_sample_ms
+    if FLOW_SOURCE == FLOW_SOURCE_DETECTOR:
+        detector.init_detector()
+    else:
+        hardware.init_adc()
+    load_timing_table()
+    _index = 0
+    _count = 0
+    _sum = 0
+    _sum_sq = 0
+    _ema_fp = 0
+    _last_sample_ms = time.ticks_ms()
+    _add_sample(_read_adc(_last_sample_ms))
+
+
+def _read_source(now_ms):
+    """Raw flow 0–4095 from the potentiometer or the vehicle detector."""
+    if FLOW_SOURCE == FLOW_SOURCE_DETECTOR:
+        return detector.read_level_raw(now_ms)
+    return hardware.adc.read()
+
+
+def _read_adc(now_ms):
+    """One flow sample, recorded in the trace when tracing."""
+    raw = _read_source(now_ms)
+    if trace_log.TRACE_ENABLED:
+        trace_log.record_adc(now_ms, raw)
+    return raw
+
+
+def _add_sample(raw):
+    """Push one raw ADC value into the ring and update the filters."""
+    global _index, _count, _sum, _sum_sq, _ema_fp
+
+    if raw < 0:
+        raw = 0
+    elif raw > ADC_MAX:
+        raw = ADC_MAX
+
+    if _count == FLOW_WINDOW:
+        old = _samples[_index]
+        _sum -= old
+        _sum_sq -= old * old
+    else:
+        _count += 1
+
+    _samples[_index] = raw
+    _sum += raw
+    _sum_sq += raw * raw
+    _index = (_index + 1) % FLOW_WINDOW
+
+    if _count == 1:
+        _ema_fp = raw << _EMA_FRAC
+    else:
+        _ema_fp += ((raw << _EMA_FRAC) - _ema_fp) >> FLOW_EMA_SHIFT
+
+
+def next_deadline_ms(now_ms):
+    """Return the tick of the next ADC sample."""
+    return time.ticks_add(_last_sample_ms, FLOW_SAMPLE_INTERVAL_MS)
+
+
+def update_traffic_flow(now_ms):
+    """
+    Oversample the flow source at FLOW_SAMPLE_INTERVAL_MS.
+    Called periodically in the main loop.
+    """
+    global _last_sample_ms
+    if time.ticks_diff(now_ms, _last_sample_ms) < FLOW_SAMPLE_INTERVAL_MS:
+        return
+    _last_sample_ms = now_ms
+    _add_sample(_read_adc(now_ms))
+
+
+def get_flow_raw():
+    """Smoothed (EMA) flow as a raw ADC value 0–4095."""
+    return _ema_fp >> _EMA_FRAC
+
+
+def get_flow_mean():
+    """Moving average of the last FLOW_WINDOW samples (raw ADC units)."""
+    if _count == 0:
+        return 0
+    return _sum // _count
+
+
+def get_flow_variance():
+    """Variance of the last FLOW_WINDOW samples (raw ADC units squared)."""
+    if _count == 0:
+        return 0
+    mean = _sum // _count
+    var = _sum_sq // _count - mean * mean
+    return var if var > 0 else 0
+
+
+def get_flow_trend():
+    """
+    Flow trend in raw ADC units: the EMA reacts faster than the
+    window mean, so > 0 means traffic is rising, < 0 falling.
+    """
+    return get_flow_raw() - get_flow_mean()
+
+
+def read_traffic_flow_level():
+    """
+    Returns a normalized value 0.0–1.0 based on the smoothed ADC reading.
+    In a real system, this would represent vehicle flow intensity.
+    Falls back to a single raw sample if the sampler is not running.
+    """
+    if _count == 0:
+        raw = _read_source(time.ticks_ms())
+    else:
+        raw = get_flow_raw()
+    value = raw / 4095.0
+    if value < 0.0:
+        value = 0.0
+    if value > 1.0:
+        value = 1.0
+    return value
+
+
+def _flow_index():
+    """Lookup table index of the measured flow (integer only)."""
+    if _count == 0:
+        raw = _read_source(time.ticks_ms())
+        if raw < 0:
+            raw = 0
+        elif raw > ADC_MAX:
+            raw = ADC_MAX
+    else:
+        raw = _ema_fp >> _EMA_FRAC
+    return raw >> FLOW_LUT_SHIFT
+
+
+def compute_wait_before_walk_ms(flow=None):
+    """
+    Return the waiting time before pedestrians can cross.
+    Range: 10–60 seconds, proportional to traffic flow
+    (higher flow → longer waiting time), unless a timing table is loaded.
+    flow (0.0–1.0) defaults to the measured level.
+    """
+    if flow is None:
+        if _wait_lut is not None:
+            return _wait_lut[_flow_index()] * LUT_UNIT_MS
+        flow = read_traffic_flow_level()
+    if _wait_table is not None:
+        return _lookup(_wait_table, flow)
+    min_ms = 10_000
+    max_ms = 60_000
+    return int(min_ms + (max_ms - min_ms) * flow)
+
+
+def compute_ped_green_ms(flow=None):
+    """
+    Return the green time for pedestrians.
+    Range: 10–40 seconds, inversely proportional to traffic flow
+    (higher flow → shorter pedestrian green time), unless a timing
+    table is loaded.
+    flow (0.0–1.0) defaults to the measured level.
+    """
+    if flow is None:
+        if _walk_lut is not None:
+            return _walk_lut[_flow_index()] * LUT_UNIT_MS
+        flow = read_traffic_flow_level()
+    if _walk_table is not None:
+        return _lookup(_walk_table, flow)
+    min_ms = 10_000
+    max_ms = 40_000
+    return int(max_ms - (max_ms - min_ms) * flow)
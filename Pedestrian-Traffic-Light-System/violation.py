@@ -1,71 +1,139 @@
-# violation.py
-import time
-import hardware
-import traffic
-import flash_rgb
-
-VIOLATION_CHECK_INTERVAL_MS = 20
-VIOLATION_DEBOUNCE_MS = 50
-
-_last_violation_check_ms = 0
-_viol_last_level = 1
-_viol_last_change_ms = 0
-_violation_handled = False
-
-_fines = 0  # number of recorded violations (cars crossing on red)
-
-
-def init_violation():
-    """Initialize violation detection state."""
-    global _last_violation_check_ms, _viol_last_level
-    global _viol_last_change_ms, _violation_handled, _fines
-
-    _last_violation_check_ms = time.ticks_ms()
-    _viol_last_level = hardware.Bot2.value()
-    _viol_last_change_ms = time.ticks_ms()
-    _violation_handled = False
-    _fines = 0
-
-
-def get_fines():
-    """Return total number of recorded violations."""
-    return _fines
-
-
-def update_violation(now_ms):
-    """
-    Detect violations:
-    - Bot2 simulates a vehicle crossing the stop line.
-    - If pressed while car light is red, count a fine and flash RGB.
-    """
-    global _last_violation_check_ms, _viol_last_level
-    global _viol_last_change_ms, _violation_handled, _fines
-
-    # Limit check rate
-    if time.ticks_diff(now_ms, _last_violation_check_ms) < VIOLATION_CHECK_INTERVAL_MS:
-        return
-
-    _last_violation_check_ms = now_ms
-
-    level = hardware.Bot2.value()  # 1 = released, 0 = pressed
-
-    # Edge detection
-    if level != _viol_last_level:
-        _viol_last_level = level
-        _viol_last_change_ms = now_ms
-
-    # After debounce time
-    if time.ticks_diff(now_ms, _viol_last_change_ms) > VIOLATION_DEBOUNCE_MS:
-        pressed = (_viol_last_level == 0)
-        car_red_on = traffic.is_car_red()
-
-        # Button pressed, car red, and not processed yet
-        if pressed and car_red_on and not _violation_handled:
-            _fines += 1
-            _violation_handled = True
-            flash_rgb.start_flash_white()
-            print("Fines:", _fines)
-
-        # On release, allow next violation to be counted
-        if not pressed:
-            _violation_handled = False
+# violation.py
+import time
+from array import array
+import hardware
+import traffic
+import input_events
+import violation_log
+import evidence
+
+VIOLATION_CHECK_INTERVAL_MS = 20
+VIOLATION_DEBOUNCE_MS = 50
+
+_last_violation_check_ms = 0
+_viol_last_level = 1
+_viol_last_change_ms = 0
+_violation_handled = False
+
+_fines = 0  # number of recorded violations (cars crossing on red)
+
+# Per-lane counts since boot (input_scan.py has one sensor per lane)
+MAX_LANES = 16
+_lane_fines = array('H', [0] * MAX_LANES)
+
+
+def init_violation():
+    """Initialize violation detection state."""
+    global _last_violation_check_ms, _viol_last_level
+    global _viol_last_change_ms, _violation_handled, _fines
+
+    _last_violation_check_ms = time.ticks_ms()
+    _viol_last_level = hardware.Bot2.value()
+    _viol_last_change_ms = time.ticks_ms()
+    _violation_handled = False
+    # Restore the counter from the persistent log
+    _fines = violation_log.init_violation_log()
+    evidence.init_evidence()
+
+
+def get_fines():
+    """Return total number of recorded violations."""
+    return _fines
+
+
+def get_lane_fines(lane):
+    """Violations recorded on one lane since boot."""
+    return _lane_fines[lane]
+
+
+def record_violation(t_ms, lane=0):
+    """
+    A car crossed the stop line of lane on red: count it and queue its
+    evidence (flash and log record, see evidence.py).
+    """
+    global _fines
+    _fines += 1
+    if _lane_fines[lane] < 0xFFFF:
+        _lane_fines[lane] += 1
+    evidence.push(t_ms, lane, traffic.get_state(), traffic.get_car_red_elapsed_ms(t_ms))
+    print("Fines:", _fines)
+
+
+def next_deadline_ms(now_ms):
+    """
+    Return the tick of the next violation check, or None while the
+    sensor is released and stable.
+    """
+    next_check = time.ticks_add(_last_violation_check_ms, VIOLATION_CHECK_INTERVAL_MS)
+
+    # New edges, or still inside the debounce window
+    if input_events.pending(input_events.CH_BOT2) or \
+            time.ticks_diff(now_ms, _viol_last_change_ms) <= VIOLATION_DEBOUNCE_MS:
+        return next_check
+
+    # Held down: keep checking, the car light may turn red meanwhile
+    if _viol_last_level == 0 and not _violation_handled:
+        return next_check
+
+    return None
+
+
+def _check_violation(t_ms):
+    """
+    Apply the debounce rule to the sensor level at time t_ms (an edge
+    time or now), against the car light at that same time.
+    """
+    global _violation_handled
+
+    if time.ticks_diff(t_ms, _viol_last_change_ms) > VIOLATION_DEBOUNCE_MS:
+        pressed = (_viol_last_level == 0)
+        car_red_on = traffic.was_car_red_at(t_ms)
+
+        # Button pressed, car red, and not processed yet
+        if pressed and car_red_on and not _violation_handled:
+            _violation_handled = True
+            record_violation(t_ms)
+
+        # On release, allow next violation to be counted
+        if not pressed:
+            _violation_handled = False
+
+
+def update_violation(now_ms):
+    """
+    Detect violations:
+    - Bot2 simulates a vehicle crossing the stop line.
+    - If pressed while car light is red, count a fine and flash RGB.
+    Edges are captured by the IRQ with their timestamps and replayed
+    here, so pulses shorter than the check interval are not lost.
+    """
+    global _last_violation_check_ms, _viol_last_level
+    global _viol_last_change_ms
+
+    # Limit check rate
+    if time.ticks_diff(now_ms, _last_violation_check_ms) < VIOLATION_CHECK_INTERVAL_MS:
+        return
+
+    _last_violation_check_ms = now_ms
+
+    ch = input_events.CH_BOT2
+    while input_events.pending(ch):
+        edge_ms = input_events.peek_ms(ch)
+        level = input_events.peek_level(ch)  # 1 = released, 0 = pressed
+        input_events.pop(ch)
+
+        # The previous level may have become valid before this edge
+        _check_violation(edge_ms)
+
+        if level != _viol_last_level:
+            _viol_last_level = level
+            _viol_last_change_ms = edge_ms
+
+    # Edges were lost: resynchronize with the sensor
+    if input_events.take_overflows(ch):
+        level = hardware.Bot2.value()
+        if level != _viol_last_level:
+            _viol_last_level = level
+            _viol_last_change_ms = now_ms
+
+    _check_violation(now_ms)
@@ -0,0 +1,223 @@
+# violation_log.py
+import os
+import time
+import struct
+
+# ======= Storage Layout =======
+# Append-only log of fixed-size records spread over NUM_SEGMENTS files
+# used round-robin (one segment = one 4 KB flash sector of records), so
+# wear is spread and the oldest segment is recycled when all are full.
+LOG_DIR = "/vlog"
+NUM_SEGMENTS = 8
+SEGMENT_RECORDS = 256
+
+# seq, ticks_ms, rtc seconds, ms since car red, traffic state (lane in
+# the high nibble), checksum
+RECORD_FORMAT = "<IIIHBB"
+RECORD_SIZE = 16
+
+# Records are collected in RAM and written in batches
+BATCH_RECORDS = 16
+FLUSH_INTERVAL_MS = 5000
+
+_batch = bytearray(BATCH_RECORDS * RECORD_SIZE)
+_batch_count = 0
+_batch_first_ms = 0
+
+_segment = 0          # segment currently appended to
+_segment_count = 0    # records already in that segment
+_next_seq = 0         # sequence number of the next record = records logged
+_enabled = False
+
+
+def _segment_path(index):
+    return "{}/seg{}.bin".format(LOG_DIR, index)
+
+
+# Seed of the record checksum, so a zeroed or erased record never checks
+_CHECK_SEED = 0xA5 ^ RECORD_SIZE
+
+
+def _checksum(buf, offset):
+    total = _CHECK_SEED
+    for i in range(offset, offset + RECORD_SIZE - 1):
+        total += buf[i]
+    return total & 0xFF
+
+
+def _file_size(path):
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return -1
+
+
+def _last_valid_record(index):
+    """
+    Return (seq, record count) of a segment, looking only at its tail.
+    A torn write at the end of the file (partial or corrupt record) is
+    cut off by rewriting the segment with its whole records.
+    """
+    path = _segment_path(index)
+    size = _file_size(path)
+    if size <= 0:
+        return -1, 0
+
+    count = size // RECORD_SIZE
+    seq = -1
+    with open(path, "rb") as f:
+        while count > 0:
+            f.seek((count - 1) * RECORD_SIZE)
+            rec = f.read(RECORD_SIZE)
+            if len(rec) == RECORD_SIZE and rec[RECORD_SIZE - 1] == _checksum(rec, 0):
+                seq = struct.unpack_from("<I", rec)[0]
+                break
+            count -= 1
+
+    if count * RECORD_SIZE != size:
+        # Torn tail: keep only the whole, valid records
+        with open(path, "rb") as f:
+            keep = f.read(count * RECORD_SIZE)
+        with open(path, "wb") as f:
+            f.write(keep)
+    return seq, count
+
+
+def init_violation_log():
+    """
+    Open the log and return the number of violations already recorded.
+    Only the last record of each segment is read, so startup time does
+    not depend on the log size.
+    """
+    global _segment, _segment_count, _next_seq, _enabled
+    global _batch_count
+
+    _batch_count = 0
+    _segment = 0
+    _segment_count = 0
+    _next_seq = 0
+    _enabled = False
+
+    try:
+        try:
+            os.mkdir(LOG_DIR)
+        except OSError:
+            pass  # already exists
+
+        best_seq = -1
+        for index in range(NUM_SEGMENTS):
+            seq, count = _last_valid_record(index)
+            if seq > best_seq:
+                best_seq = seq
+                _segment = index
+                _segment_count = count
+        _next_seq = best_seq + 1
+        _enabled = True
+    except OSError as e:
+        print("Violation log not available:", e)
+
+    return _next_seq
+
+
+def get_logged_count():
+    """Total number of records logged (written or still batched)."""
+    return _next_seq
+
+
+def append_violation(now_ms, traffic_state, since_red_ms, lane=0):
+    """
+    Queue one violation record. Nothing is written to flash here
+    unless the batch is already full.
+    """
+    global _batch_count, _batch_first_ms, _next_seq
+
+    if not _enabled:
+        return
+    if _batch_count == BATCH_RECORDS:
+        flush()
+
+    if since_red_ms > 0xFFFF:
+        since_red_ms = 0xFFFF
+    offset = _batch_count * RECORD_SIZE
+    struct.pack_into(RECORD_FORMAT, _batch, offset, _next_seq, now_ms,
+                     int(time.time()) & 0xFFFFFFFF, since_red_ms,
+                     traffic_state | (lane << 4), 0)
+    _batch[offset + RECORD_SIZE - 1] = _checksum(_batch, offset)
+
+    if _batch_count == 0:
+        _batch_first_ms = now_ms
+    _batch_count += 1
+    _next_seq += 1
+
+
+def flush():
+    """Write all batched records, rotating segments as they fill up."""
+    global _batch_count, _segment, _segment_count, _enabled
+
+    if not _enabled or _batch_count == 0:
+        return
+
+    done = 0
+    try:
+        while done < _batch_count:
+            if _segment_count == SEGMENT_RECORDS:
+                # Recycle the oldest segment
+                _segment = (_segment + 1) % NUM_SEGMENTS
+                _segment_count = 0
+                mode = "wb"
+            else:
+                mode = "ab"
+            n = min(_batch_count - done, SEGMENT_RECORDS - _segment_count)
+            with open(_segment_path(_segment), mode) as f:
+                f.write(memoryview(_batch)[done * RECORD_SIZE:(done + n) * RECORD_SIZE])
+            _segment_count += n
+            done += n
+    except OSError as e:
+        print("Violation log write failed:", e)
+        _enabled = False
+    _batch_count = 0
+
+
+def next_deadline_ms(now_ms):
+    """Return the tick of the next batch flush, or None if nothing is queued."""
+    if not _enabled or _batch_count == 0:
+        return None
+    return time.ticks_add(_batch_first_ms, FLUSH_INTERVAL_MS)
+
+
+def update_violation_log(now_ms):
+    """
+    Flush the batch once it is FLUSH_INTERVAL_MS old.
+    Called periodically in the main loop.
+    """
+    if _batch_count == 0:
+        return
+    if time.ticks_diff(now_ms, _batch_first_ms) >= FLUSH_INTERVAL_MS:
+        flush()
+
+
+def read_records(callback):
+    """
+    Call callback(seq, ticks_ms, rtc_s, since_red_ms, state) for every
+    stored record, oldest segment first (offline/REPL use only).
+    state & 0x0F is the traffic state, state >> 4 the lane.
+    """
+    flush()
+    segments = []
+    for index in range(NUM_SEGMENTS):
+        path = _segment_path(index)
+        if _file_size(path) >= RECORD_SIZE:
+            with open(path, "rb") as f:
+                first = f.read(4)
+            segments.append((struct.unpack("<I", first)[0], path))
+    segments.sort()
+    for _, path in segments:
+        with open(path, "rb") as f:
+            while True:
+                rec = f.read(RECORD_SIZE)
+                if len(rec) < RECORD_SIZE:
+                    break
+                if rec[RECORD_SIZE - 1] != _checksum(rec, 0):
+                    continue
+                seq, ticks, rtc, since_red, state, _ = struct.unpack(RECORD_FORMAT, rec)
+                callback(seq, ticks, rtc, since_red, state)